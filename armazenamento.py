@@ -0,0 +1,545 @@
+import asyncio
+import functools
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+from metricas import registro as metricas
+
+logger = logging.getLogger(__name__)
+
+_PARAR = object()
+
+# Registro de assinatura: tupla com campos nomeados, sem um dicionário por linha
+Assinatura = namedtuple('Assinatura', 'user_id payment_id data_expiracao link_invite')
+
+
+class MotorSQLite:
+    """Motor de armazenamento SQLite em modo WAL.
+
+    Leituras rodam em um pool de threads, cada uma com sua própria conexão. Escritas vão
+    para uma fila consumida por uma única thread escritora, que agrupa as escritas
+    pendentes em uma transação e faz um único commit (group commit) por lote.
+    """
+
+    def __init__(self, caminho='assinaturas.db', leitores=4, max_lote=256, espera_lote=0.0,
+                 synchronous='FULL', timeout=30.0):
+        self.caminho = caminho
+        self.max_lote = max_lote
+        self.espera_lote = espera_lote
+        self.synchronous = synchronous
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conexoes = []
+        self._conexoes_lock = threading.Lock()
+        self._fila = queue.Queue()
+        self._leitores = ThreadPoolExecutor(max_workers=leitores, thread_name_prefix='sqlite-leitor')
+        self._tamanho_lote = metricas.histograma('db_lote_escrita_tamanho', 'Escritas por commit', buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500))
+        self._commit = metricas.histograma('db_commit_segundos', 'Duração de cada commit em grupo')
+
+        self._escritor_conn = self._conectar()
+        self._escritor_conn.execute('PRAGMA journal_mode=WAL')
+        self._escritor = threading.Thread(target=self._loop_escritor, name='sqlite-escritor', daemon=True)
+        self._escritor.start()
+
+    def _conectar(self):
+        # isolation_level=None: as transações são controladas explicitamente
+        conn = sqlite3.connect(self.caminho, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA busy_timeout={int(self.timeout * 1000)}')
+        with self._conexoes_lock:
+            self._conexoes.append(conn)
+        return conn
+
+    def _conexao_leitura(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._conectar()
+            conn.execute('PRAGMA query_only=ON')
+        return conn
+
+    def _ler(self, func, args, kwargs):
+        return func(self._conexao_leitura(), *args, **kwargs)
+
+    def submeter_leitura(self, func, *args, **kwargs):
+        """Executa func(conn, *args) em uma thread leitora; retorna concurrent.futures.Future."""
+        return self._leitores.submit(self._ler, func, args, kwargs)
+
+    def submeter_escrita(self, func, *args, **kwargs):
+        """Enfileira func(conn, *args) para a thread escritora; o Future resolve após o commit."""
+        futuro = Future()
+        self._fila.put((func, args, kwargs, futuro))
+        return futuro
+
+    async def ler(self, func, *args, **kwargs):
+        return await asyncio.wrap_future(self.submeter_leitura(func, *args, **kwargs))
+
+    async def escrever(self, func, *args, **kwargs):
+        return await asyncio.wrap_future(self.submeter_escrita(func, *args, **kwargs))
+
+    def _loop_escritor(self):
+        conn = self._escritor_conn
+        while True:
+            item = self._fila.get()
+            if item is _PARAR:
+                return
+            lote = [item]
+            if self.espera_lote:
+                time.sleep(self.espera_lote)
+            # Junta tudo que chegou enquanto o commit anterior era gravado
+            while len(lote) < self.max_lote:
+                try:
+                    item = self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _PARAR:
+                    self._fila.put(_PARAR)
+                    break
+                lote.append(item)
+            self._gravar_lote(conn, lote)
+
+    def _gravar_lote(self, conn, lote):
+        resultados = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for func, args, kwargs, futuro in lote:
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+                # Um savepoint por escrita: uma falha não desfaz as outras do lote
+                conn.execute('SAVEPOINT escrita')
+                try:
+                    resultados.append((futuro, func(conn, *args, **kwargs), None))
+                    conn.execute('RELEASE escrita')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO escrita')
+                    conn.execute('RELEASE escrita')
+                    resultados.append((futuro, None, e))
+            inicio = time.perf_counter()
+            conn.execute('COMMIT')
+            self._commit.observar(time.perf_counter() - inicio)
+            self._tamanho_lote.observar(len(lote))
+        except Exception as e:
+            logger.error("Erro ao gravar lote de %s escritas: %s", len(lote), e, exc_info=True)
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for _, _, _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        for futuro, resultado, erro in resultados:
+            if erro is not None:
+                futuro.set_exception(erro)
+            else:
+                futuro.set_result(resultado)
+
+    def fechar(self):
+        self._fila.put(_PARAR)
+        self._escritor.join()
+        self._leitores.shutdown(wait=True)
+        with self._conexoes_lock:
+            for conn in self._conexoes:
+                conn.close()
+            self._conexoes.clear()
+
+
+def para_texto(data):
+    # Datas sempre gravadas e comparadas no mesmo formato ISO, para a ordem do texto
+    # coincidir com a ordem cronológica e o índice de expiração ser usado
+    return data.isoformat(' ', timespec='microseconds')
+
+
+def leitura(func):
+    # Executa func(self, conn, ...) em uma thread leitora sem bloquear o event loop
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        return await self.motor.ler(functools.partial(func, self), *args, **kwargs)
+    return wrapper
+
+
+def escrita(func):
+    # Enfileira func(self, conn, ...) para a thread escritora; retorna após o commit do lote
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        return await self.motor.escrever(functools.partial(func, self), *args, **kwargs)
+    return wrapper
+
+
+def _assinatura(row):
+    return Assinatura(row[0], row[1], datetime.fromisoformat(row[2]), row[3])
+
+
+class ArmazenamentoSQLite:
+    """Assinaturas em um arquivo SQLite, acessado pelo MotorSQLite.
+
+    Vários processos podem usar o mesmo arquivo: o WAL e o BEGIN IMMEDIATE da thread
+    escritora serializam as escritas entre eles.
+    """
+
+    def __init__(self, caminho='assinaturas.db', leitores=4, max_lote=256, synchronous='FULL'):
+        # WAL com várias conexões de leitura e uma única thread escritora com group commit
+        self.motor = MotorSQLite(caminho, leitores=leitores, max_lote=max_lote, synchronous=synchronous)
+        self.motor.submeter_escrita(self._criar_tabela).result()
+
+    async def fechar(self):
+        self.motor.fechar()
+
+    def _criar_tabela(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS assinaturas (
+                    user_id INTEGER PRIMARY KEY,
+                    payment_id TEXT,
+                    data_expiracao TIMESTAMP,
+                    link_invite TEXT
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_assinaturas_expiracao ON assinaturas (data_expiracao)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_assinaturas_pagamento ON assinaturas (payment_id)')
+            # Fila persistente de membros expirados a remover do grupo VIP
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fila_remocao (
+                    user_id INTEGER PRIMARY KEY,
+                    link_invite TEXT,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    proxima_tentativa TIMESTAMP NOT NULL
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_fila_remocao_proxima ON fila_remocao (proxima_tentativa)')
+            # Pagamentos e sua máquina de estados; token/reservado_ate marcam quem está ativando
+            existia = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pagamentos'"
+            ).fetchone()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pagamentos (
+                    payment_id TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    estado TEXT NOT NULL,
+                    status TEXT,
+                    token TEXT,
+                    reservado_ate TIMESTAMP,
+                    criado_em TIMESTAMP NOT NULL,
+                    atualizado_em TIMESTAMP NOT NULL
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pagamentos_estado ON pagamentos (estado, criado_em)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pagamentos_usuario ON pagamentos (user_id)')
+            if not existia:
+                # Bancos anteriores guardavam o pagamento pendente na própria assinatura
+                agora = para_texto(datetime.now())
+                cursor.execute('''
+                    INSERT OR IGNORE INTO pagamentos (payment_id, user_id, estado, criado_em, atualizado_em)
+                    SELECT payment_id, user_id, CASE WHEN link_invite IS NULL THEN 'pending' ELSE 'activated' END, ?, ?
+                    FROM assinaturas WHERE payment_id IS NOT NULL
+                ''', (agora, agora))
+            logger.info("Tabela de assinaturas criada/verificada")
+        except Exception as e:
+            logger.error("Erro ao criar tabela: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def salvar_assinatura(self, conn, user_id, payment_id, data_expiracao, link_invite=None):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO assinaturas (user_id, payment_id, data_expiracao, link_invite)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, payment_id, para_texto(data_expiracao), link_invite))
+            logger.info("Assinatura salva para usuário %s", user_id)
+        except Exception as e:
+            logger.error("Erro ao salvar assinatura: %s", e, exc_info=True)
+            raise
+
+    @leitura
+    def get_assinatura(self, conn, user_id):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM assinaturas WHERE user_id = ?', (user_id,))
+            result = cursor.fetchone()
+            return _assinatura(result) if result else None
+        except Exception as e:
+            logger.error("Erro ao buscar assinatura: %s", e, exc_info=True)
+            raise
+
+    @leitura
+    def get_assinatura_por_pagamento(self, conn, payment_id):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM assinaturas WHERE payment_id = ?', (str(payment_id),))
+            result = cursor.fetchone()
+            return _assinatura(result) if result else None
+        except Exception as e:
+            logger.error("Erro ao buscar assinatura por pagamento: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def registrar_pagamento(self, conn, payment_id, user_id, agora):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR IGNORE INTO pagamentos (payment_id, user_id, estado, criado_em, atualizado_em)
+                VALUES (?, ?, 'created', ?, ?)
+            ''', (payment_id, user_id, para_texto(agora), para_texto(agora)))
+        except Exception as e:
+            logger.error("Erro ao registrar pagamento: %s", e, exc_info=True)
+            raise
+
+    @leitura
+    def get_pagamento(self, conn, payment_id):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT payment_id, user_id, estado, status, criado_em FROM pagamentos WHERE payment_id = ?',
+                (payment_id,)
+            )
+            row = cursor.fetchone()
+            if row:
+                return {
+                    'payment_id': row[0],
+                    'user_id': row[1],
+                    'estado': row[2],
+                    'status': row[3],
+                    'criado_em': datetime.fromisoformat(row[4])
+                }
+            return None
+        except Exception as e:
+            logger.error("Erro ao buscar pagamento: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def atualizar_estado_pagamento(self, conn, payment_id, estado, status, origens, agora):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE pagamentos SET estado = ?, status = COALESCE(?, status), atualizado_em = ?
+                WHERE payment_id = ? AND estado IN ({', '.join('?' * len(origens))})
+            ''', (estado, status, para_texto(agora), payment_id, *origens))
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Erro ao atualizar estado do pagamento: %s", e, exc_info=True)
+            raise
+
+    @leitura
+    def tem_pagamento(self, conn, user_id, estados):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT 1 FROM pagamentos
+                WHERE user_id = ? AND estado IN ({', '.join('?' * len(estados))}) LIMIT 1
+            ''', (user_id, *estados))
+            return cursor.fetchone() is not None
+        except Exception as e:
+            logger.error("Erro ao buscar pagamentos do usuário: %s", e, exc_info=True)
+            raise
+
+    @leitura
+    def get_pagamentos_pendentes(self, conn, estados):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT payment_id, user_id, estado, criado_em FROM pagamentos
+                WHERE estado IN ({', '.join('?' * len(estados))})
+            ''', estados)
+            return [
+                {
+                    'payment_id': row[0],
+                    'user_id': row[1],
+                    'estado': row[2],
+                    'criado_em': datetime.fromisoformat(row[3])
+                }
+                for row in cursor.fetchall()
+            ]
+        except Exception as e:
+            logger.error("Erro ao buscar pagamentos pendentes: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def expirar_pagamentos(self, conn, estados, criados_antes, agora):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE pagamentos SET estado = 'expired', atualizado_em = ?
+                WHERE estado IN ({', '.join('?' * len(estados))}) AND criado_em < ?
+            ''', (para_texto(agora), *estados, para_texto(criados_antes)))
+            return cursor.rowcount
+        except Exception as e:
+            logger.error("Erro ao expirar pagamentos: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def remover_assinatura(self, conn, user_id):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM assinaturas WHERE user_id = ?', (user_id,))
+            logger.info("Assinatura removida para usuário %s", user_id)
+        except Exception as e:
+            logger.error("Erro ao remover assinatura: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def remover_expiradas_lote(self, conn, agora, limite):
+        try:
+            cursor = conn.cursor()
+            # Percorre o índice de expiração a partir das mais antigas
+            cursor.execute('''
+                DELETE FROM assinaturas WHERE user_id IN (
+                    SELECT user_id FROM assinaturas
+                    WHERE data_expiracao < ?
+                    ORDER BY data_expiracao
+                    LIMIT ?
+                )
+                RETURNING user_id, link_invite
+            ''', (para_texto(agora), limite))
+            removidas = cursor.fetchall()
+            cursor.executemany(
+                'INSERT OR REPLACE INTO fila_remocao (user_id, link_invite, proxima_tentativa) VALUES (?, ?, ?)',
+                [(user_id, link_invite, para_texto(agora)) for user_id, link_invite in removidas]
+            )
+            return removidas
+        except Exception as e:
+            logger.error("Erro ao remover assinaturas expiradas: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def reservar_fila_remocao(self, conn, limite, agora, reservado_ate):
+        try:
+            cursor = conn.cursor()
+            # Quem pega as entradas adia a próxima tentativa até reservado_ate: outro processo
+            # não as processa de novo, e elas voltam à fila se este cair no meio
+            cursor.execute('''
+                UPDATE fila_remocao SET proxima_tentativa = ?
+                WHERE user_id IN (
+                    SELECT user_id FROM fila_remocao
+                    WHERE proxima_tentativa <= ?
+                    ORDER BY proxima_tentativa
+                    LIMIT ?
+                )
+                RETURNING user_id, link_invite, tentativas
+            ''', (para_texto(reservado_ate), para_texto(agora), limite))
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error("Erro ao reservar fila de remoção: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def concluir_remocao(self, conn, user_id):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM fila_remocao WHERE user_id = ?', (user_id,))
+        except Exception as e:
+            logger.error("Erro ao concluir remoção: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def adiar_remocao(self, conn, user_id, proxima_tentativa):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                'UPDATE fila_remocao SET tentativas = tentativas + 1, proxima_tentativa = ? WHERE user_id = ?',
+                (para_texto(proxima_tentativa), user_id)
+            )
+        except Exception as e:
+            logger.error("Erro ao adiar remoção: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def reservar_ativacao(self, conn, payment_id, token, agora, reservado_ate):
+        try:
+            cursor = conn.cursor()
+            # Só reserva pagamento aprovado e sem reserva em vigor
+            cursor.execute('''
+                UPDATE pagamentos SET token = ?, reservado_ate = ?
+                WHERE payment_id = ? AND estado = 'approved' AND (reservado_ate IS NULL OR reservado_ate < ?)
+            ''', (token, para_texto(reservado_ate), payment_id, para_texto(agora)))
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error("Erro ao reservar ativação: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def concluir_ativacao(self, conn, token, user_id, payment_id, data_expiracao, link_invite, agora):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE pagamentos SET estado = 'activated', token = NULL, reservado_ate = NULL, atualizado_em = ?
+                WHERE payment_id = ? AND token = ? AND estado = 'approved'
+            ''', (para_texto(agora), payment_id, token))
+            if cursor.rowcount == 0:
+                # Reserva vencida: outro processo assumiu a ativação
+                return False
+            cursor.execute('''
+                INSERT OR REPLACE INTO assinaturas (user_id, payment_id, data_expiracao, link_invite)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, payment_id, para_texto(data_expiracao), link_invite))
+            return True
+        except Exception as e:
+            logger.error("Erro ao concluir ativação: %s", e, exc_info=True)
+            raise
+
+    @escrita
+    def liberar_ativacao(self, conn, payment_id, token):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE pagamentos SET token = NULL, reservado_ate = NULL WHERE payment_id = ? AND token = ? AND estado = 'approved'",
+                (payment_id, token)
+            )
+        except Exception as e:
+            logger.error("Erro ao liberar ativação: %s", e, exc_info=True)
+            raise
+
+    @leitura
+    def listar_assinaturas(self, conn, apos, limite):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM assinaturas WHERE user_id > ? ORDER BY user_id LIMIT ?', (apos, limite))
+            return [_assinatura(row) for row in cursor]
+        except Exception as e:
+            logger.error("Erro ao listar assinaturas: %s", e, exc_info=True)
+            raise
+
+    async def exportar_assinaturas(self, lote):
+        # Paginação pela chave primária: cada lote é uma leitura curta, sem manter aberta
+        # uma transação que impediria o checkpoint do WAL durante a exportação inteira
+        apos = -2 ** 63
+        while True:
+            registros = await self.listar_assinaturas(apos, lote)
+            if registros:
+                yield registros
+                apos = registros[-1].user_id
+            if len(registros) < lote:
+                return
+
+    @leitura
+    def resumo_assinaturas(self, conn, agora, expira_ate):
+        try:
+            cursor = conn.cursor()
+            # Contagens pelo índice de expiração, sem ler as linhas
+            cursor.execute('''
+                SELECT
+                    (SELECT COUNT(*) FROM assinaturas WHERE data_expiracao > ?),
+                    (SELECT COUNT(*) FROM assinaturas WHERE data_expiracao > ? AND data_expiracao <= ?)
+            ''', (para_texto(agora), para_texto(agora), para_texto(expira_ate)))
+            return cursor.fetchone()
+        except Exception as e:
+            logger.error("Erro ao resumir assinaturas: %s", e, exc_info=True)
+            raise
+
+    @leitura
+    def pagamentos_por_mes(self, conn, estados):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT substr(criado_em, 1, 7) AS mes, COUNT(*) FROM pagamentos
+                WHERE estado IN ({', '.join('?' * len(estados))})
+                GROUP BY mes ORDER BY mes
+            ''', estados)
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error("Erro ao agrupar pagamentos por mês: %s", e, exc_info=True)
+            raise
@@ -0,0 +1,367 @@
+import asyncio
+import functools
+import logging
+from datetime import datetime
+
+import asyncpg
+
+from armazenamento import Assinatura
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA = '''
+    CREATE TABLE IF NOT EXISTS assinaturas (
+        user_id BIGINT PRIMARY KEY,
+        payment_id TEXT,
+        data_expiracao TIMESTAMP,
+        link_invite TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_assinaturas_expiracao ON assinaturas (data_expiracao);
+    CREATE INDEX IF NOT EXISTS idx_assinaturas_pagamento ON assinaturas (payment_id);
+    CREATE TABLE IF NOT EXISTS fila_remocao (
+        user_id BIGINT PRIMARY KEY,
+        link_invite TEXT,
+        tentativas INTEGER NOT NULL DEFAULT 0,
+        proxima_tentativa TIMESTAMP NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_fila_remocao_proxima ON fila_remocao (proxima_tentativa);
+    CREATE TABLE IF NOT EXISTS pagamentos (
+        payment_id TEXT PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        estado TEXT NOT NULL,
+        status TEXT,
+        token TEXT,
+        reservado_ate TIMESTAMP,
+        criado_em TIMESTAMP NOT NULL,
+        atualizado_em TIMESTAMP NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_pagamentos_estado ON pagamentos (estado, criado_em);
+    CREATE INDEX IF NOT EXISTS idx_pagamentos_usuario ON pagamentos (user_id);
+'''
+
+# Bancos anteriores guardavam o pagamento pendente na própria assinatura
+MIGRAR_PAGAMENTOS = '''
+    INSERT INTO pagamentos (payment_id, user_id, estado, criado_em, atualizado_em)
+    SELECT payment_id, user_id, CASE WHEN link_invite IS NULL THEN 'pending' ELSE 'activated' END, $1, $1
+    FROM assinaturas WHERE payment_id IS NOT NULL
+    ON CONFLICT (payment_id) DO NOTHING
+'''
+
+SALVAR_ASSINATURA = '''
+    INSERT INTO assinaturas (user_id, payment_id, data_expiracao, link_invite)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (user_id) DO UPDATE
+    SET payment_id = EXCLUDED.payment_id, data_expiracao = EXCLUDED.data_expiracao, link_invite = EXCLUDED.link_invite
+'''
+
+
+def conexao(func):
+    # Executa func(self, conn, ...) com uma conexão emprestada do pool
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        pool = await self._obter_pool()
+        async with pool.acquire() as conn:
+            return await func(self, conn, *args, **kwargs)
+    return wrapper
+
+
+def _assinatura(row):
+    return Assinatura(row['user_id'], row['payment_id'], row['data_expiracao'], row['link_invite'])
+
+
+class ArmazenamentoPostgres:
+    """Assinaturas no PostgreSQL, compartilhadas entre várias réplicas do bot.
+
+    Usa um pool de conexões do asyncpg, que prepara cada comando na primeira execução
+    em uma conexão e reaproveita o prepared statement depois. O pool e as tabelas são
+    criados na primeira operação.
+    """
+
+    def __init__(self, url, min_conexoes=1, max_conexoes=10):
+        self.url = url
+        self.min_conexoes = min_conexoes
+        self.max_conexoes = max_conexoes
+        self._pool = None
+        self._lock = asyncio.Lock()
+
+    async def _obter_pool(self):
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    pool = await asyncpg.create_pool(self.url, min_size=self.min_conexoes, max_size=self.max_conexoes)
+                    async with pool.acquire() as conn:
+                        await self._criar_tabela(conn)
+                    self._pool = pool
+        return self._pool
+
+    async def fechar(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def _criar_tabela(self, conn):
+        try:
+            async with conn.transaction():
+                # Réplicas subindo juntas não podem criar as tabelas ao mesmo tempo
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext('assinaturas_esquema'))")
+                existia = await conn.fetchval("SELECT to_regclass('pagamentos') IS NOT NULL")
+                await conn.execute(ESQUEMA)
+                if not existia:
+                    await conn.execute(MIGRAR_PAGAMENTOS, datetime.now())
+            logger.info("Tabela de assinaturas criada/verificada")
+        except Exception as e:
+            logger.error("Erro ao criar tabela: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def salvar_assinatura(self, conn, user_id, payment_id, data_expiracao, link_invite=None):
+        try:
+            await conn.execute(SALVAR_ASSINATURA, user_id, None if payment_id is None else str(payment_id), data_expiracao, link_invite)
+            logger.info("Assinatura salva para usuário %s", user_id)
+        except Exception as e:
+            logger.error("Erro ao salvar assinatura: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def get_assinatura(self, conn, user_id):
+        try:
+            row = await conn.fetchrow('SELECT * FROM assinaturas WHERE user_id = $1', user_id)
+            return _assinatura(row) if row else None
+        except Exception as e:
+            logger.error("Erro ao buscar assinatura: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def get_assinatura_por_pagamento(self, conn, payment_id):
+        try:
+            row = await conn.fetchrow('SELECT * FROM assinaturas WHERE payment_id = $1', str(payment_id))
+            return _assinatura(row) if row else None
+        except Exception as e:
+            logger.error("Erro ao buscar assinatura por pagamento: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def registrar_pagamento(self, conn, payment_id, user_id, agora):
+        try:
+            await conn.execute('''
+                INSERT INTO pagamentos (payment_id, user_id, estado, criado_em, atualizado_em)
+                VALUES ($1, $2, 'created', $3, $3)
+                ON CONFLICT (payment_id) DO NOTHING
+            ''', payment_id, user_id, agora)
+        except Exception as e:
+            logger.error("Erro ao registrar pagamento: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def get_pagamento(self, conn, payment_id):
+        try:
+            row = await conn.fetchrow(
+                'SELECT payment_id, user_id, estado, status, criado_em FROM pagamentos WHERE payment_id = $1',
+                payment_id
+            )
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error("Erro ao buscar pagamento: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def atualizar_estado_pagamento(self, conn, payment_id, estado, status, origens, agora):
+        try:
+            resultado = await conn.execute('''
+                UPDATE pagamentos SET estado = $1, status = COALESCE($2, status), atualizado_em = $3
+                WHERE payment_id = $4 AND estado = ANY($5::text[])
+            ''', estado, status, agora, payment_id, list(origens))
+            return resultado != 'UPDATE 0'
+        except Exception as e:
+            logger.error("Erro ao atualizar estado do pagamento: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def tem_pagamento(self, conn, user_id, estados):
+        try:
+            return await conn.fetchval('''
+                SELECT EXISTS (SELECT 1 FROM pagamentos WHERE user_id = $1 AND estado = ANY($2::text[]))
+            ''', user_id, list(estados))
+        except Exception as e:
+            logger.error("Erro ao buscar pagamentos do usuário: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def get_pagamentos_pendentes(self, conn, estados):
+        try:
+            rows = await conn.fetch('''
+                SELECT payment_id, user_id, estado, criado_em FROM pagamentos
+                WHERE estado = ANY($1::text[])
+            ''', list(estados))
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error("Erro ao buscar pagamentos pendentes: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def expirar_pagamentos(self, conn, estados, criados_antes, agora):
+        try:
+            resultado = await conn.execute('''
+                UPDATE pagamentos SET estado = 'expired', atualizado_em = $1
+                WHERE estado = ANY($2::text[]) AND criado_em < $3
+            ''', agora, list(estados), criados_antes)
+            return int(resultado.split()[-1])
+        except Exception as e:
+            logger.error("Erro ao expirar pagamentos: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def remover_assinatura(self, conn, user_id):
+        try:
+            await conn.execute('DELETE FROM assinaturas WHERE user_id = $1', user_id)
+            logger.info("Assinatura removida para usuário %s", user_id)
+        except Exception as e:
+            logger.error("Erro ao remover assinatura: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def remover_expiradas_lote(self, conn, agora, limite):
+        try:
+            async with conn.transaction():
+                # SKIP LOCKED: réplicas removendo ao mesmo tempo pegam lotes diferentes
+                removidas = await conn.fetch('''
+                    DELETE FROM assinaturas WHERE user_id IN (
+                        SELECT user_id FROM assinaturas
+                        WHERE data_expiracao < $1
+                        ORDER BY data_expiracao
+                        LIMIT $2
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING user_id, link_invite
+                ''', agora, limite)
+                await conn.executemany('''
+                    INSERT INTO fila_remocao (user_id, link_invite, tentativas, proxima_tentativa)
+                    VALUES ($1, $2, 0, $3)
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET link_invite = EXCLUDED.link_invite, tentativas = 0, proxima_tentativa = EXCLUDED.proxima_tentativa
+                ''', [(row['user_id'], row['link_invite'], agora) for row in removidas])
+            return [tuple(row) for row in removidas]
+        except Exception as e:
+            logger.error("Erro ao remover assinaturas expiradas: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def reservar_fila_remocao(self, conn, limite, agora, reservado_ate):
+        try:
+            # SKIP LOCKED, como em remover_expiradas_lote: réplicas pegam entradas diferentes,
+            # e as pegas ficam adiadas até reservado_ate para não serem processadas de novo
+            rows = await conn.fetch('''
+                UPDATE fila_remocao SET proxima_tentativa = $3
+                WHERE user_id IN (
+                    SELECT user_id FROM fila_remocao
+                    WHERE proxima_tentativa <= $1
+                    ORDER BY proxima_tentativa
+                    LIMIT $2
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING user_id, link_invite, tentativas
+            ''', agora, limite, reservado_ate)
+            return [tuple(row) for row in rows]
+        except Exception as e:
+            logger.error("Erro ao reservar fila de remoção: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def concluir_remocao(self, conn, user_id):
+        try:
+            await conn.execute('DELETE FROM fila_remocao WHERE user_id = $1', user_id)
+        except Exception as e:
+            logger.error("Erro ao concluir remoção: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def adiar_remocao(self, conn, user_id, proxima_tentativa):
+        try:
+            await conn.execute(
+                'UPDATE fila_remocao SET tentativas = tentativas + 1, proxima_tentativa = $1 WHERE user_id = $2',
+                proxima_tentativa, user_id
+            )
+        except Exception as e:
+            logger.error("Erro ao adiar remoção: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def reservar_ativacao(self, conn, payment_id, token, agora, reservado_ate):
+        try:
+            # O UPDATE trava a linha do pagamento: de duas réplicas concorrentes, a segunda
+            # espera o commit da primeira, reavalia o WHERE e não atualiza nada
+            resultado = await conn.execute('''
+                UPDATE pagamentos SET token = $1, reservado_ate = $2
+                WHERE payment_id = $3 AND estado = 'approved' AND (reservado_ate IS NULL OR reservado_ate < $4)
+            ''', token, reservado_ate, payment_id, agora)
+            return resultado != 'UPDATE 0'
+        except Exception as e:
+            logger.error("Erro ao reservar ativação: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def concluir_ativacao(self, conn, token, user_id, payment_id, data_expiracao, link_invite, agora):
+        try:
+            async with conn.transaction():
+                resultado = await conn.execute('''
+                    UPDATE pagamentos SET estado = 'activated', token = NULL, reservado_ate = NULL, atualizado_em = $1
+                    WHERE payment_id = $2 AND token = $3 AND estado = 'approved'
+                ''', agora, payment_id, token)
+                if resultado == 'UPDATE 0':
+                    # Reserva vencida: outro processo assumiu a ativação
+                    return False
+                await conn.execute(SALVAR_ASSINATURA, user_id, payment_id, data_expiracao, link_invite)
+            return True
+        except Exception as e:
+            logger.error("Erro ao concluir ativação: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def liberar_ativacao(self, conn, payment_id, token):
+        try:
+            await conn.execute(
+                "UPDATE pagamentos SET token = NULL, reservado_ate = NULL WHERE payment_id = $1 AND token = $2 AND estado = 'approved'",
+                payment_id, token
+            )
+        except Exception as e:
+            logger.error("Erro ao liberar ativação: %s", e, exc_info=True)
+            raise
+
+    async def exportar_assinaturas(self, lote):
+        # Cursor no servidor dentro de uma transação somente leitura: o PostgreSQL entrega
+        # `lote` linhas por vez de um mesmo snapshot da tabela
+        pool = await self._obter_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction(isolation='repeatable_read', readonly=True):
+                cursor = await conn.cursor('SELECT * FROM assinaturas')
+                while True:
+                    rows = await cursor.fetch(lote)
+                    if rows:
+                        yield [_assinatura(row) for row in rows]
+                    if len(rows) < lote:
+                        return
+
+    @conexao
+    async def resumo_assinaturas(self, conn, agora, expira_ate):
+        try:
+            row = await conn.fetchrow('''
+                SELECT COUNT(*), COUNT(*) FILTER (WHERE data_expiracao <= $2)
+                FROM assinaturas WHERE data_expiracao > $1
+            ''', agora, expira_ate)
+            return tuple(row)
+        except Exception as e:
+            logger.error("Erro ao resumir assinaturas: %s", e, exc_info=True)
+            raise
+
+    @conexao
+    async def pagamentos_por_mes(self, conn, estados):
+        try:
+            rows = await conn.fetch('''
+                SELECT to_char(criado_em, 'YYYY-MM') AS mes, COUNT(*) FROM pagamentos
+                WHERE estado = ANY($1::text[])
+                GROUP BY mes ORDER BY mes
+            ''', list(estados))
+            return [tuple(row) for row in rows]
+        except Exception as e:
+            logger.error("Erro ao agrupar pagamentos por mês: %s", e, exc_info=True)
+            raise
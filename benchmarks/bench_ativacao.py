@@ -0,0 +1,119 @@
+"""Disputa de vários processos pela ativação dos mesmos pagamentos aprovados.
+
+Cada processo simula uma réplica do bot que tenta ativar todos os pagamentos, em ordem
+aleatória e com várias ativações em paralelo. Compara a checagem ingênua (lê a
+assinatura e gera o link se ainda não houver) com a reserva no banco:
+
+    python benchmarks/bench_ativacao.py --processos 4 --pagamentos 500
+    python benchmarks/bench_ativacao.py --url postgresql://localhost/bench_bot
+
+Com --url postgresql:// use um banco descartável: as tabelas do bot são criadas nele.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+
+async def _ativar_ingenuo(db, user_id, payment_id, latencia):
+    assinatura = await db.get_assinatura_por_pagamento(payment_id)
+    if assinatura.link_invite:
+        return 0
+    await asyncio.sleep(latencia)  # create_chat_invite_link
+    await db.salvar_assinatura(user_id, payment_id, datetime.now() + timedelta(days=30), f'https://t.me/+{payment_id}')
+    return 1
+
+
+async def _ativar_reserva(db, user_id, payment_id, latencia):
+    token = await db.reservar_ativacao(payment_id)
+    if token is None:
+        return 0
+    await asyncio.sleep(latencia)  # create_chat_invite_link
+    await db.concluir_ativacao(token, user_id, payment_id, datetime.now() + timedelta(days=30), f'https://t.me/+{payment_id}')
+    return 1
+
+
+async def _replica(url, modo, pagamentos, latencia, concorrencia, semente):
+    db = Database(url, cache_tamanho=0)
+    ativar = _ativar_reserva if modo == 'reserva' else _ativar_ingenuo
+    ordem = list(pagamentos)
+    random.Random(semente).shuffle(ordem)
+    semaforo = asyncio.Semaphore(concorrencia)
+
+    async def tentar(user_id, payment_id):
+        async with semaforo:
+            return await ativar(db, user_id, payment_id, latencia)
+
+    links = sum(await asyncio.gather(*(tentar(user_id, payment_id) for user_id, payment_id in ordem)))
+    await db.fechar()
+    return links
+
+
+def replica(url, modo, pagamentos, latencia, concorrencia, semente, largada, resultados):
+    largada.wait()
+    resultados.put(asyncio.run(_replica(url, modo, pagamentos, latencia, concorrencia, semente)))
+
+
+async def semear(url, pagamentos):
+    db = Database(url, cache_tamanho=0)
+    expiracao = datetime.now() + timedelta(days=30)
+    for user_id, payment_id in pagamentos:
+        # A checagem ingênua olha a assinatura pendente; a reserva, o pagamento aprovado
+        await db.salvar_assinatura(user_id, payment_id, expiracao)
+        await db.registrar_pagamento(payment_id, user_id)
+        await db.atualizar_estado_pagamento(payment_id, 'approved', 'approved')
+    await db.fechar()
+
+
+def medir(url, modo, processos, quantidade, latencia, concorrencia):
+    # Ids novos a cada rodada: não colidem com rodadas anteriores no mesmo banco
+    base = int(time.time() * 1000) * 10_000
+    pagamentos = [(base + i, f'bench-{base + i}') for i in range(quantidade)]
+    asyncio.run(semear(url, pagamentos))
+
+    contexto = multiprocessing.get_context('spawn')
+    largada = contexto.Event()
+    resultados = contexto.Queue()
+    grupo = [
+        contexto.Process(target=replica, args=(url, modo, pagamentos, latencia, concorrencia, semente, largada, resultados))
+        for semente in range(processos)
+    ]
+    for processo in grupo:
+        processo.start()
+    time.sleep(1.0)  # deixa todos os processos importarem os módulos antes da largada
+    inicio = time.perf_counter()
+    largada.set()
+    links = sum(resultados.get() for _ in grupo)
+    duracao = time.perf_counter() - inicio
+    for processo in grupo:
+        processo.join()
+    return links, duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='DATABASE_URL (padrão: arquivo SQLite temporário)')
+    parser.add_argument('--processos', type=int, default=4)
+    parser.add_argument('--pagamentos', type=int, default=500)
+    parser.add_argument('--latencia', type=float, default=0.02, help='duração simulada de create_chat_invite_link')
+    parser.add_argument('--concorrencia', type=int, default=16, help='ativações em paralelo por processo')
+    args = parser.parse_args()
+
+    url = args.url or os.path.join(tempfile.mkdtemp(prefix='bench_ativacao_'), 'assinaturas.db')
+    print(f"{'modo':>9} {'links':>7} {'duplicados':>11} {'segundos':>9} {'pagamentos/s':>13}")
+    for modo in ('ingenuo', 'reserva'):
+        links, duracao = medir(url, modo, args.processos, args.pagamentos, args.latencia, args.concorrencia)
+        print(f"{modo:>9} {links:>7} {links - args.pagamentos:>11} {duracao:>9.2f} {args.pagamentos / duracao:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Latência de Database.get_assinatura com e sem o cache de assinaturas.
+
+Popula um banco temporário e consulta usuários com distribuição concentrada
+(poucos usuários repetindo cliques, como no spam de /status):
+
+    python benchmarks/bench_cache.py --usuarios 10000 --consultas 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+
+async def medir(caminho, tamanho_cache, ids):
+    db = Database(caminho, cache_tamanho=tamanho_cache)
+    latencias = []
+    for user_id in ids:
+        inicio = time.perf_counter()
+        await db.get_assinatura(user_id)
+        latencias.append(time.perf_counter() - inicio)
+    estatisticas = db.cache.estatisticas()
+    await db.fechar()
+    latencias.sort()
+    return {
+        'media_us': statistics.fmean(latencias) * 1e6,
+        'p99_us': latencias[int(len(latencias) * 0.99)] * 1e6,
+        'taxa_acerto': estatisticas['taxa_acerto'] if tamanho_cache else 0.0,
+    }
+
+
+async def popular(caminho, usuarios):
+    db = Database(caminho, cache_tamanho=0)
+    expiracao = datetime.now() + timedelta(days=30)
+    for user_id in range(usuarios):
+        await db.salvar_assinatura(user_id, str(user_id), expiracao, f'https://t.me/+{user_id}')
+    await db.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=10000)
+    parser.add_argument('--consultas', type=int, default=50000)
+    parser.add_argument('--cache', type=int, default=10000, help='tamanho do cache')
+    parser.add_argument('--zipf', type=float, default=1.2, help='concentração dos acessos')
+    args = parser.parse_args()
+
+    caminho = os.path.join(tempfile.mkdtemp(prefix='bench_cache_'), 'assinaturas.db')
+    asyncio.run(popular(caminho, args.usuarios))
+
+    # IDs a partir de --usuarios não são assinantes e exercitam o cache negativo
+    aleatorio = random.Random(42)
+    pesos = [1 / (i + 1) ** args.zipf for i in range(args.usuarios * 2)]
+    ids = aleatorio.choices(range(args.usuarios * 2), weights=pesos, k=args.consultas)
+    aleatorio.shuffle(ids)
+
+    print(f"{'cenário':>10} {'média (µs)':>11} {'p99 (µs)':>10} {'acertos':>8}")
+    for nome, tamanho in (('sem cache', 0), ('com cache', args.cache)):
+        r = asyncio.run(medir(caminho, tamanho, ids))
+        print(f"{nome:>10} {r['media_us']:>11.1f} {r['p99_us']:>10.1f} {r['taxa_acerto']:>8.1%}")
+
+
+if __name__ == '__main__':
+    main()
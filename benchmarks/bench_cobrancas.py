@@ -0,0 +1,111 @@
+"""Cobranças criadas no Mercado Pago com /assinar repetido, sem e com o controle por usuário.
+
+--usuarios usuários pedem uma cobrança; uma fração deles (--spam) aperta /assinar ou o
+botão --cliques vezes seguidas. Sem o controle cada clique cria uma cobrança real; com
+ele o usuário recebe de novo a cobrança pendente e cobranças novas são limitadas pela
+janela deslizante. Também mede o custo do controle por update com --estado usuários
+já na memória:
+
+    python benchmarks/bench_cobrancas.py --usuarios 2000 --spam 0.2 --cliques 20
+    python benchmarks/bench_cobrancas.py --reuso 0   # só a janela deslizante
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:TESTE')
+os.environ.setdefault('VIP_GROUP_ID', '-1001')
+
+import bot  # noqa: E402
+from cache import CacheLRU  # noqa: E402
+from limitador import JanelaDeslizante  # noqa: E402
+from metricas import registro as metricas  # noqa: E402
+
+
+class PagamentosFalsos:
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self.criadas = 0
+        self._ids = itertools.count(1)
+
+    async def criar_pagamento_pix(self, valor, descricao, expiracao=None):
+        self.criadas += 1
+        await asyncio.sleep(self.latencia)
+        return {'pix_code': '00020126580014br.gov.bcb.pix', 'id': next(self._ids), 'status': 'pending'}
+
+
+def configurar(controle, tamanho, reuso_minutos=bot.COBRANCA_REUSO_MINUTOS):
+    if controle:
+        bot.cobrancas_pendentes = CacheLRU('bench_reuso', tamanho if reuso_minutos else 0, ttl=reuso_minutos * 60)
+        bot.limite_cobrancas = JanelaDeslizante('bench', bot.COBRANCA_LIMITE, bot.COBRANCA_JANELA, tamanho)
+    else:
+        bot.cobrancas_pendentes = CacheLRU('bench_sem_reuso', 0)
+        bot.limite_cobrancas = JanelaDeslizante('bench_sem_limite', 0, bot.COBRANCA_JANELA)
+
+
+async def simular(controle, args):
+    configurar(controle, args.estado, args.reuso)
+    bot.pagamentos = PagamentosFalsos(args.latencia)
+    contexto = SimpleNamespace(bot_data={})
+    aleatorio = random.Random(42)
+    latencias = []
+
+    async def usuario(user_id, cliques):
+        # Os cliques de um usuário são tratados em ordem, como no ProcessadorPorUsuario
+        for _ in range(cliques):
+            inicio = time.perf_counter()
+            await bot.obter_pagamento_pix(contexto, user_id)
+            latencias.append(time.perf_counter() - inicio)
+
+    await asyncio.gather(*(
+        usuario(user_id, args.cliques if aleatorio.random() < args.spam else 1)
+        for user_id in range(args.usuarios)
+    ))
+    return bot.pagamentos.criadas, len(latencias), sum(latencias) / len(latencias)
+
+
+def custo_por_update(tamanho, amostras=200000):
+    # Custo do controle quando o usuário já tem cobrança pendente, com `tamanho` usuários em memória
+    configurar(True, tamanho)
+    for user_id in range(tamanho):
+        bot.limite_cobrancas.registrar(user_id)
+        bot.cobrancas_pendentes.colocar(user_id, {'id': user_id})
+    ids = [random.randrange(tamanho) for _ in range(amostras)]
+    inicio = time.perf_counter()
+    for user_id in ids:
+        if bot.cobrancas_pendentes.obter(user_id) is None:
+            bot.limite_cobrancas.espera(user_id)
+    return (time.perf_counter() - inicio) / amostras
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=2000)
+    parser.add_argument('--spam', type=float, default=0.2, help='fração de usuários que repetem o clique')
+    parser.add_argument('--cliques', type=int, default=20, help='cliques de cada usuário que repete')
+    parser.add_argument('--latencia', type=float, default=0.05, help='latência da criação do PIX (s)')
+    parser.add_argument('--reuso', type=int, default=bot.COBRANCA_REUSO_MINUTOS,
+                        help='minutos de reuso da cobrança pendente (0 deixa só a janela deslizante)')
+    parser.add_argument('--estado', type=int, default=100000, help='usuários mantidos em memória')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"{'controle':>9} {'cliques':>8} {'cobranças criadas':>18} {'latência média (ms)':>20}")
+    for controle in (False, True):
+        criadas, cliques, media = asyncio.run(simular(controle, args))
+        print(f"{'com' if controle else 'sem':>9} {cliques:>8} {criadas:>18} {media * 1e3:>20.2f}")
+    print(f"reusadas: {metricas.contador('bench_reuso_acertos_total').valor}, "
+          f"bloqueadas pela janela: {metricas.contador('bench_bloqueados_total').valor}")
+    for tamanho in (1000, args.estado):
+        print(f"custo por update com {tamanho} usuários em memória: {custo_por_update(tamanho) * 1e9:.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Custo da remoção de assinaturas expiradas em uma tabela grande.
+
+Compara o fluxo antigo (SELECT sem índice + DELETE e commit por linha) com a remoção
+em lotes pelo índice de expiração, sobre a mesma tabela semeada:
+
+    python benchmarks/bench_expiracao.py --linhas 200000 --expiradas 0.5
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from armazenamento import para_texto  # noqa: E402
+from database import Database  # noqa: E402
+
+ESQUEMA = '''
+    CREATE TABLE assinaturas (
+        user_id INTEGER PRIMARY KEY,
+        payment_id TEXT,
+        data_expiracao TIMESTAMP,
+        link_invite TEXT
+    )
+'''
+
+
+def semear(caminho, linhas, proporcao_expiradas, semente=42):
+    aleatorio = random.Random(semente)
+    agora = datetime.now()
+    conn = sqlite3.connect(caminho)
+    conn.execute(ESQUEMA)
+    conn.executemany(
+        'INSERT INTO assinaturas VALUES (?, ?, ?, ?)',
+        (
+            (
+                user_id,
+                str(user_id),
+                para_texto(agora + timedelta(minutes=aleatorio.randint(-43200, -1) if aleatorio.random() < proporcao_expiradas
+                                             else aleatorio.randint(1, 43200))),
+                f'https://t.me/+{user_id}',
+            )
+            for user_id in range(linhas)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def fluxo_antigo(caminho, amostra):
+    conn = sqlite3.connect(caminho)
+    plano = conn.execute('EXPLAIN QUERY PLAN SELECT user_id FROM assinaturas WHERE data_expiracao < ?', (para_texto(datetime.now()),)).fetchall()
+    inicio = time.perf_counter()
+    expirados = [row[0] for row in conn.execute('SELECT user_id FROM assinaturas WHERE data_expiracao < ?', (para_texto(datetime.now()),))]
+    tempo_busca = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for user_id in expirados[:amostra]:
+        conn.execute('DELETE FROM assinaturas WHERE user_id = ?', (user_id,))
+        conn.commit()
+    tempo_amostra = time.perf_counter() - inicio
+    conn.close()
+    estimado = tempo_amostra / max(1, min(amostra, len(expirados))) * len(expirados)
+    return plano[0][-1], len(expirados), tempo_busca, estimado
+
+
+async def fluxo_novo(caminho, lote):
+    db = Database(caminho, cache_tamanho=0)
+    plano = db.armazenamento.motor.submeter_leitura(
+        lambda conn: conn.execute(
+            'EXPLAIN QUERY PLAN SELECT user_id FROM assinaturas WHERE data_expiracao < ? ORDER BY data_expiracao LIMIT ?',
+            (para_texto(datetime.now()), lote)
+        ).fetchall()
+    ).result()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    total = 0
+    async for removidas in db.remover_expiradas(lote=lote):
+        total += len(removidas)
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await db.fechar()
+    return plano[0][-1], total, duracao, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=200000)
+    parser.add_argument('--expiradas', type=float, default=0.5, help='proporção de assinaturas vencidas')
+    parser.add_argument('--amostra', type=int, default=500, help='DELETEs medidos no fluxo antigo (o resto é estimado)')
+    parser.add_argument('--lote', type=int, default=1000)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='bench_expiracao_')
+    base = os.path.join(pasta, 'base.db')
+    semear(base, args.linhas, args.expiradas)
+    antigo, novo = os.path.join(pasta, 'antigo.db'), os.path.join(pasta, 'novo.db')
+    shutil.copy(base, antigo)
+    shutil.copy(base, novo)
+
+    plano, expirados, busca, estimado = fluxo_antigo(antigo, args.amostra)
+    print(f"Antigo: {plano}")
+    print(f"  busca de {expirados} expiradas: {busca * 1000:.1f} ms")
+    print(f"  DELETE + commit por linha: ~{estimado:.1f} s (estimado por {args.amostra} linhas)")
+
+    plano, removidas, duracao, pico = asyncio.run(fluxo_novo(novo, args.lote))
+    print(f"Novo: {plano}")
+    print(f"  {removidas} removidas em lotes de {args.lote}: {duracao:.2f} s, pico de memória {pico / 1024:.0f} KiB")
+    shutil.rmtree(pasta)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Memória e tempo do relatório de administração e da exportação das assinaturas.
+
+Semeia --linhas assinaturas e --linhas cobranças e compara, cada modo em um processo
+novo (o pico de RSS é o do próprio modo):
+
+- dicts: carrega a tabela como um dicionário por linha, como o get_assinatura antigo,
+  e calcula o relatório em Python;
+- registros: o mesmo, com os registros Assinatura (namedtuple);
+- relatorio: contagens no banco (Database.resumo_assinaturas e pagamentos_por_mes);
+- csv / jsonl: exportação em streaming com relatorios.exportar.
+
+    python benchmarks/bench_exportacao.py --linhas 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from armazenamento import Assinatura, para_texto  # noqa: E402
+from database import Database, ESTADOS_PAGOS  # noqa: E402
+from relatorios import exportar, gerar_relatorio  # noqa: E402
+
+MODOS = ('dicts', 'registros', 'relatorio', 'csv', 'jsonl')
+VALOR = 10.0
+
+
+def semear(caminho, linhas, semente=42):
+    asyncio.run(Database(caminho, cache_tamanho=0).fechar())
+    aleatorio = random.Random(semente)
+    agora = datetime.now()
+    conn = sqlite3.connect(caminho)
+    conn.executemany(
+        'INSERT INTO assinaturas VALUES (?, ?, ?, ?)',
+        (
+            (user_id, str(user_id), para_texto(agora + timedelta(minutes=aleatorio.randint(-43200, 43200))),
+             f'https://t.me/+{user_id:010d}')
+            for user_id in range(linhas)
+        )
+    )
+    estados = ('activated', 'activated', 'activated', 'approved', 'expired', 'pending')
+    conn.executemany(
+        "INSERT INTO pagamentos (payment_id, user_id, estado, criado_em, atualizado_em) VALUES (?, ?, ?, ?, ?)",
+        (
+            (str(user_id), user_id, aleatorio.choice(estados),
+             para_texto(agora - timedelta(minutes=aleatorio.randint(0, 525600))), para_texto(agora))
+            for user_id in range(linhas)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def relatorio_em_python(assinaturas, pagamentos, agora, dias=7):
+    # O que um relatório feito sobre get_assinatura teria de calcular linha por linha
+    limite = agora + timedelta(days=dias)
+    ativas = expirando = 0
+    for data_expiracao in assinaturas:
+        if data_expiracao > agora:
+            ativas += 1
+            expirando += data_expiracao <= limite
+    meses = Counter(criado_em[:7] for estado, criado_em in pagamentos if estado in ESTADOS_PAGOS)
+    return ativas, expirando, sorted((mes, n, n * VALOR) for mes, n in meses.items())
+
+
+def carregar(caminho, modo):
+    conn = sqlite3.connect(caminho)
+    if modo == 'dicts':
+        linhas = [
+            {'user_id': row[0], 'payment_id': row[1], 'data_expiracao': datetime.fromisoformat(row[2]), 'link_invite': row[3]}
+            for row in conn.execute('SELECT * FROM assinaturas')
+        ]
+        pagamentos = [dict(zip(('estado', 'criado_em'), row)) for row in conn.execute('SELECT estado, criado_em FROM pagamentos')]
+        expiracoes, cobrancas = (linha['data_expiracao'] for linha in linhas), ((p['estado'], p['criado_em']) for p in pagamentos)
+    else:
+        linhas = [Assinatura(row[0], row[1], datetime.fromisoformat(row[2]), row[3]) for row in conn.execute('SELECT * FROM assinaturas')]
+        pagamentos = conn.execute('SELECT estado, criado_em FROM pagamentos').fetchall()
+        expiracoes, cobrancas = (linha.data_expiracao for linha in linhas), pagamentos
+    conn.close()
+    return relatorio_em_python(expiracoes, cobrancas, datetime.now())
+
+
+async def medir_banco(caminho, modo, pasta):
+    db = Database(caminho, cache_tamanho=0)
+    try:
+        if modo == 'relatorio':
+            return await gerar_relatorio(db, VALOR)
+        with open(os.path.join(pasta, f'assinaturas.{modo}'), 'w', newline='', encoding='utf-8') as arquivo:
+            return await exportar(db, arquivo, modo)
+    finally:
+        await db.fechar()
+
+
+def medir(caminho, modo):
+    # Executado no processo filho: imprime segundos e pico de memória acima da base
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    if modo in ('dicts', 'registros'):
+        carregar(caminho, modo)
+    else:
+        asyncio.run(medir_banco(caminho, modo, os.path.dirname(caminho)))
+    duracao = time.perf_counter() - inicio
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+    print(json.dumps({'segundos': duracao, 'pico_mb': pico / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--modos', default=','.join(MODOS))
+    parser.add_argument('--medir', choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument('--caminho', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.medir:
+        medir(args.caminho, args.medir)
+        return
+
+    registro = Assinatura(1, '1', datetime.now(), 'https://t.me/+0000000001')
+    print(f"por registro (sem os valores): dict {sys.getsizeof(registro._asdict())} B, "
+          f"namedtuple {sys.getsizeof(registro)} B")
+    caminho = os.path.join(tempfile.mkdtemp(prefix='bench_exportacao_'), 'assinaturas.db')
+    inicio = time.perf_counter()
+    semear(caminho, args.linhas)
+    print(f"{args.linhas} assinaturas e cobranças semeadas em {time.perf_counter() - inicio:.1f}s")
+
+    print(f"{'modo':>10} {'segundos':>9} {'pico (MB)':>10}")
+    for modo in args.modos.split(','):
+        saida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--medir', modo, '--caminho', caminho],
+            stdout=subprocess.PIPE, text=True, check=True,
+        ).stdout
+        resultado = json.loads(saida.splitlines()[-1])
+        print(f"{modo:>10} {resultado['segundos']:>9.2f} {resultado['pico_mb']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Compara o gateway com pool e retentativas contra um cliente sem pool, como o SDK antigo.
+
+Sobe o Mercado Pago falso com latência e taxa de erro e dispara criações e consultas:
+
+    python benchmarks/bench_gateway.py --chamadas 2000 --latencia 0.02 --taxa-erro 0.05
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MERCADO_PAGO_ACCESS_TOKEN', 'TEST-benchmark')
+
+import httpx  # noqa: E402
+
+from gateway import GatewayMercadoPago  # noqa: E402
+from metricas import registro as metricas  # noqa: E402
+from mercadopago_falso import MercadoPagoFalso  # noqa: E402
+from pagamentos import Pagamentos  # noqa: E402
+
+
+class GatewaySemPool:
+    """Uma conexão nova por chamada, sem prazo total, retentativa ou circuit breaker."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    async def requisitar(self, metodo, caminho, operacao, chave_idempotencia=None, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(base_url=self.base_url, timeout=10) as client:
+                return await client.request(metodo, caminho, **kwargs)
+        finally:
+            metricas.histograma(f'sem_pool_{operacao}_segundos').observar(time.perf_counter() - inicio)
+
+    async def fechar(self):
+        pass
+
+
+async def rodar(pagamentos, chamadas, concorrencia):
+    semaforo = asyncio.Semaphore(concorrencia)
+    erros = 0
+
+    async def fluxo():
+        nonlocal erros
+        async with semaforo:
+            pagamento = await pagamentos.criar_pagamento_pix(10.00, "Assinatura VIP - 30 dias")
+            if 'error' in pagamento:
+                erros += 1
+                return
+            if 'error' in await pagamentos.verificar_pagamento(pagamento['id']):
+                erros += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(fluxo() for _ in range(chamadas)))
+    return time.perf_counter() - inicio, erros
+
+
+async def main(args):
+    logging.basicConfig(level=logging.CRITICAL)
+    servidor = await MercadoPagoFalso(args.latencia, args.taxa_erro, semente=42).iniciar()
+    cenarios = [
+        ('sem pool', GatewaySemPool(servidor.url), 'sem_pool_'),
+        ('gateway', GatewayMercadoPago('TEST', base_url=servidor.url, max_conexoes=args.concorrencia,
+                                       backoff_base=0.01, limite_falhas=args.concorrencia * 4), 'mercadopago_'),
+    ]
+    print(f"{'cenário':>10} {'fluxos/s':>9} {'erros':>6} {'criados':>8} {'criar p50/p99 (s)':>18} {'verificar p50/p99 (s)':>22}")
+    for nome, gateway, prefixo in cenarios:
+        servidor.pagamentos.clear()
+        pagamentos = Pagamentos(gateway=gateway)
+        duracao, erros = await rodar(pagamentos, args.chamadas, args.concorrencia)
+        await pagamentos.fechar()
+        criar = metricas.histograma(f'{prefixo}criar_pagamento_segundos')
+        verificar = metricas.histograma(f'{prefixo}verificar_pagamento_segundos')
+        print(f"{nome:>10} {args.chamadas / duracao:>9.1f} {erros:>6} {len(servidor.pagamentos):>8} "
+              f"{criar.percentil(50):>8} / {criar.percentil(99):<7} {verificar.percentil(50):>10} / {verificar.percentil(99):<8}")
+    await servidor.parar()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chamadas', type=int, default=1000)
+    parser.add_argument('--concorrencia', type=int, default=20)
+    parser.add_argument('--latencia', type=float, default=0.02)
+    parser.add_argument('--taxa-erro', type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""Vazão de updates com long polling e com o ingresso por webhook em N processos.
+
+Sobe o servidor falso da Bot API, inicia o bot.py de verdade em outro processo apontando
+para ele e mede o tempo para responder --updates comandos /status de --usuarios usuários:
+
+    python benchmarks/bench_ingresso.py --updates 3000 --workers 1,2,4
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from telegram_falso import TelegramFalso, update_comando
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def gerar_updates(quantidade, usuarios, semente=42):
+    aleatorio = random.Random(semente)
+    return [update_comando(i + 1, 10_000 + aleatorio.randrange(usuarios), '/status') for i in range(quantidade)]
+
+
+async def medir(workers, updates, latencia, concorrencia):
+    telegram = await TelegramFalso(latencia).iniciar()
+    ambiente = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN='123456:TESTE',
+        VIP_GROUP_ID='-1001',
+        MERCADO_PAGO_ACCESS_TOKEN='TEST-benchmark',
+        TELEGRAM_API_URL=telegram.url,
+        ENVIO_TAXA_GLOBAL='100000',
+        ENVIO_TAXA_CHAT='100000',
+    )
+    if workers:
+        porta = porta_livre()
+        ambiente.update(
+            TELEGRAM_WEBHOOK_URL=f'http://127.0.0.1:{porta}/telegram',
+            TELEGRAM_WEBHOOK_PORT=str(porta),
+            TELEGRAM_WEBHOOK_SECRET='segredo-benchmark',
+            INGRESSO_WORKERS=str(workers),
+        )
+    processo = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(RAIZ, 'bot.py'),
+        cwd=tempfile.mkdtemp(prefix='bench_ingresso_'), env=ambiente,
+        stdout=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        # Pronto: polling já chamou getUpdates; webhook registrado e todos os processos no ar
+        if workers:
+            await telegram.esperar('setWebhook', 1)
+            await telegram.esperar('getMe', workers + 1)
+        else:
+            await telegram.esperar('getUpdates', 1)
+
+        inicio = time.perf_counter()
+        if workers:
+            semaforo = asyncio.Semaphore(concorrencia)
+            async with aiohttp.ClientSession() as sessao:
+                async def entregar(update):
+                    async with semaforo:
+                        await telegram.entregar(sessao, update)
+
+                await asyncio.gather(*(entregar(update) for update in updates))
+                await telegram.esperar('sendMessage', len(updates))
+        else:
+            telegram.publicar(updates)
+            await telegram.esperar('sendMessage', len(updates))
+        return time.perf_counter() - inicio
+    finally:
+        processo.send_signal(signal.SIGINT)
+        await processo.wait()
+        await telegram.parar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=3000)
+    parser.add_argument('--usuarios', type=int, default=1000)
+    parser.add_argument('--workers', default='1,2,4', help='processos trabalhadores no modo webhook')
+    parser.add_argument('--latencia', type=float, default=0.01, help='latência de cada chamada à Bot API')
+    parser.add_argument('--concorrencia', type=int, default=40, help='conexões simultâneas ao webhook (padrão do Telegram)')
+    args = parser.parse_args()
+
+    updates = gerar_updates(args.updates, args.usuarios)
+    print(f"{'modo':>12} {'segundos':>9} {'updates/s':>10}")
+    for workers in [0] + [int(w) for w in args.workers.split(',')]:
+        duracao = asyncio.run(medir(workers, updates, args.latencia, args.concorrencia))
+        modo = f'webhook x{workers}' if workers else 'polling'
+        print(f"{modo:>12} {duracao:>9.2f} {args.updates / duracao:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
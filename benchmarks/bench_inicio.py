@@ -0,0 +1,109 @@
+"""Tempo de inicialização do bot: importação por módulo e tempo até o primeiro update.
+
+Mostra o perfil de `python -X importtime -c "import bot"` (os módulos importados
+diretamente pelo bot, por tempo acumulado) e mede, em várias rodadas, o tempo entre
+iniciar o processo bot.py e a resposta ao primeiro /start, com Telegram e Mercado Pago
+falsos. Com --raiz compara outra cópia do projeto (um `git worktree` de outro commit):
+
+    python benchmarks/bench_inicio.py --rodadas 5
+    python benchmarks/bench_inicio.py --raiz /tmp/versao_anterior
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mercadopago_falso import MercadoPagoFalso
+from telegram_falso import TelegramFalso, update_comando
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USUARIO = 4242
+
+
+def ambiente(raiz, telegram=None, mercadopago=None):
+    ambiente = dict(
+        os.environ,
+        PYTHONPATH=raiz,
+        TELEGRAM_BOT_TOKEN='123456:INICIO',
+        VIP_GROUP_ID='-1001',
+        MERCADO_PAGO_ACCESS_TOKEN='TEST-inicio',
+    )
+    if telegram:
+        ambiente.update(TELEGRAM_API_URL=telegram.url, MERCADO_PAGO_BASE_URL=mercadopago.url)
+    return ambiente
+
+
+def perfil_importacao(raiz):
+    """(total em s, [(módulo, acumulado em s)]) dos imports feitos diretamente pelo bot."""
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import bot'],
+        cwd=tempfile.mkdtemp(prefix='bench_inicio_'), env=ambiente(raiz),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    )
+    diretos, pendentes = [], []
+    for linha in resultado.stderr.splitlines():
+        # "import time:       self |  acumulado |   <recuo por nível>módulo"
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, nome = linha[len('import time:'):].split('|')
+        nivel = (len(nome) - len(nome.lstrip()) - 1) // 2
+        if nivel == 1:
+            pendentes.append((nome.strip(), int(acumulado) / 1e6))
+        elif nivel == 0:
+            if nome.strip() == 'bot':
+                diretos = sorted(pendentes, key=lambda item: item[1], reverse=True)
+                return int(acumulado) / 1e6, diretos
+            pendentes = []
+    raise RuntimeError('import bot não apareceu na saída de -X importtime')
+
+
+async def primeiro_update(raiz):
+    """Segundos entre iniciar o bot.py e a resposta ao /start já publicado."""
+    telegram = await TelegramFalso().iniciar()
+    mercadopago = await MercadoPagoFalso().iniciar()
+    telegram.acompanhar(USUARIO)
+    telegram.publicar([update_comando(1, USUARIO, '/start')])
+    inicio = time.perf_counter()
+    processo = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(raiz, 'bot.py'),
+        cwd=tempfile.mkdtemp(prefix='bench_inicio_'), env=ambiente(raiz, telegram, mercadopago),
+        stdout=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            metodo, _ = await telegram.receber(USUARIO, timeout=60)
+            if metodo == 'sendMessage':
+                return time.perf_counter() - inicio
+    finally:
+        if processo.returncode is None:
+            processo.terminate()
+            await processo.wait()
+        await telegram.parar()
+        await mercadopago.parar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--raiz', default=RAIZ, help='pasta do projeto a medir')
+    parser.add_argument('--rodadas', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='módulos listados no perfil de importação')
+    args = parser.parse_args()
+    raiz = os.path.abspath(args.raiz)
+
+    importacoes = [perfil_importacao(raiz) for _ in range(args.rodadas)]
+    total, modulos = min(importacoes, key=lambda item: item[0])
+    print(f"import bot: {total * 1e3:.0f} ms (melhor de {args.rodadas})")
+    for nome, acumulado in modulos[:args.top]:
+        print(f"  {acumulado * 1e3:>7.1f} ms  {nome}")
+
+    tempos = [asyncio.run(primeiro_update(raiz)) for _ in range(args.rodadas)]
+    print(f"início do processo até a resposta ao primeiro /start: mediana {statistics.median(tempos) * 1e3:.0f} ms, "
+          f"mínimo {min(tempos) * 1e3:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Custo por chamada da instrumentação de métodos assíncronos.
+
+Mede uma corrotina vazia (o pior caso: todo o tempo é da instrumentação) sem
+instrumentação, com a instrumentação desativada, ativa e ativa com rastreamento:
+
+    python benchmarks/bench_instrumentacao.py --chamadas 200000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from instrumentacao import Instrumentacao, _trilha  # noqa: E402
+
+
+class Servico:
+    async def consultar(self, chave):
+        return chave
+
+
+async def medir(instrumentacao, chamadas, rastrear):
+    servico = Servico() if instrumentacao is None else instrumentacao.objeto('bench', Servico())
+    if rastrear:
+        _trilha.set([])
+    consultar = servico.consultar
+    inicio = time.perf_counter()
+    for i in range(chamadas):
+        await consultar(i)
+    return (time.perf_counter() - inicio) / chamadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chamadas', type=int, default=200_000)
+    args = parser.parse_args()
+
+    cenarios = [
+        ('original', None, False),
+        ('desativada', Instrumentacao(), False),
+        ('ativa', Instrumentacao(ativa=True), False),
+        ('rastreando', Instrumentacao(rastrear=True), True),
+    ]
+    base = None
+    print(f"{'cenário':>11} {'ns/chamada':>11} {'adicional':>10}")
+    for nome, instrumentacao, rastrear in cenarios:
+        por_chamada = asyncio.run(medir(instrumentacao, args.chamadas, rastrear)) * 1e9
+        base = base or por_chamada
+        print(f"{nome:>11} {por_chamada:>11.0f} {por_chamada - base:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Latência de handlers que logam muito, com o logging antigo e com a fila de logs.
+
+Cada handler simulado faz o que os handlers do bot fazem: algumas linhas INFO com
+f-string (antes) ou %-formatação (depois), um debug com a resposta inteira do Mercado
+Pago (desligado em produção) e, de vez em quando, um erro com traceback. Threads extras
+logam ao mesmo tempo, como as do SQLite e do httpx.
+
+    python benchmarks/bench_logs.py --handlers 20000 --threads 2
+    python benchmarks/bench_logs.py --atraso-disco 0.002   # disco lento ou rede
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logs  # noqa: E402
+
+logger = logging.getLogger('bot')
+RESPOSTA = json.dumps({'id': 123, 'status': 'pending', 'point_of_interaction': {'qr_code': 'x' * 2000}})
+
+
+class Resposta:
+    # Como httpx.Response.text: decodifica o corpo a cada acesso
+    def __init__(self, corpo):
+        self._corpo = corpo.encode()
+
+    @property
+    def text(self):
+        return self._corpo.decode()
+
+
+def handler_antes(user_id, resposta, erro):
+    logger.info(f"Comando /assinar de {user_id}")
+    logger.info(f"Criando pagamento PIX para usuário {user_id}")
+    logger.debug(f"Resposta completa do Mercado Pago: {resposta.text}")
+    logger.info(f"Pagamento PIX criado com sucesso: ID={user_id * 7}")
+    if erro:
+        try:
+            raise ValueError('falha simulada')
+        except ValueError as e:
+            logger.error(f"Erro ao processar assinatura: {str(e)}", exc_info=True)
+
+
+def handler_depois(user_id, resposta, erro):
+    logger.info("Comando /assinar de %s", user_id)
+    logger.info("Criando pagamento PIX para usuário %s", user_id)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Resposta completa do Mercado Pago: %s", resposta.text)
+    logger.info("Pagamento PIX criado com sucesso: ID=%s", user_id * 7)
+    if erro:
+        try:
+            raise ValueError('falha simulada')
+        except ValueError as e:
+            logger.error("Erro ao processar assinatura: %s", e, exc_info=True)
+
+
+def configurar(modo, arquivo, atraso):
+    if modo == 'antes':
+        logging.basicConfig(
+            format=logs.FORMATO_TEXTO, level=logging.INFO, filename=arquivo, force=True
+        )
+        saida = logging.getLogger().handlers[0]
+    else:
+        logs.parar_logs()
+        os.environ.update(LOG_ARQUIVO=arquivo, LOG_NIVEL='INFO', LOG_FORMATO='json')
+        logs.configurar_logs()
+        saida = logs._saidas[0]
+    if atraso:
+        emitir = saida.emit
+
+        def emitir_devagar(record):
+            time.sleep(atraso)
+            emitir(record)
+
+        saida.emit = emitir_devagar
+
+
+async def medir(handler, quantidade, threads):
+    resposta = Resposta(RESPOSTA)
+    parar = threading.Event()
+
+    def ruido():
+        # Outras threads do processo logando ao mesmo tempo
+        ruido_logger = logging.getLogger('httpx')
+        while not parar.is_set():
+            ruido_logger.info("HTTP Request: POST https://api.telegram.org/bot/sendMessage \"HTTP/1.1 200 OK\"")
+            time.sleep(0.0005)
+
+    extras = [threading.Thread(target=ruido) for _ in range(threads)]
+    for thread in extras:
+        thread.start()
+    latencias = []
+    for i in range(quantidade):
+        inicio = time.perf_counter()
+        handler(i, resposta, i % 100 == 0)
+        latencias.append(time.perf_counter() - inicio)
+        if i % 50 == 0:
+            await asyncio.sleep(0)
+    parar.set()
+    for thread in extras:
+        thread.join()
+    latencias.sort()
+    return latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handlers', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=2, help='threads extras logando em paralelo')
+    parser.add_argument('--atraso-disco', type=float, default=0.0, help='segundos de atraso em cada gravação')
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='bench_logs_')
+    print(f"{'modo':>7} {'média (us)':>11} {'p50 (us)':>9} {'p99 (us)':>9} {'máx (ms)':>9}")
+    for modo, handler in (('antes', handler_antes), ('depois', handler_depois)):
+        configurar(modo, os.path.join(pasta, f'{modo}.log'), args.atraso_disco)
+        latencias = asyncio.run(medir(handler, args.handlers, args.threads))
+        media = sum(latencias) / len(latencias)
+        p50 = latencias[len(latencias) // 2]
+        p99 = latencias[int(len(latencias) * 0.99)]
+        print(f"{modo:>7} {media * 1e6:>11.1f} {p50 * 1e6:>9.1f} {p99 * 1e6:>9.1f} {latencias[-1] * 1e3:>9.2f}")
+    logs.parar_logs()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Identificação e recepção de mídias: midia.py contra o imghdr.what antigo (imghdr_antigo.py).
+
+Primeiro compara a identificação do tipo em uma mistura de cabeçalhos (incluindo JPEG sem
+JFIF/Exif, PDF, HEIC e arquivos desconhecidos, que fazem o imghdr rodar todos os testes).
+Depois recebe --arquivos uploads de --tamanho-kb KiB de uma Bot API falsa com latência:
+o caminho antigo grava cada download em arquivo temporário e chama imghdr.what(caminho),
+sem limite de downloads; RecepcaoMidia baixa em memória, com no máximo --downloads ao
+mesmo tempo.
+
+    python benchmarks/bench_midia.py --arquivos 200 --tamanho-kb 512 --downloads 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Bot  # noqa: E402
+
+import imghdr_antigo as imghdr  # noqa: E402
+from midia import RecepcaoMidia, identificar  # noqa: E402
+from telegram_falso import RequisicaoFalsa  # noqa: E402
+
+CABECALHOS = {
+    'jpeg (JFIF)': b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01',
+    'jpeg (Exif)': b'\xff\xd8\xff\xe1\x2f\xfeExif\x00\x00',
+    'jpeg (sem JFIF)': b'\xff\xd8\xff\xdb\x00\x84\x00\x06\x04\x05',
+    'png': b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR',
+    'webp': b'RIFF\x24\x10\x00\x00WEBPVP8 ',
+    'gif': b'GIF89a\x01\x00\x01\x00\x80\x00',
+    'pdf': b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n',
+    'heic': b'\x00\x00\x00\x18ftypheic\x00\x00\x00\x00',
+    'desconhecido': b'\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09\x0a\x0b',
+}
+
+
+class RequisicaoComArquivos(RequisicaoFalsa):
+    """Bot API falsa que também responde getFile e serve o conteúdo dos arquivos."""
+
+    def __init__(self, arquivos, latencia):
+        super().__init__()
+        self.arquivos = arquivos
+        self.latencia_download = latencia
+        self.simultaneos = 0
+        self.pico = 0
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if '/file/bot' in url:
+            self.simultaneos += 1
+            self.pico = max(self.pico, self.simultaneos)
+            try:
+                # O corpo ocupa memória enquanto o download está em andamento, como no httpx
+                corpo = bytes(memoryview(self.arquivos[url.rsplit('/', 1)[-1]]))
+                await asyncio.sleep(self.latencia_download)
+                return 200, corpo
+            finally:
+                self.simultaneos -= 1
+        if url.endswith('/getFile'):
+            file_id = request_data.parameters['file_id']
+            resultado = {'file_id': file_id, 'file_unique_id': file_id,
+                         'file_size': len(self.arquivos[file_id]), 'file_path': f'midia/{file_id}'}
+            return 200, json.dumps({'ok': True, 'result': resultado}).encode()
+        return await super().do_request(url, method, request_data, read_timeout, write_timeout, connect_timeout, pool_timeout)
+
+
+def comparar_identificacao(repeticoes):
+    print(f"{'cabeçalho':>16} {'imghdr':>8} {'midia':>8} {'imghdr (ns)':>12} {'midia (ns)':>11}")
+    for nome, cabecalho in CABECALHOS.items():
+        buffer = cabecalho + bytes(1024)
+        visao = memoryview(buffer)
+        # imghdr.what(None, h) recebe o cabeçalho já lido; identificar recebe o download inteiro
+        tempo_antigo = min(timeit.repeat(lambda: imghdr.what(None, buffer[:32]), number=repeticoes, repeat=5))
+        tempo_novo = min(timeit.repeat(lambda: identificar(visao), number=repeticoes, repeat=5))
+        antigo, novo = imghdr.what(None, buffer[:32]), identificar(visao)
+        print(f"{nome:>16} {str(antigo):>8} {str(novo):>8} "
+              f"{tempo_antigo / repeticoes * 1e9:>12.0f} {tempo_novo / repeticoes * 1e9:>11.0f}")
+
+
+async def receber_antigo(bot, file_id, pasta):
+    # Baixa para um arquivo temporário em disco e identifica abrindo o arquivo
+    arquivo = await bot.get_file(file_id)
+    caminho = os.path.join(pasta, file_id)
+    await arquivo.download_to_drive(caminho)
+    try:
+        return imghdr.what(caminho)
+    finally:
+        os.remove(caminho)
+
+
+async def receber_midia(recepcao, bot, file_id):
+    # Como o handler: os bytes são descartados depois de encaminhados
+    return (await recepcao.receber(bot, file_id)).get('tipo')
+
+
+async def medir_recepcao(modo, arquivos, latencia, downloads):
+    requisicao = RequisicaoComArquivos(arquivos, latencia)
+    bot = Bot('123456:TESTE', request=requisicao, get_updates_request=RequisicaoFalsa())
+    recepcao = RecepcaoMidia(tamanho_maximo=64 * 1024 * 1024, downloads=downloads)
+    pasta = tempfile.mkdtemp(prefix='bench_midia_')
+    async with bot:
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        if modo == 'antigo':
+            tipos = await asyncio.gather(*(receber_antigo(bot, file_id, pasta) for file_id in arquivos))
+        else:
+            tipos = await asyncio.gather(*(receber_midia(recepcao, bot, file_id) for file_id in arquivos))
+        duracao = time.perf_counter() - inicio
+        _, pico_memoria = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    os.rmdir(pasta)
+    return duracao, pico_memoria, requisicao.pico, sum(tipo is not None for tipo in tipos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=100000)
+    parser.add_argument('--arquivos', type=int, default=200)
+    parser.add_argument('--tamanho-kb', type=int, default=512)
+    parser.add_argument('--latencia', type=float, default=0.05, help='duração de cada download (s)')
+    parser.add_argument('--downloads', type=int, default=4, help='downloads simultâneos da RecepcaoMidia')
+    args = parser.parse_args()
+
+    comparar_identificacao(args.repeticoes)
+
+    # Comprovantes típicos: fotos JPEG, capturas PNG e PDFs dos bancos
+    aleatorio = random.Random(42)
+    arquivos = {}
+    for i in range(args.arquivos):
+        cabecalho = CABECALHOS[aleatorio.choice(('jpeg (JFIF)', 'jpeg (sem JFIF)', 'png', 'pdf'))]
+        arquivos[f'arquivo{i}'] = cabecalho + aleatorio.randbytes(args.tamanho_kb * 1024 - len(cabecalho))
+    print()
+    print(f"{'recepção':>9} {'segundos':>9} {'pico mem. (MB)':>15} {'downloads simult.':>18} {'reconhecidos':>13}")
+    for modo in ('antigo', 'midia'):
+        duracao, pico, simultaneos, reconhecidos = asyncio.run(medir_recepcao(modo, arquivos, args.latencia, args.downloads))
+        print(f"{modo:>9} {duracao:>9.2f} {pico / 2 ** 20:>15.1f} {simultaneos:>18} {reconhecidos:>8}/{len(arquivos)}")
+
+
+if __name__ == '__main__':
+    main()
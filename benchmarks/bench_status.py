@@ -0,0 +1,90 @@
+"""Chamadas ao Mercado Pago economizadas pelo cache de status do VerificadorPagamentos.
+
+Cada usuário toca em "Verificar Pagamento" a cada --intervalo segundos (às vezes com toques
+duplos simultâneos) enquanto o PIX está pendente; o pagamento é aprovado no meio da rodada
+e os toques continuam. Compara Pagamentos.verificar_pagamento direto, sem cache nem junção
+de chamadas (TTL 0), com o VerificadorPagamentos usando o TTL informado:
+
+    python benchmarks/bench_status.py --usuarios 200 --duracao 10 --ttl 5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MERCADO_PAGO_ACCESS_TOKEN', 'TEST-benchmark')
+
+from gateway import GatewayMercadoPago  # noqa: E402
+from database import Database  # noqa: E402
+from metricas import registro as metricas  # noqa: E402
+from pagamentos import Pagamentos  # noqa: E402
+from verificacao import VerificadorPagamentos  # noqa: E402
+from mercadopago_falso import MercadoPagoFalso  # noqa: E402
+
+
+async def medir(ttl, usuarios, duracao, intervalo, latencia):
+    servidor = await MercadoPagoFalso(latencia, semente=42).iniciar()
+    pagamentos = Pagamentos(GatewayMercadoPago('TEST', base_url=servidor.url, max_conexoes=50))
+    db = Database(os.path.join(tempfile.mkdtemp(prefix='bench_status_'), 'assinaturas.db'))
+    verificador = VerificadorPagamentos(pagamentos, db, ttl_pendente=ttl) if ttl else pagamentos
+    ids = []
+    for user_id in range(usuarios):
+        ids.append((await pagamentos.criar_pagamento_pix(10.00, "Assinatura VIP - 30 dias"))['id'])
+        await db.registrar_pagamento(ids[-1], user_id)
+    aleatorio = random.Random(42)
+    toques = 0
+    fim = time.monotonic() + duracao
+
+    async def usuario(payment_id):
+        nonlocal toques
+        await asyncio.sleep(aleatorio.uniform(0, intervalo))
+        while time.monotonic() < fim:
+            repeticoes = 2 if aleatorio.random() < 0.2 else 1
+            toques += repeticoes
+            await asyncio.gather(*(verificador.verificar_pagamento(payment_id) for _ in range(repeticoes)))
+            await asyncio.sleep(intervalo * aleatorio.uniform(0.5, 1.5))
+
+    async def aprovar():
+        await asyncio.sleep(duracao / 2)
+        for payment_id in ids:
+            servidor.aprovar(payment_id)
+            if ttl:
+                verificador.invalidar_status(payment_id)  # como faria a notificação do webhook
+
+    await asyncio.gather(aprovar(), *(usuario(payment_id) for payment_id in ids))
+    consultas = servidor.requisicoes.get('consultar', 0)
+    await pagamentos.fechar()
+    await db.fechar()
+    await servidor.parar()
+    return toques, consultas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=200)
+    parser.add_argument('--duracao', type=float, default=10.0, help='segundos de toques por rodada')
+    parser.add_argument('--intervalo', type=float, default=1.0, help='segundos entre os toques de cada usuário')
+    parser.add_argument('--ttl', type=float, default=5.0, help='TTL do status pendente no cache')
+    parser.add_argument('--latencia', type=float, default=0.05, help='latência de cada chamada ao Mercado Pago')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print(f"{'ttl':>5} {'toques':>7} {'chamadas':>9} {'economizadas':>13} {'acertos':>8} {'coalescidas':>12}")
+    for ttl in (0, args.ttl):
+        antes = metricas.resumo()
+        toques, consultas = asyncio.run(medir(ttl, args.usuarios, args.duracao, args.intervalo, args.latencia))
+        depois = metricas.resumo()
+        acertos = depois.get('pagamentos_status_acertos_total', 0) - antes.get('pagamentos_status_acertos_total', 0)
+        faltas = depois.get('pagamentos_status_faltas_total', 0) - antes.get('pagamentos_status_faltas_total', 0)
+        coalescidas = depois.get('pagamentos_status_coalescidas_total', 0) - antes.get('pagamentos_status_coalescidas_total', 0)
+        taxa = acertos / (acertos + faltas) if acertos + faltas else 0.0
+        print(f"{ttl:>5g} {toques:>7} {consultas:>9} {toques - consultas:>13} {taxa:>8.1%} {coalescidas:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Mede updates/s do pipeline assíncrono com a API de pagamentos simulada.
+
+Cada usuário envia /assinar; a criação do PIX leva --latencia-pix segundos e cada
+chamada à Bot API leva --latencia-telegram segundos. Compara limites de concorrência:
+
+    python benchmarks/bench_updates.py --usuarios 500 --concorrencia 1,8,64
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:TESTE')
+os.environ.setdefault('VIP_GROUP_ID', '-1001')
+os.environ.setdefault('MERCADO_PAGO_ACCESS_TOKEN', 'TEST-benchmark')
+# Sem o limite global de 30 msg/s, que dominaria o resultado
+os.environ.setdefault('ENVIO_TAXA_GLOBAL', '100000')
+os.chdir(tempfile.mkdtemp(prefix='bench_updates_'))
+
+from telegram import Update  # noqa: E402
+from telegram.ext import Application, TypeHandler  # noqa: E402
+
+import bot  # noqa: E402
+from telegram_falso import RequisicaoFalsa, update_comando  # noqa: E402
+
+
+class PagamentosFalsos:
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self._ids = itertools.count(1)
+
+    async def criar_pagamento_pix(self, valor, descricao, expiracao=None):
+        await asyncio.sleep(self.latencia)
+        return {'pix_code': '00020126580014br.gov.bcb.pix', 'id': next(self._ids), 'status': 'pending'}
+
+    async def verificar_pagamento(self, payment_id):
+        await asyncio.sleep(self.latencia)
+        return {'status': 'pending', 'amount': 10.0, 'currency': 'BRL'}
+
+
+async def medir(concorrencia, usuarios, latencia_pix, latencia_telegram):
+    bot.criar_servicos()
+    bot.pagamentos = PagamentosFalsos(latencia_pix)
+    requisicao = RequisicaoFalsa(latencia_telegram)
+    application = (
+        Application.builder()
+        .token(os.environ['TELEGRAM_BOT_TOKEN'])
+        .request(requisicao)
+        .get_updates_request(RequisicaoFalsa())
+        .concurrent_updates(concorrencia)
+        .build()
+    )
+    bot.registrar_handlers(application)
+
+    concluidos = asyncio.Event()
+    processados = 0
+
+    async def contar(update, context):
+        nonlocal processados
+        processados += 1
+        if processados == usuarios:
+            concluidos.set()
+
+    application.add_handler(TypeHandler(Update, contar), group=1)
+
+    async with application:
+        await application.start()
+        inicio = time.perf_counter()
+        for i in range(usuarios):
+            await application.update_queue.put(Update.de_json(update_comando(i + 1, 10_000 + i, '/assinar'), application.bot))
+        await concluidos.wait()
+        duracao = time.perf_counter() - inicio
+        await application.stop()
+    await bot.fila_envio.parar()
+    return duracao, requisicao.chamadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=300)
+    parser.add_argument('--latencia-pix', type=float, default=0.3)
+    parser.add_argument('--latencia-telegram', type=float, default=0.02)
+    parser.add_argument('--concorrencia', default='1,8,64')
+    args = parser.parse_args()
+
+    print(f"{'concorrência':>12} {'segundos':>9} {'updates/s':>10} {'mensagens/usuário':>18}")
+    for concorrencia in (int(c) for c in args.concorrencia.split(',')):
+        duracao, chamadas = asyncio.run(medir(concorrencia, args.usuarios, args.latencia_pix, args.latencia_telegram))
+        mensagens = chamadas.get('sendMessage', 0) / args.usuarios
+        print(f"{concorrencia:>12} {duracao:>9.2f} {args.usuarios / duracao:>10.1f} {mensagens:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
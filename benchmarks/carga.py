@@ -0,0 +1,287 @@
+"""Teste de carga do bot.py de ponta a ponta, com Telegram e Mercado Pago falsos.
+
+Sobe os servidores falsos da Bot API e do Mercado Pago, inicia o bot.py de verdade em
+outro processo apontando para eles e conduz --usuarios usuários simulados pelo funil
+/start -> /assinar -> pagamento -> verificar -> link do grupo. Os usuários chegam ao
+longo de --rampa segundos; uma fração deles (--conversao) paga depois de um atraso
+aleatório e toca em "Verificar Pagamento" até receber o link, os demais tocam uma vez e
+desistem. Uma etapa sem resposta em --timeout segundos é repetida, como faria o usuário.
+
+A mesma --semente gera as mesmas chegadas, pagamentos e falhas injetadas:
+
+    python benchmarks/carga.py --usuarios 2000 --rampa 20
+    python benchmarks/carga.py --usuarios 2000 --workers 2 --erro-telegram 0.01 --erro-mp 0.02
+    python benchmarks/carga.py --usuarios 500 --saida resultado.json
+
+Relata vazão, percentis de latência de cada etapa, o funil e o consumo de CPU e memória
+do bot (somando os processos trabalhadores no modo webhook).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import signal
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import aiohttp
+
+from bench_ingresso import porta_livre
+from mercadopago_falso import MercadoPagoFalso
+from telegram_falso import TelegramFalso, update_callback, update_comando
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ETAPAS = ('start', 'assinar', 'verificar', 'pagamento_ate_link', 'funil')
+PERCENTIS = (50, 90, 99)
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def _botao_verificar(parametros):
+    marcacao = parametros.get('reply_markup')
+    if not marcacao:
+        return None
+    for linha in json.loads(marcacao).get('inline_keyboard', []):
+        for botao in linha:
+            if botao.get('callback_data', '').startswith('verificar_'):
+                return botao['callback_data']
+    return None
+
+
+def _boas_vindas(parametros):
+    return True if 'Bem-vindo' in parametros.get('text', '') else None
+
+
+def _resultado_verificacao(parametros):
+    texto = parametros.get('text', '')
+    if 't.me/+' in texto:
+        return 'link'
+    if 'ainda não foi confirmado' in texto:
+        return 'pendente'
+    if 'Erro' in texto or 'erro' in texto:
+        return 'erro'
+    # "sendo liberado": o link chega em outra mensagem
+    return None
+
+
+class Simulacao:
+    def __init__(self, telegram, mercadopago, args, sessao=None):
+        self.telegram = telegram
+        self.mercadopago = mercadopago
+        self.args = args
+        self.sessao = sessao
+        self.aleatorio = random.Random(args.semente)
+        self._update_ids = itertools.count(1)
+        self.latencias = {etapa: [] for etapa in ETAPAS}
+        self.funil = Counter()
+        self.repeticoes = Counter()
+
+    async def _entregar(self, update):
+        if self.sessao:
+            await self.telegram.entregar(self.sessao, update)
+        else:
+            self.telegram.publicar([update])
+
+    async def etapa(self, nome, user_id, montar, aceitar):
+        """Envia o update e espera uma resposta aceita; repete a etapa se ela não vier a tempo."""
+        for tentativa in range(self.args.tentativas):
+            if tentativa:
+                self.repeticoes[nome] += 1
+            inicio = time.perf_counter()
+            prazo = inicio + self.args.timeout
+            await self._entregar(montar(next(self._update_ids)))
+            try:
+                while True:
+                    _, parametros = await self.telegram.receber(user_id, prazo - time.perf_counter())
+                    resposta = aceitar(parametros)
+                    if resposta is not None:
+                        self.latencias[nome].append(time.perf_counter() - inicio)
+                        return resposta
+            except asyncio.TimeoutError:
+                continue
+        return None
+
+    async def usuario(self, user_id, chegada, paga, atraso_pagamento, pausas):
+        await asyncio.sleep(chegada)
+        self.telegram.acompanhar(user_id)
+        inicio = time.perf_counter()
+        try:
+            if not await self.etapa('start', user_id, lambda u: update_comando(u, user_id, '/start'), _boas_vindas):
+                return
+            self.funil['start'] += 1
+            callback = await self.etapa('assinar', user_id, lambda u: update_comando(u, user_id, '/assinar'), _botao_verificar)
+            if not callback:
+                return
+            self.funil['cobranca'] += 1
+
+            if not paga:
+                await self.etapa('verificar', user_id, lambda u: update_callback(u, user_id, callback), _resultado_verificacao)
+                return
+            await asyncio.sleep(atraso_pagamento)
+            self.mercadopago.aprovar(callback.split('_', 1)[1])
+            self.funil['pago'] += 1
+            pago_em = time.perf_counter()
+            for pausa in pausas:
+                resultado = await self.etapa('verificar', user_id, lambda u: update_callback(u, user_id, callback), _resultado_verificacao)
+                if resultado == 'link':
+                    self.funil['link'] += 1
+                    self.latencias['pagamento_ate_link'].append(time.perf_counter() - pago_em)
+                    self.latencias['funil'].append(time.perf_counter() - inicio)
+                    return
+                # Pendente ou erro: o usuário espera um pouco e toca de novo
+                await asyncio.sleep(pausa)
+        finally:
+            self.telegram.esquecer(user_id)
+
+    def planejar(self):
+        """Chegadas, quem paga e quando, todos derivados da semente."""
+        args = self.args
+        taxa = args.usuarios / args.rampa if args.rampa else float('inf')
+        chegada = 0.0
+        planos = []
+        for i in range(args.usuarios):
+            if taxa != float('inf'):
+                chegada += self.aleatorio.expovariate(taxa)
+            paga = self.aleatorio.random() < args.conversao
+            atraso = self.aleatorio.uniform(*args.atraso_pagamento)
+            pausas = [self.aleatorio.uniform(1.0, 3.0) for _ in range(args.max_verificacoes)]
+            planos.append((100_000 + i, chegada, paga, atraso, pausas))
+        return planos
+
+
+def ambiente_do_bot(args, telegram, mercadopago):
+    ambiente = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN='123456:CARGA',
+        VIP_GROUP_ID='-1001',
+        MERCADO_PAGO_ACCESS_TOKEN='TEST-carga',
+        TELEGRAM_API_URL=telegram.url,
+        MERCADO_PAGO_BASE_URL=mercadopago.url,
+        LOG_NIVEL=args.log_nivel,
+    )
+    if not args.limites_reais:
+        # Sem os limites de envio do Telegram a medida é do próprio bot
+        ambiente.update(ENVIO_TAXA_GLOBAL='100000', ENVIO_TAXA_CHAT='100000', ENVIO_RAJADA_CHAT='100')
+    if args.workers:
+        porta = porta_livre()
+        ambiente.update(
+            TELEGRAM_WEBHOOK_URL=f'http://127.0.0.1:{porta}/telegram',
+            TELEGRAM_WEBHOOK_PORT=str(porta),
+            TELEGRAM_WEBHOOK_SECRET='segredo-carga',
+            INGRESSO_WORKERS=str(args.workers),
+        )
+    return ambiente
+
+
+async def executar(args):
+    telegram = await TelegramFalso(args.latencia_telegram, args.erro_telegram, semente=args.semente).iniciar()
+    mercadopago = await MercadoPagoFalso(args.latencia_mp, args.erro_mp, semente=args.semente).iniciar()
+    pasta = tempfile.mkdtemp(prefix='carga_')
+    processo = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(RAIZ, 'bot.py'),
+        cwd=pasta, env=ambiente_do_bot(args, telegram, mercadopago),
+        stdout=asyncio.subprocess.DEVNULL,
+    )
+    sessao = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.conexoes)) if args.workers else None
+    try:
+        if args.workers:
+            await telegram.esperar('setWebhook', 1)
+            await telegram.esperar('getMe', args.workers + 1)
+        else:
+            await telegram.esperar('getUpdates', 1)
+
+        simulacao = Simulacao(telegram, mercadopago, args, sessao)
+        planos = simulacao.planejar()
+        chamadas_antes = sum(telegram.chamadas.values()) - telegram.chamadas.get('getUpdates', 0)
+        inicio = time.perf_counter()
+        await asyncio.gather(*(simulacao.usuario(*plano) for plano in planos))
+        duracao = time.perf_counter() - inicio
+        chamadas = sum(telegram.chamadas.values()) - telegram.chamadas.get('getUpdates', 0) - chamadas_antes
+    finally:
+        if sessao:
+            await sessao.close()
+        if processo.returncode is None:
+            processo.send_signal(signal.SIGINT)
+            await processo.wait()
+        await telegram.parar()
+        await mercadopago.parar()
+
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'duracao_s': duracao,
+        'funil': dict(simulacao.funil),
+        'repeticoes': dict(simulacao.repeticoes),
+        'latencias': {etapa: sorted(valores) for etapa, valores in simulacao.latencias.items()},
+        'telegram_chamadas': chamadas,
+        'links_criados': telegram.chamadas.get('createChatInviteLink', 0) - telegram.erros.get('createChatInviteLink', 0),
+        'telegram_erros': sum(telegram.erros.values()),
+        'mercadopago_requisicoes': dict(mercadopago.requisicoes),
+        'cpu_bot_s': uso.ru_utime + uso.ru_stime,
+        'memoria_max_bot_mb': uso.ru_maxrss / 1024,
+        'log_bot_mb': os.path.getsize(os.path.join(pasta, 'bot.log')) / 2 ** 20 if os.path.exists(os.path.join(pasta, 'bot.log')) else 0.0,
+    }
+
+
+def relatorio(args, resultado):
+    duracao = resultado['duracao_s']
+    funil = resultado['funil']
+    print(f"usuários {args.usuarios}, rampa {args.rampa:g}s, workers {args.workers or 'polling'}, semente {args.semente}")
+    print(f"duração {duracao:.1f}s, {funil.get('link', 0) / duracao:.1f} assinaturas/s, "
+          f"{resultado['telegram_chamadas'] / duracao:.1f} chamadas à Bot API/s")
+    print(f"funil: start {funil.get('start', 0)} -> cobrança {funil.get('cobranca', 0)} -> "
+          f"pago {funil.get('pago', 0)} -> link {funil.get('link', 0)} (links criados: {resultado['links_criados']})")
+    if resultado['repeticoes']:
+        print("etapas repetidas por falta de resposta: " + ', '.join(f'{k} {v}' for k, v in sorted(resultado['repeticoes'].items())))
+    print(f"erros injetados na Bot API: {resultado['telegram_erros']}; Mercado Pago: {resultado['mercadopago_requisicoes']}")
+    print(f"bot: CPU {resultado['cpu_bot_s']:.1f}s ({resultado['cpu_bot_s'] / duracao:.0%} de um núcleo), "
+          f"memória máx. {resultado['memoria_max_bot_mb']:.0f} MB, log {resultado['log_bot_mb']:.1f} MB")
+    print()
+    cabecalho = ''.join(f"{f'p{p} (ms)':>10}" for p in PERCENTIS)
+    print(f"{'etapa':>20} {'amostras':>9}{cabecalho}{'máx (ms)':>10}")
+    for etapa in ETAPAS:
+        valores = resultado['latencias'][etapa]
+        colunas = ''.join(f'{percentil(valores, p) * 1000:>10.1f}' for p in PERCENTIS)
+        maximo = valores[-1] * 1000 if valores else 0.0
+        print(f"{etapa:>20} {len(valores):>9}{colunas}{maximo:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=1000)
+    parser.add_argument('--rampa', type=float, default=10.0, help='segundos em que os usuários chegam')
+    parser.add_argument('--conversao', type=float, default=0.7, help='fração de usuários que paga')
+    parser.add_argument('--atraso-pagamento', type=float, nargs=2, default=(2.0, 8.0), metavar=('MIN', 'MAX'),
+                        help='segundos entre receber o PIX e pagar')
+    parser.add_argument('--max-verificacoes', type=int, default=10, help='toques em verificar antes de desistir')
+    parser.add_argument('--workers', type=int, default=0, help='processos no modo webhook (0: long polling)')
+    parser.add_argument('--latencia-telegram', type=float, default=0.02)
+    parser.add_argument('--latencia-mp', type=float, default=0.1)
+    parser.add_argument('--erro-telegram', type=float, default=0.0, help='fração de chamadas à Bot API com erro 500')
+    parser.add_argument('--erro-mp', type=float, default=0.0, help='fração de chamadas ao Mercado Pago com erro 503')
+    parser.add_argument('--timeout', type=float, default=15.0, help='segundos até o usuário repetir uma etapa')
+    parser.add_argument('--tentativas', type=int, default=3, help='vezes que o usuário tenta cada etapa')
+    parser.add_argument('--conexoes', type=int, default=40, help='conexões simultâneas ao webhook')
+    parser.add_argument('--limites-reais', action='store_true', help='mantém os limites de envio do Telegram')
+    parser.add_argument('--log-nivel', default='INFO')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='grava configuração e resultados em JSON')
+    args = parser.parse_args()
+
+    resultado = asyncio.run(executar(args))
+    relatorio(args, resultado)
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            json.dump({'configuracao': vars(args), 'resultado': resultado}, arquivo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
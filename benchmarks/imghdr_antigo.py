@@ -1,5 +1,6 @@
 # Copiado de https://github.com/python/cpython/blob/3.12/Lib/imghdr.py
-# Módulo removido no Python 3.13, necessário para compatibilidade
+# Módulo removido no Python 3.13. O bot identifica mídias com midia.identificar; esta cópia
+# fica só como referência para benchmarks/bench_midia.py
 
 def what(file, h=None):
     """Determine the type of an image file."""
@@ -0,0 +1,103 @@
+"""Servidor falso da API de pagamentos do Mercado Pago para benchmarks e testes de carga.
+
+Implementa apenas o que o bot usa: criação, consulta, busca e atualização de pagamentos.
+Latência e taxa de erro são configuráveis; a chave X-Idempotency-Key é respeitada.
+"""
+import asyncio
+import itertools
+import random
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+
+class MercadoPagoFalso:
+    def __init__(self, latencia=0.0, taxa_erro=0.0, aprovar_automaticamente=False, semente=None):
+        self.latencia = latencia
+        self.taxa_erro = taxa_erro
+        self.aprovar_automaticamente = aprovar_automaticamente
+        self.aleatorio = random.Random(semente)
+        self.pagamentos = {}
+        self.por_chave = {}
+        self.requisicoes = {}
+        self._ids = itertools.count(10_000_000)
+        self._runner = None
+        self.porta = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.porta}'
+
+    def criar_app(self):
+        app = web.Application()
+        app.router.add_post('/v1/payments', self._criar)
+        app.router.add_get('/v1/payments/search', self._buscar)
+        app.router.add_get('/v1/payments/{id}', self._consultar)
+        app.router.add_put('/v1/payments/{id}', self._atualizar)
+        return app
+
+    async def iniciar(self, porta=0):
+        self._runner = web.AppRunner(self.criar_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', porta).start()
+        self.porta = self._runner.addresses[0][1]
+        return self
+
+    async def parar(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def aprovar(self, payment_id):
+        self.pagamentos[int(payment_id)]['status'] = 'approved'
+
+    async def _simular(self, operacao):
+        self.requisicoes[operacao] = self.requisicoes.get(operacao, 0) + 1
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        if self.taxa_erro and self.aleatorio.random() < self.taxa_erro:
+            raise web.HTTPServiceUnavailable(text='{"message": "erro simulado"}', content_type='application/json')
+
+    async def _criar(self, request):
+        await self._simular('criar')
+        chave = request.headers.get('X-Idempotency-Key')
+        if chave and chave in self.por_chave:
+            return web.json_response(self.pagamentos[self.por_chave[chave]], status=201)
+        dados = await request.json()
+        payment_id = next(self._ids)
+        self.pagamentos[payment_id] = {
+            'id': payment_id,
+            'status': 'approved' if self.aprovar_automaticamente else 'pending',
+            'transaction_amount': dados.get('transaction_amount'),
+            'currency_id': 'BRL',
+            'date_created': datetime.now(timezone.utc).isoformat(),
+            'point_of_interaction': {'transaction_data': {'qr_code': f'00020126580014br.gov.bcb.pix{payment_id}'}},
+        }
+        if chave:
+            self.por_chave[chave] = payment_id
+        return web.json_response(self.pagamentos[payment_id], status=201)
+
+    async def _consultar(self, request):
+        await self._simular('consultar')
+        pagamento = self.pagamentos.get(int(request.match_info['id']))
+        if not pagamento:
+            return web.json_response({'message': 'Payment not found'}, status=404)
+        return web.json_response(pagamento)
+
+    async def _atualizar(self, request):
+        await self._simular('atualizar')
+        pagamento = self.pagamentos.get(int(request.match_info['id']))
+        if not pagamento:
+            return web.json_response({'message': 'Payment not found'}, status=404)
+        pagamento.update(await request.json())
+        return web.json_response(pagamento)
+
+    async def _buscar(self, request):
+        await self._simular('buscar')
+        status = request.query.get('status')
+        limite = int(request.query.get('limit', 30))
+        offset = int(request.query.get('offset', 0))
+        resultados = [p for p in self.pagamentos.values() if not status or p['status'] == status]
+        return web.json_response({
+            'results': resultados[offset:offset + limite],
+            'paging': {'total': len(resultados), 'limit': limite, 'offset': offset},
+        })
@@ -0,0 +1,129 @@
+"""Teste de estresse do armazenamento SQLite a partir de várias threads.
+
+Compara a conexão única antiga (journal padrão, lock global e commit por escrita)
+com o MotorSQLite (WAL, pool de leitores e escritor único com group commit):
+
+    python benchmarks/stress_sqlite.py --threads 32 --operacoes 500 --escritas 0.3
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from armazenamento import MotorSQLite  # noqa: E402
+from metricas import registro as metricas  # noqa: E402
+
+ESQUEMA = '''
+    CREATE TABLE IF NOT EXISTS assinaturas (
+        user_id INTEGER PRIMARY KEY,
+        payment_id TEXT,
+        data_expiracao TIMESTAMP,
+        link_invite TEXT
+    )
+'''
+
+
+class ConexaoUnica:
+    """Reproduz o Database original: uma conexão compartilhada e commit a cada escrita."""
+
+    def __init__(self, caminho):
+        self.conn = sqlite3.connect(caminho, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def _executar(self, func, args, commit):
+        futuro = Future()
+        with self.lock:
+            try:
+                resultado = func(self.conn, *args)
+                if commit:
+                    self.conn.commit()
+                futuro.set_result(resultado)
+            except Exception as e:
+                futuro.set_exception(e)
+        return futuro
+
+    def submeter_leitura(self, func, *args):
+        return self._executar(func, args, commit=False)
+
+    def submeter_escrita(self, func, *args):
+        return self._executar(func, args, commit=True)
+
+    def fechar(self):
+        self.conn.close()
+
+
+def salvar(conn, user_id):
+    conn.execute(
+        'INSERT OR REPLACE INTO assinaturas (user_id, payment_id, data_expiracao, link_invite) VALUES (?, ?, ?, ?)',
+        (user_id, str(user_id), (datetime.now() + timedelta(days=30)).isoformat(' '), None)
+    )
+
+
+def buscar(conn, user_id):
+    return conn.execute('SELECT * FROM assinaturas WHERE user_id = ?', (user_id,)).fetchone()
+
+
+def contar(conn):
+    return conn.execute('SELECT COUNT(*) FROM assinaturas').fetchone()[0]
+
+
+def estressar(motor, threads, operacoes, proporcao_escrita):
+    erros = []
+    escritos = set()
+    escritos_lock = threading.Lock()
+
+    def trabalhador(indice):
+        aleatorio = random.Random(indice)
+        for i in range(operacoes):
+            user_id = indice * operacoes + i
+            try:
+                if aleatorio.random() < proporcao_escrita:
+                    motor.submeter_escrita(salvar, user_id).result()
+                    with escritos_lock:
+                        escritos.add(user_id)
+                else:
+                    motor.submeter_leitura(buscar, aleatorio.randrange(threads * operacoes)).result()
+            except Exception as e:
+                erros.append(e)
+
+    inicio = time.perf_counter()
+    grupo = [threading.Thread(target=trabalhador, args=(i,)) for i in range(threads)]
+    for t in grupo:
+        t.start()
+    for t in grupo:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    linhas = motor.submeter_leitura(contar).result()
+    return duracao, erros, linhas, len(escritos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--operacoes', type=int, default=300, help='operações por thread')
+    parser.add_argument('--escritas', type=float, default=0.3, help='proporção de escritas')
+    args = parser.parse_args()
+
+    total = args.threads * args.operacoes
+    print(f"{'motor':>14} {'ops/s':>9} {'erros':>6} {'linhas':>7} {'escritas/commit':>16}")
+    for nome in ('conexão única', 'MotorSQLite'):
+        caminho = os.path.join(tempfile.mkdtemp(prefix='stress_sqlite_'), 'assinaturas.db')
+        motor = ConexaoUnica(caminho) if nome == 'conexão única' else MotorSQLite(caminho)
+        motor.submeter_escrita(lambda conn: conn.execute(ESQUEMA)).result()
+        duracao, erros, linhas, escritos = estressar(motor, args.threads, args.operacoes, args.escritas)
+        motor.fechar()
+        assert linhas == escritos, f"{nome}: {linhas} linhas para {escritos} escritas confirmadas"
+        lote = metricas.histograma('db_lote_escrita_tamanho').resumo()['media'] if nome == 'MotorSQLite' else 1.0
+        print(f"{nome:>14} {total / duracao:>9.0f} {len(erros):>6} {linhas:>7} {lote:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
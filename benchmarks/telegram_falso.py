@@ -0,0 +1,221 @@
+"""Backend falso da Bot API do Telegram para benchmarks sem rede.
+
+RequisicaoFalsa responde dentro do próprio processo; TelegramFalso é um servidor HTTP
+para quando o bot roda em outro processo (long polling ou webhook).
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import deque
+
+from aiohttp import web
+from telegram.request import BaseRequest
+
+# Falhas nesses métodos impediriam o bot de subir, não medem nada
+METODOS_SEM_ERRO = {'getMe', 'setWebhook', 'deleteWebhook', 'getUpdates'}
+BOT = {'id': 1, 'is_bot': True, 'first_name': 'Bot VIP', 'username': 'bot_vip_teste'}
+
+
+class RequisicaoFalsa(BaseRequest):
+    """Responde às chamadas da Bot API localmente, com latência configurável."""
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.chamadas = {}
+        self._ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        metodo = url.rsplit('/', 1)[-1]
+        self.chamadas[metodo] = self.chamadas.get(metodo, 0) + 1
+        parametros = request_data.parameters if request_data else {}
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        return 200, json.dumps({'ok': True, 'result': resultado_falso(metodo, parametros, self._ids)}).encode()
+
+
+def resultado_falso(metodo, parametros, ids):
+    if metodo == 'getMe':
+        return BOT
+    if metodo in ('sendMessage', 'editMessageText'):
+        return {
+            'message_id': next(ids),
+            'date': int(time.time()),
+            'chat': {'id': int(parametros.get('chat_id', 0)), 'type': 'private'},
+            'text': parametros.get('text', ''),
+        }
+    if metodo == 'copyMessage':
+        return {'message_id': next(ids)}
+    if metodo in ('createChatInviteLink', 'revokeChatInviteLink'):
+        return {
+            'invite_link': parametros.get('invite_link') or f'https://t.me/+falso{next(ids)}',
+            'creator': BOT,
+            'creates_join_request': False,
+            'is_primary': False,
+            'is_revoked': metodo == 'revokeChatInviteLink',
+        }
+    if metodo == 'getUpdates':
+        return []
+    return True
+
+
+class TelegramFalso:
+    """Servidor HTTP falso da Bot API.
+
+    Os updates colocados com `publicar` são entregues por getUpdates; `entregar` faz
+    POST direto no webhook registrado com setWebhook. `esperar` aguarda até um método
+    ter sido chamado um certo número de vezes. Com `acompanhar(chat_id)`, as mensagens
+    enviadas ao chat ficam disponíveis em `receber(chat_id)`.
+
+    Com `taxa_erro`, essa fração das chamadas recebe um erro 500 (exceto as de
+    inicialização do bot e getUpdates).
+    """
+
+    def __init__(self, latencia=0.0, taxa_erro=0.0, semente=None):
+        self.latencia = latencia
+        self.taxa_erro = taxa_erro
+        self.aleatorio = random.Random(semente)
+        self._caixas = {}
+        self.chamadas = {}
+        self.erros = {}
+        self.webhook = None
+        self.segredo = None
+        self._ids = itertools.count(1)
+        self._pendentes = deque()
+        self._novos = asyncio.Event()
+        self._chamou = asyncio.Event()
+        self._runner = None
+        self.porta = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.porta}'
+
+    async def iniciar(self, porta=0):
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{metodo}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', porta).start()
+        self.porta = self._runner.addresses[0][1]
+        return self
+
+    async def parar(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def publicar(self, updates):
+        self._pendentes.extend(updates)
+        self._novos.set()
+
+    def acompanhar(self, chat_id):
+        self._caixas[chat_id] = asyncio.Queue()
+
+    def esquecer(self, chat_id):
+        self._caixas.pop(chat_id, None)
+
+    async def receber(self, chat_id, timeout=None):
+        """Próxima mensagem enviada ao chat: (método, parâmetros)."""
+        return await asyncio.wait_for(self._caixas[chat_id].get(), timeout)
+
+    async def esperar(self, metodo, quantidade):
+        while self.chamadas.get(metodo, 0) < quantidade:
+            self._chamou.clear()
+            await self._chamou.wait()
+
+    async def entregar(self, sessao, update):
+        cabecalhos = {'X-Telegram-Bot-Api-Secret-Token': self.segredo} if self.segredo else {}
+        while True:
+            async with sessao.post(self.webhook, json=update, headers=cabecalhos) as resposta:
+                if resposta.status == 200:
+                    return
+            # 503: fila do ingresso cheia; o Telegram real também reenviaria
+            await asyncio.sleep(0.05)
+
+    async def _handle(self, request):
+        metodo = request.match_info['metodo']
+        parametros = dict(await request.post())
+        self.chamadas[metodo] = self.chamadas.get(metodo, 0) + 1
+        self._chamou.set()
+        if metodo == 'getUpdates':
+            resultado = await self._get_updates(int(parametros.get('offset', 0)), float(parametros.get('timeout', 0)))
+        else:
+            if self.latencia:
+                await asyncio.sleep(self.latencia)
+            if self.taxa_erro and metodo not in METODOS_SEM_ERRO and self.aleatorio.random() < self.taxa_erro:
+                self.erros[metodo] = self.erros.get(metodo, 0) + 1
+                return web.json_response(
+                    {'ok': False, 'error_code': 500, 'description': 'Internal Server Error: erro simulado'}, status=500
+                )
+            if metodo == 'setWebhook':
+                self.webhook, self.segredo = parametros['url'], parametros.get('secret_token')
+            elif metodo == 'deleteWebhook':
+                self.webhook = None
+            resultado = resultado_falso(metodo, parametros, self._ids)
+            caixa = self._caixas.get(_chat_id(parametros))
+            if caixa is not None:
+                caixa.put_nowait((metodo, parametros))
+        return web.json_response({'ok': True, 'result': resultado})
+
+    async def _get_updates(self, offset, timeout):
+        while self._pendentes and self._pendentes[0]['update_id'] < offset:
+            self._pendentes.popleft()
+        if not self._pendentes and timeout:
+            self._novos.clear()
+            try:
+                await asyncio.wait_for(self._novos.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self._pendentes, 100))
+
+
+def _chat_id(parametros):
+    try:
+        return int(parametros.get('chat_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def update_comando(update_id, user_id, comando):
+    """Monta o JSON de um update com um comando enviado em chat privado."""
+    usuario = {'id': user_id, 'is_bot': False, 'first_name': f'Usuario {user_id}'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': usuario,
+            'text': comando,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(comando.split()[0])}],
+        },
+    }
+
+
+def update_callback(update_id, user_id, dados):
+    """Monta o JSON de um update de clique em botão inline."""
+    usuario = {'id': user_id, 'is_bot': False, 'first_name': f'Usuario {user_id}'}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': usuario,
+            'chat_instance': str(user_id),
+            'data': dados,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': BOT,
+                'text': 'Clique no botão abaixo após realizar o pagamento:',
+            },
+        },
+    }
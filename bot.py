@@ -1,44 +1,171 @@
 import os
+import math
+import time
+import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, CallbackContext
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
+from telegram.error import BadRequest, RetryAfter, TelegramError
 from dotenv import load_dotenv
 from database import Database
-from pagamentos import Pagamentos
+from pagamentos import Pagamentos, STATUS_FINAIS
+from pool_pix import PoolPix
+from limitador import TokenBucket, JanelaDeslizante, segundos_retry_after
+from metricas import registro as metricas
+from envio import FilaEnvio, RequisicaoContada, PRIORIDADE_CONFIRMACAO
+from processador import ProcessadorPorUsuario
+from verificacao import VerificadorPagamentos
+from cache import CacheLRU, VooUnico
+from instrumentacao import Instrumentacao, ServidorMetricas
+from logs import configurar_logs
+from relatorios import gerar_relatorio, formatar_relatorio
+from midia import RecepcaoMidia
 
-print('Iniciando bot...')
+# Carrega variáveis de ambiente (único load_dotenv: os demais módulos só leem o ambiente)
 load_dotenv()
-print('Variáveis de ambiente carregadas')
-print('TELEGRAM_BOT_TOKEN:', os.getenv('TELEGRAM_BOT_TOKEN')[:8], '...')
-print('VIP_GROUP_ID:', os.getenv('VIP_GROUP_ID'))
-print('MERCADO_PAGO_ACCESS_TOKEN:', os.getenv('MERCADO_PAGO_ACCESS_TOKEN')[:8], '...')
-
-# Configuração de logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    filename='bot.log'
-)
 logger = logging.getLogger(__name__)
 
-# Inicializa o banco de dados e pagamentos
-db = Database()
-pagamentos = Pagamentos()
-
-# Carrega variáveis de ambiente
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-VIP_GROUP_ID = os.getenv('VIP_GROUP_ID')
-if not BOT_TOKEN or not VIP_GROUP_ID:
-    logger.error('TELEGRAM_BOT_TOKEN ou VIP_GROUP_ID não configurados no .env')
-    exit(1)
-VIP_GROUP_ID = int(VIP_GROUP_ID)
-
-def start(update: Update, context: CallbackContext):
-    logger.info(f"Comando /start de {update.effective_user.id}")
+VIP_GROUP_ID = int(os.getenv('VIP_GROUP_ID') or '0')
+
+# Métricas: com METRICAS_PORTA definida, handlers, banco e chamadas ao Mercado Pago são
+# cronometrados e expostos em /metrics; RASTREAMENTO=1 registra no log a trilha de cada update
+METRICAS_PORTA = int(os.getenv('METRICAS_PORTA') or '0')
+RASTREAMENTO = os.getenv('RASTREAMENTO') == '1'
+
+# Reconciliação dos pagamentos pendentes
+RECONCILIACAO_INTERVALO = int(os.getenv('RECONCILIACAO_INTERVALO', '60'))
+RECONCILIACAO_LOTE = int(os.getenv('RECONCILIACAO_LOTE', '50'))
+RECONCILIACAO_CONCORRENCIA = int(os.getenv('RECONCILIACAO_CONCORRENCIA', '4'))
+TAMANHOS_LOTE = (1, 5, 10, 25, 50, 100, 250, 1000)
+
+# Remoção de membros expirados: executa a cada REMOCAO_INTERVALO segundos e processa
+# uma fatia da fila por vez, espalhando as chamadas ao Telegram ao longo do dia
+REMOCAO_LOTE = int(os.getenv('REMOCAO_LOTE', '1000'))
+REMOCAO_INTERVALO = int(os.getenv('REMOCAO_INTERVALO', '300'))
+REMOCAO_MAX_POR_EXECUCAO = int(os.getenv('REMOCAO_MAX_POR_EXECUCAO', '60'))
+REMOCAO_MAX_TENTATIVAS = int(os.getenv('REMOCAO_MAX_TENTATIVAS', '8'))
+REMOCAO_TAXA = float(os.getenv('REMOCAO_TAXA', '1'))
+limitador_remocao = TokenBucket(REMOCAO_TAXA, capacidade=5)
+
+VALOR_ASSINATURA = 10.00
+DESCRICAO_ASSINATURA = "Assinatura VIP - 30 dias"
+
+# IDs do Telegram, separados por vírgula, que podem usar /relatorio e recebem os comprovantes
+ADMIN_IDS = {int(i) for i in os.getenv('ADMIN_IDS', '').split(',') if i.strip()}
+
+# Pool de cobranças PIX pré-criadas (0 desativa); no modo webhook o total é dividido entre os trabalhadores
+PIX_POOL_SIZE = int(os.getenv('PIX_POOL_SIZE', '0'))
+PIX_POOL_TTL_MINUTOS = int(os.getenv('PIX_POOL_TTL_MINUTOS', '60'))
+PIX_EXPIRACAO_HORAS = int(os.getenv('PIX_EXPIRACAO_HORAS', '24'))
+
+# Cache do status dos pagamentos: segundos para status pendentes (finais não vencem)
+MERCADO_PAGO_STATUS_TTL = float(os.getenv('MERCADO_PAGO_STATUS_TTL', '5'))
+MERCADO_PAGO_STATUS_CACHE_TAMANHO = int(os.getenv('MERCADO_PAGO_STATUS_CACHE_TAMANHO', '10000'))
+
+# Cobranças por usuário: quem repete /assinar recebe de novo a cobrança pendente por
+# COBRANCA_REUSO_MINUTOS, e cobranças novas são limitadas a COBRANCA_LIMITE a cada
+# COBRANCA_JANELA segundos. O estado fica em memória, limitado a COBRANCA_MAX_USUARIOS
+COBRANCA_REUSO_MINUTOS = int(os.getenv('COBRANCA_REUSO_MINUTOS', '60'))
+COBRANCA_LIMITE = int(os.getenv('COBRANCA_LIMITE', '3'))
+COBRANCA_JANELA = int(os.getenv('COBRANCA_JANELA', '3600'))
+COBRANCA_MAX_USUARIOS = int(os.getenv('COBRANCA_MAX_USUARIOS', '100000'))
+cobrancas_pendentes = CacheLRU('cobrancas_reuso', COBRANCA_MAX_USUARIOS, ttl=COBRANCA_REUSO_MINUTOS * 60)
+limite_cobrancas = JanelaDeslizante('cobrancas', COBRANCA_LIMITE, COBRANCA_JANELA, COBRANCA_MAX_USUARIOS)
+
+# Comprovantes enviados pelos usuários: baixados e validados em memória, no máximo
+# MIDIA_DOWNLOADS ao mesmo tempo e com até MIDIA_TAMANHO_MAXIMO_MB cada
+MIDIA_TAMANHO_MAXIMO_MB = int(os.getenv('MIDIA_TAMANHO_MAXIMO_MB', '10'))
+MIDIA_DOWNLOADS = int(os.getenv('MIDIA_DOWNLOADS', '4'))
+recepcao_midia = RecepcaoMidia(MIDIA_TAMANHO_MAXIMO_MB * 1024 * 1024, MIDIA_DOWNLOADS)
+# Só quem tem cobrança em aberto envia comprovantes, até COMPROVANTE_LIMITE a cada
+# COMPROVANTE_JANELA segundos
+COMPROVANTE_LIMITE = int(os.getenv('COMPROVANTE_LIMITE', '5'))
+COMPROVANTE_JANELA = int(os.getenv('COMPROVANTE_JANELA', '3600'))
+limite_comprovantes = JanelaDeslizante('comprovantes', COMPROVANTE_LIMITE, COMPROVANTE_JANELA, COBRANCA_MAX_USUARIOS)
+
+# Concorrência: updates processados em paralelo e conexões com a API do Telegram
+MAX_UPDATES_CONCORRENTES = int(os.getenv('MAX_UPDATES_CONCORRENTES', '64'))
+TELEGRAM_MAX_CONEXOES = int(os.getenv('TELEGRAM_MAX_CONEXOES', '32'))
+# Servidor da Bot API alternativo (servidor local ou falso, nos benchmarks)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+
+# Modo webhook: com TELEGRAM_WEBHOOK_URL definida, os updates chegam por HTTP e são
+# distribuídos entre INGRESSO_WORKERS processos; sem ela o bot usa long polling
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL')
+TELEGRAM_WEBHOOK_PORT = int(os.getenv('TELEGRAM_WEBHOOK_PORT', '8443'))
+TELEGRAM_WEBHOOK_PATH = os.getenv('TELEGRAM_WEBHOOK_PATH', '/telegram')
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET') or None
+INGRESSO_WORKERS = int(os.getenv('INGRESSO_WORKERS', str(os.cpu_count() or 1)))
+
+# Envio de mensagens: limites globais e por chat da Bot API
+ENVIO_TAXA_GLOBAL = float(os.getenv('ENVIO_TAXA_GLOBAL', '30'))
+ENVIO_TAXA_CHAT = float(os.getenv('ENVIO_TAXA_CHAT', '1'))
+ENVIO_RAJADA_CHAT = int(os.getenv('ENVIO_RAJADA_CHAT', '3'))
+ENVIO_WORKERS = int(os.getenv('ENVIO_WORKERS', '8'))
+
+# Serviços, criados por criar_servicos() ao montar a aplicação: importar este módulo não
+# abre o banco nem conexões
+instrumentacao = Instrumentacao()
+db = None
+pagamentos = None
+# Status dos pagamentos com a máquina de estados do banco, o cache de status e uma
+# consulta por pagamento
+verificador = None
+fila_envio = None
+# Cliques repetidos em "verificar" aguardam a mesma ativação
+ativacoes = VooUnico('ativacao')
+
+def criar_servicos(processos=1):
+    """Cria banco, cliente do Mercado Pago e fila de envio deste processo.
+
+    Com vários processos que enviam mensagens o limite global de envio é dividido entre eles.
+    """
+    global instrumentacao, db, pagamentos, verificador, fila_envio
+    instrumentacao = Instrumentacao(ativa=METRICAS_PORTA > 0, rastrear=RASTREAMENTO)
+    db = instrumentacao.objeto('db', Database())
+    pagamentos = instrumentacao.objeto('pagamentos', Pagamentos())
+    verificador = VerificadorPagamentos(
+        pagamentos, db, tamanho_cache=MERCADO_PAGO_STATUS_CACHE_TAMANHO, ttl_pendente=MERCADO_PAGO_STATUS_TTL
+    )
+    fila_envio = FilaEnvio(
+        taxa_global=ENVIO_TAXA_GLOBAL / processos,
+        taxa_chat=ENVIO_TAXA_CHAT,
+        rajada_chat=ENVIO_RAJADA_CHAT,
+        workers=ENVIO_WORKERS
+    )
+
+async def enviar(chat_id, funcao, /, *args, **kwargs):
+    # Toda mensagem ao usuário passa pela fila de envio
+    return await fila_envio.enviar(chat_id, funcao, *args, **kwargs)
+
+def registrar_funil(etapa):
+    # Etapas do funil de conversão; a última é conversoes_total
+    metricas.contador(f'funil_{etapa}_total', f'Passagens pela etapa {etapa} do funil').inc()
+
+def mensagem_pix(pagamento):
+    # Instruções, código e botão de verificação vão juntos: uma chamada à API em vez de três
+    keyboard = [[InlineKeyboardButton("✅ Verificar Pagamento", callback_data=f"verificar_{pagamento['id']}")]]
+    texto = (
+        "📱 Como pagar com PIX:\n"
+        "1. Abra seu aplicativo de banco\n"
+        "2. Escolha pagar com PIX\n"
+        "3. Cole o código abaixo\n"
+        "4. Confirme o pagamento\n\n"
+        f"📋 Código PIX copia e cola:\n"
+        f"```\n{pagamento['pix_code']}\n```\n\n"
+        "Clique no botão abaixo após realizar o pagamento:"
+    )
+    return texto, InlineKeyboardMarkup(keyboard)
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    logger.info("Comando /start de %s", update.effective_user.id)
+    registrar_funil('inicio')
     keyboard = [[InlineKeyboardButton("💎 Assinar VIP R$10,00 mensal", callback_data="assinar_vip")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text(
+    await enviar(
+        update.effective_chat.id, update.message.reply_text,
         "🌟 Bem-vindo ao Bot VIP! 🌟\n\n"
         "🎯 Comandos disponíveis:\n"
         "• /assinar - Assine o grupo VIP\n"
@@ -52,100 +179,183 @@ def start(update: Update, context: CallbackContext):
         reply_markup=reply_markup
     )
 
-def status(update: Update, context: CallbackContext):
+async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    logger.info(f"Comando /status de {user_id}")
-    assinatura = db.get_assinatura(user_id)
-    if assinatura and assinatura['link_invite'] and assinatura['data_expiracao'] > datetime.now():  # Verifica se tem link e se não expirou
-        dias_restantes = (assinatura['data_expiracao'] - datetime.now()).days
-        update.message.reply_text(
+    logger.info("Comando /status de %s", user_id)
+    assinatura = await db.get_assinatura(user_id)
+    if assinatura and assinatura.link_invite and assinatura.data_expiracao > datetime.now():  # Verifica se tem link e se não expirou
+        dias_restantes = (assinatura.data_expiracao - datetime.now()).days
+        await enviar(
+            update.effective_chat.id, update.message.reply_text,
             f"✅ Você já é um assinante VIP!\n\n"
             f"📅 Sua assinatura expira em {dias_restantes} dias.\n\n"
             f"Para renovar, aguarde a expiração da sua assinatura atual."
         )
     else:
-        update.message.reply_text(
+        await enviar(
+            update.effective_chat.id, update.message.reply_text,
             "❌ Você ainda não é um assinante VIP.\n"
             "Use o comando /assinar para se tornar um membro!"
         )
 
-def assinar(update: Update, context: CallbackContext):
+async def relatorio(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if user_id not in ADMIN_IDS:
+        logger.warning("Comando /relatorio recusado para %s", user_id)
+        return
+    logger.info("Comando /relatorio de %s", user_id)
+    # Contagens feitas no banco; a exportação completa fica com `python relatorios.py --exportar`
+    dias = int(context.args[0]) if context.args and context.args[0].isdigit() else 7
+    texto = formatar_relatorio(await gerar_relatorio(db, VALOR_ASSINATURA, dias))
+    await enviar(update.effective_chat.id, update.message.reply_text, texto)
+
+async def obter_pagamento_pix(context: ContextTypes.DEFAULT_TYPE, user_id):
+    # Reenvia a cobrança pendente do usuário em vez de criar outra a cada clique
+    pagamento = cobrancas_pendentes.obter(user_id)
+    if pagamento is not None:
+        logger.info("Reenviando a cobrança pendente %s ao usuário %s", pagamento['id'], user_id)
+        return pagamento
+    # Só cobranças criadas contam no limite: falhas do Mercado Pago não bloqueiam o usuário
+    espera = limite_cobrancas.espera(user_id)
+    if espera:
+        logger.info("Usuário %s atingiu o limite de cobranças", user_id)
+        return {'error': 'Limite de cobranças atingido', 'espera': espera}
+    # Usa uma cobrança pré-criada do pool quando houver; senão cria na hora
+    pool = context.bot_data.get('pool_pix')
+    pagamento = pool.obter() if pool else None
+    if not pagamento:
+        pagamento = await pagamentos.criar_pagamento_pix(
+            VALOR_ASSINATURA, DESCRICAO_ASSINATURA, expiracao=datetime.now() + timedelta(hours=PIX_EXPIRACAO_HORAS)
+        )
+    if 'error' not in pagamento:
+        limite_cobrancas.registrar(user_id)
+        cobrancas_pendentes.colocar(user_id, pagamento)
+    return pagamento
+
+def mensagem_erro_cobranca(pagamento):
+    if 'espera' in pagamento:
+        return (
+            "⏳ Você gerou muitas cobranças em pouco tempo.\n"
+            f"Por favor, tente novamente em {math.ceil(pagamento['espera'] / 60)} minutos."
+        )
+    return (
+        "❌ Desculpe, ocorreu um erro ao gerar o pagamento.\n"
+        "Por favor, tente novamente em alguns minutos ou entre em contato com o suporte."
+    )
+
+async def assinar(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user_id = update.effective_user.id
-        logger.info(f"Comando /assinar de {user_id}")
+        logger.info("Comando /assinar de %s", user_id)
         
         # Verifica se já é assinante
-        assinatura = db.get_assinatura(user_id)
-        if assinatura and assinatura['link_invite']:  # Só considera assinante se tiver link de convite
-            dias_restantes = (assinatura['data_expiracao'] - datetime.now()).days
-            update.message.reply_text(
+        assinatura = await db.get_assinatura(user_id)
+        if assinatura and assinatura.link_invite:  # Só considera assinante se tiver link de convite
+            dias_restantes = (assinatura.data_expiracao - datetime.now()).days
+            await enviar(
+                update.effective_chat.id, update.message.reply_text,
                 f"✅ Você já é um assinante VIP!\n\n"
                 f"📅 Sua assinatura expira em {dias_restantes} dias.\n"
-                f"🔗 Link do grupo: {assinatura['link_invite']}\n\n"
+                f"🔗 Link do grupo: {assinatura.link_invite}\n\n"
                 f"Para renovar, aguarde a expiração da sua assinatura atual."
             )
             return
 
         # Cria o pagamento PIX
-        logger.info(f"Criando pagamento PIX para usuário {user_id}")
-        pagamento = pagamentos.criar_pagamento_pix(10.00, "Assinatura VIP - 30 dias")
-        
+        logger.info("Criando pagamento PIX para usuário %s", user_id)
+        pagamento = await obter_pagamento_pix(context, user_id)
+
         if 'error' in pagamento:
-            logger.error(f"Erro ao criar pagamento: {pagamento['error']}")
-            update.message.reply_text(
-                "❌ Desculpe, ocorreu um erro ao gerar o pagamento.\n"
-                "Por favor, tente novamente em alguns minutos ou entre em contato com o suporte."
-            )
+            if 'espera' not in pagamento:
+                logger.error("Erro ao criar pagamento: %s", pagamento['error'])
+            await enviar(update.effective_chat.id, update.message.reply_text, mensagem_erro_cobranca(pagamento))
             return
 
-        # Salva apenas o ID do pagamento pendente
-        db.salvar_assinatura(user_id, pagamento['id'], datetime.now() + timedelta(days=30))
+        # Registra a cobrança; a assinatura só é gravada na ativação
+        await db.registrar_pagamento(pagamento['id'], user_id)
         
-        # Primeiro envia as instruções
-        update.message.reply_text(
-            "📱 Como pagar com PIX:\n"
-            "1. Abra seu aplicativo de banco\n"
-            "2. Escolha pagar com PIX\n"
-            "3. Cole o código abaixo\n"
-            "4. Confirme o pagamento"
-        )
-        
-        # Depois envia o código PIX
-        update.message.reply_text(
-            f"📋 Código PIX copia e cola:\n"
-            f"```\n{pagamento['pix_code']}\n```",
-            parse_mode='Markdown'
-        )
-        
-        # Por último, adiciona o botão de verificação
-        keyboard = [[InlineKeyboardButton("✅ Verificar Pagamento", callback_data=f"verificar_{pagamento['id']}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        update.message.reply_text(
-            "Clique no botão abaixo após realizar o pagamento:",
-            reply_markup=reply_markup
-        )
+        # Instruções, código PIX e botão de verificação em uma única mensagem
+        texto, reply_markup = mensagem_pix(pagamento)
+        registrar_funil('cobranca')
+        await enviar(update.effective_chat.id, update.message.reply_text, texto, parse_mode='Markdown', reply_markup=reply_markup)
         
     except Exception as e:
-        logger.error(f"Erro ao processar assinatura: {str(e)}", exc_info=True)
-        update.message.reply_text(
+        logger.error("Erro ao processar assinatura: %s", e, exc_info=True)
+        await enviar(
+            update.effective_chat.id, update.message.reply_text,
             "❌ Desculpe, ocorreu um erro inesperado.\n"
             "Por favor, tente novamente em alguns minutos ou entre em contato com o suporte."
         )
 
-def button_callback(update: Update, context: CallbackContext):
+async def comprovante(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    mensagem = update.message
+    logger.info("Comprovante enviado por %s", user_id)
+    espera = limite_comprovantes.tentar(user_id)
+    if espera:
+        logger.info("Usuário %s atingiu o limite de comprovantes", user_id)
+        await enviar(
+            update.effective_chat.id, mensagem.reply_text,
+            "⏳ Você enviou muitos comprovantes em pouco tempo.\n"
+            f"Por favor, tente novamente em {math.ceil(espera / 60)} minutos."
+        )
+        return
+    # Das fotos, a de maior resolução; documentos são validados pelo conteúdo
+    arquivo = mensagem.photo[-1] if mensagem.photo else mensagem.document
+    try:
+        # Sem cobrança em aberto não há o que comprovar: nada é baixado nem repassado
+        if not await db.tem_cobranca_em_aberto(user_id):
+            logger.info("Comprovante de %s recusado: nenhuma cobrança em aberto", user_id)
+            await enviar(
+                update.effective_chat.id, mensagem.reply_text,
+                "❌ Você não tem nenhuma cobrança em aberto.\n"
+                "Use /assinar para gerar o PIX e envie o comprovante depois de pagar."
+            )
+            return
+        midia = await recepcao_midia.receber(context.bot, arquivo.file_id, arquivo.file_size)
+        if 'error' in midia:
+            await enviar(
+                update.effective_chat.id, mensagem.reply_text,
+                "❌ Não foi possível ler o comprovante.\n"
+                f"Envie uma captura de tela, foto ou PDF de até {MIDIA_TAMANHO_MAXIMO_MB} MB."
+            )
+            return
+
+        # Os administradores recebem uma cópia da mensagem, sem reenviar o arquivo
+        legenda = f"🧾 Comprovante de {user_id} ({midia['tipo']}, {midia['tamanho'] // 1024} KiB)"
+        for admin_id in ADMIN_IDS:
+            await enviar(
+                admin_id, context.bot.copy_message,
+                chat_id=admin_id, from_chat_id=update.effective_chat.id, message_id=mensagem.message_id, caption=legenda
+            )
+        await enviar(
+            update.effective_chat.id, mensagem.reply_text,
+            "📨 Comprovante recebido!\n"
+            "Se o pagamento já foi feito, use o botão \"Verificar Pagamento\" para liberar seu acesso."
+        )
+    except Exception as e:
+        logger.error("Erro ao processar comprovante: %s", e, exc_info=True)
+        await enviar(
+            update.effective_chat.id, mensagem.reply_text,
+            "❌ Ocorreu um erro ao receber o comprovante.\n"
+            "Por favor, tente novamente em alguns minutos."
+        )
+
+async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
     if query.data == "assinar_vip":
         try:
             user_id = query.from_user.id
-            logger.info(f"Botão de assinatura clicado por {user_id}")
+            logger.info("Botão de assinatura clicado por %s", user_id)
             
             # Verifica se já é assinante
-            assinatura = db.get_assinatura(user_id)
-            if assinatura and assinatura['link_invite'] and assinatura['data_expiracao'] > datetime.now():  # Verifica se tem link e se não expirou
-                dias_restantes = (assinatura['data_expiracao'] - datetime.now()).days
-                query.message.reply_text(
+            assinatura = await db.get_assinatura(user_id)
+            if assinatura and assinatura.link_invite and assinatura.data_expiracao > datetime.now():  # Verifica se tem link e se não expirou
+                dias_restantes = (assinatura.data_expiracao - datetime.now()).days
+                await enviar(
+                    query.message.chat_id, query.message.reply_text,
                     f"✅ Você já é um assinante VIP!\n\n"
                     f"📅 Sua assinatura expira em {dias_restantes} dias.\n\n"
                     f"Para renovar, aguarde a expiração da sua assinatura atual."
@@ -153,47 +363,27 @@ def button_callback(update: Update, context: CallbackContext):
                 return
 
             # Cria o pagamento PIX
-            logger.info(f"Criando pagamento PIX para usuário {user_id}")
-            pagamento = pagamentos.criar_pagamento_pix(10.00, "Assinatura VIP - 30 dias")
-            
+            logger.info("Criando pagamento PIX para usuário %s", user_id)
+            pagamento = await obter_pagamento_pix(context, user_id)
+
             if 'error' in pagamento:
-                logger.error(f"Erro ao criar pagamento: {pagamento['error']}")
-                query.message.reply_text(
-                    "❌ Desculpe, ocorreu um erro ao gerar o pagamento.\n"
-                    "Por favor, tente novamente em alguns minutos ou entre em contato com o suporte."
-                )
+                if 'espera' not in pagamento:
+                    logger.error("Erro ao criar pagamento: %s", pagamento['error'])
+                await enviar(query.message.chat_id, query.message.reply_text, mensagem_erro_cobranca(pagamento))
                 return
 
-            # Salva apenas o ID do pagamento pendente
-            db.salvar_assinatura(user_id, pagamento['id'], datetime.now() + timedelta(days=30))
-            
-            # Primeiro envia as instruções
-            query.message.reply_text(
-                "📱 Como pagar com PIX:\n"
-                "1. Abra seu aplicativo de banco\n"
-                "2. Escolha pagar com PIX\n"
-                "3. Cole o código abaixo\n"
-                "4. Confirme o pagamento"
-            )
+            # Registra a cobrança; a assinatura só é gravada na ativação
+            await db.registrar_pagamento(pagamento['id'], user_id)
             
-            # Depois envia o código PIX
-            query.message.reply_text(
-                f"📋 Código PIX copia e cola:\n"
-                f"```\n{pagamento['pix_code']}\n```",
-                parse_mode='Markdown'
-            )
-            
-            # Por último, adiciona o botão de verificação
-            keyboard = [[InlineKeyboardButton("✅ Verificar Pagamento", callback_data=f"verificar_{pagamento['id']}")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            query.message.reply_text(
-                "Clique no botão abaixo após realizar o pagamento:",
-                reply_markup=reply_markup
-            )
+            # Instruções, código PIX e botão de verificação em uma única mensagem
+            texto, reply_markup = mensagem_pix(pagamento)
+            registrar_funil('cobranca')
+            await enviar(query.message.chat_id, query.message.reply_text, texto, parse_mode='Markdown', reply_markup=reply_markup)
             
         except Exception as e:
-            logger.error(f"Erro ao processar assinatura: {str(e)}", exc_info=True)
-            query.message.reply_text(
+            logger.error("Erro ao processar assinatura: %s", e, exc_info=True)
+            await enviar(
+                query.message.chat_id, query.message.reply_text,
                 "❌ Desculpe, ocorreu um erro inesperado.\n"
                 "Por favor, tente novamente em alguns minutos ou entre em contato com o suporte."
             )
@@ -201,66 +391,399 @@ def button_callback(update: Update, context: CallbackContext):
             
     if query.data.startswith("verificar_"):
         payment_id = query.data.split("_")[1]
-        logger.info(f"Verificando pagamento {payment_id} para usuário {query.from_user.id}")
+        logger.info("Verificando pagamento %s para usuário %s", payment_id, query.from_user.id)
+        registrar_funil('verificacao')
         
         try:
             # Verifica o status do pagamento
-            status = pagamentos.verificar_pagamento(payment_id)
+            status = await verificador.verificar_pagamento(payment_id)
             
             if 'error' in status:
-                logger.error(f"Erro ao verificar pagamento: {status['error']}")
-                query.message.reply_text(
+                logger.error("Erro ao verificar pagamento: %s", status['error'])
+                await enviar(
+                    query.message.chat_id, query.message.reply_text,
                     "❌ Erro ao verificar o pagamento.\n"
                     "Por favor, tente novamente em alguns minutos."
                 )
                 return
                 
             if status['status'] == 'approved':
-                # Gera link de convite único
-                invite_link = context.bot.create_chat_invite_link(
-                    chat_id=VIP_GROUP_ID,
-                    member_limit=1,
-                    expire_date=int((datetime.now() + timedelta(days=1)).timestamp())
-                )
-                
-                # Atualiza a assinatura com o link
-                db.salvar_assinatura(
-                    query.from_user.id,
-                    payment_id,
-                    datetime.now() + timedelta(days=30),
-                    invite_link.invite_link
-                )
-                
-                query.message.reply_text(
-                    "✅ *Pagamento confirmado!*\n\n"
-                    "🎉 Parabéns! Você agora é um membro VIP!\n\n"
-                    "🔗 Use o link abaixo para acessar o grupo:\n"
-                    f"{invite_link.invite_link}\n\n"
-                    "⚠️ O link expira em 24 horas.\n"
-                    "💎 Sua assinatura é válida por 30 dias.",
-                    parse_mode='Markdown'
-                )
+                registrar_funil('aprovado')
+                pagamento = await db.get_pagamento(payment_id)
+                user_id = pagamento['user_id'] if pagamento else query.from_user.id
+                if pagamento and pagamento['estado'] == 'activated':
+                    # Já ativado (pelo webhook, pela reconciliação ou por um clique anterior)
+                    invite_link = None
+                else:
+                    invite_link = await ativacoes.executar(payment_id, ativar_assinatura, context.bot, user_id, payment_id)
+                if invite_link is None:
+                    assinatura = await db.get_assinatura_por_pagamento(payment_id)
+                    invite_link = assinatura and assinatura.link_invite
+
+                if invite_link:
+                    await enviar(
+                        query.message.chat_id, query.message.reply_text,
+                        mensagem_confirmacao(invite_link),
+                        parse_mode='Markdown',
+                        prioridade=PRIORIDADE_CONFIRMACAO
+                    )
+                else:
+                    await enviar(
+                        query.message.chat_id, query.message.reply_text,
+                        "✅ Pagamento confirmado!\n"
+                        "⏳ Seu acesso está sendo liberado, o link chegará em instantes."
+                    )
             else:
-                query.message.reply_text(
+                if status['status'] in STATUS_FINAIS:
+                    # Cobrança recusada ou cancelada: o próximo /assinar gera outra
+                    cobrancas_pendentes.invalidar(query.from_user.id)
+                await enviar(
+                    query.message.chat_id, query.message.reply_text,
                     "⏳ Pagamento ainda não foi confirmado.\n"
                     "Por favor, aguarde alguns minutos e tente novamente."
                 )
                 
         except Exception as e:
-            logger.error(f"Erro ao processar verificação de pagamento: {str(e)}", exc_info=True)
-            query.message.reply_text(
+            logger.error("Erro ao processar verificação de pagamento: %s", e, exc_info=True)
+            await enviar(
+                query.message.chat_id, query.message.reply_text,
                 "❌ Ocorreu um erro ao verificar o pagamento.\n"
                 "Por favor, tente novamente em alguns minutos."
             )
 
-def remover_expirados(context: CallbackContext):
-    logger.info("Verificando assinaturas expiradas...")
-    expirados = db.get_assinaturas_expiradas()
-    for user_id in expirados:
-        db.remover_assinatura(user_id)
-        logger.info(f"Assinatura removida para usuário {user_id}")
+async def ativar_assinatura(bot, user_id, payment_id):
+    # Garante o registro do pagamento aprovado (cobranças anteriores à tabela de pagamentos)
+    await db.registrar_pagamento(payment_id, user_id)
+    await db.atualizar_estado_pagamento(payment_id, 'approved', 'approved')
+
+    # Reserva o pagamento no banco: entre processos e réplicas, só um gera o link
+    token = await db.reservar_ativacao(payment_id)
+    if token is None:
+        logger.info("Pagamento %s já ativado ou em ativação", payment_id)
+        return None
+
+    try:
+        # Gera link de convite único
+        invite_link = await bot.create_chat_invite_link(
+            chat_id=VIP_GROUP_ID,
+            member_limit=1,
+            expire_date=int((datetime.now() + timedelta(days=1)).timestamp())
+        )
+    except Exception:
+        await db.liberar_ativacao(payment_id, token)
+        raise
+
+    # Atualiza a assinatura com o link
+    concluida = await db.concluir_ativacao(
+        token,
+        user_id,
+        payment_id,
+        datetime.now() + timedelta(days=30),
+        invite_link.invite_link
+    )
+    if not concluida:
+        # A reserva venceu e outro processo ativou com o próprio link: este não é enviado
+        return None
+    logger.info("Assinatura ativada para usuário %s (pagamento %s)", user_id, payment_id)
+    cobrancas_pendentes.invalidar(user_id)
+    registrar_conversao()
+    return invite_link.invite_link
+
+def registrar_conversao():
+    # Chamadas à Bot API (exceto getUpdates) por assinatura ativada
+    conversoes = metricas.contador('conversoes_total', 'Assinaturas ativadas')
+    conversoes.inc()
+    chamadas = metricas.contador('telegram_chamadas_total', 'Chamadas à Bot API').valor
+    metricas.gauge('telegram_chamadas_por_conversao', 'Chamadas à Bot API por assinatura ativada').set(chamadas / conversoes.valor)
+
+def mensagem_confirmacao(invite_link):
+    return (
+        "✅ *Pagamento confirmado!*\n\n"
+        "🎉 Parabéns! Você agora é um membro VIP!\n\n"
+        "🔗 Use o link abaixo para acessar o grupo:\n"
+        f"{invite_link}\n\n"
+        "⚠️ O link expira em 24 horas.\n"
+        "💎 Sua assinatura é válida por 30 dias."
+    )
+
+async def ativar_e_notificar(bot, payment_id):
+    # Chamado pelo webhook e pela reconciliação quando um pagamento é aprovado
+    pagamento = await db.get_pagamento(payment_id)
+    if not pagamento:
+        logger.warning("Pagamento %s aprovado sem cobrança registrada", payment_id)
+        return False
+    if pagamento['estado'] == 'activated':
+        logger.info("Pagamento %s já estava ativado", payment_id)
+        return False
+    invite_link = await ativacoes.executar(str(payment_id), ativar_assinatura, bot, pagamento['user_id'], str(payment_id))
+    if invite_link is None:
+        return False
+    await enviar(
+        pagamento['user_id'],
+        bot.send_message,
+        chat_id=pagamento['user_id'],
+        text=mensagem_confirmacao(invite_link),
+        parse_mode='Markdown',
+        prioridade=PRIORIDADE_CONFIRMACAO
+    )
+    return True
+
+async def reconciliar_pendentes(context: ContextTypes.DEFAULT_TYPE):
+    inicio = time.perf_counter()
+    pendentes = await db.get_pagamentos_pendentes()
+    ids = [p['payment_id'] for p in pendentes]
+    metricas.gauge('reconciliacao_pendentes', 'Pagamentos pendentes na última execução').set(len(ids))
+    if not ids:
+        return
+
+    # Já aprovados cuja ativação não terminou são tentados de novo sem consultar o Mercado
+    # Pago; um que continue falhando (ex.: bot sem permissão no grupo) gera alerta
+    ja_aprovados = [p for p in pendentes if p['estado'] == 'approved']
+    limite_preso = datetime.now() - timedelta(hours=1)
+    presos = sum(p['criado_em'] < limite_preso for p in ja_aprovados)
+    metricas.gauge('reconciliacao_aprovados_presos', 'Pagamentos aprovados há mais de uma hora sem ativação').set(presos)
+    if presos:
+        logger.warning("%s pagamentos aprovados há mais de uma hora continuam sem ativação", presos)
+    nao_pagos = [p for p in pendentes if p['estado'] != 'approved']
+    if not nao_pagos:
+        resultado = {'aprovados': set(), 'paginas': 0}
+    else:
+        # A janela da busca vem só das cobranças não pagas. Cobranças do pool podem ter sido
+        # criadas no Mercado Pago antes de irem para o usuário
+        desde = min(p['criado_em'] for p in nao_pagos) - timedelta(minutes=PIX_POOL_TTL_MINUTOS, hours=1)
+        resultado = await pagamentos.buscar_pagamentos_aprovados(desde)
+    if 'error' not in resultado:
+        metricas.contador('reconciliacao_buscas_total', 'Chamadas de busca ao Mercado Pago').inc(resultado['paginas'])
+        metricas.histograma('reconciliacao_lote_tamanho', 'Pagamentos por lote', buckets=TAMANHOS_LOTE).observar(len(ids))
+        aprovados = [p['payment_id'] for p in ja_aprovados]
+        aprovados += [p['payment_id'] for p in nao_pagos if p['payment_id'] in resultado['aprovados']]
+    else:
+        # Sem a busca, consulta cada pagamento em lotes com concorrência limitada
+        logger.warning("Busca em lote indisponível, verificando pagamentos individualmente")
+        aprovados = []
+        semaforo = asyncio.Semaphore(RECONCILIACAO_CONCORRENCIA)
+
+        async def verificar(payment_id):
+            async with semaforo:
+                return await verificador.verificar_pagamento(payment_id)
+
+        for i in range(0, len(ids), RECONCILIACAO_LOTE):
+            lote = ids[i:i + RECONCILIACAO_LOTE]
+            inicio_lote = time.perf_counter()
+            resultados = await asyncio.gather(*(verificar(payment_id) for payment_id in lote))
+            metricas.histograma('reconciliacao_lote_segundos', 'Latência de cada lote de verificações').observar(time.perf_counter() - inicio_lote)
+            metricas.histograma('reconciliacao_lote_tamanho', 'Pagamentos por lote', buckets=TAMANHOS_LOTE).observar(len(lote))
+            aprovados += [payment_id for payment_id, r in zip(lote, resultados) if r.get('status') == 'approved']
+
+    ativados = 0
+    for payment_id in aprovados:
+        try:
+            if await ativar_e_notificar(context.bot, payment_id):
+                ativados += 1
+        except Exception as e:
+            logger.error("Erro ao ativar pagamento %s na reconciliação: %s", payment_id, e, exc_info=True)
+
+    # Cobranças não pagas bem depois do vencimento do PIX não são mais consultadas
+    expirados = await db.expirar_pagamentos(datetime.now() - timedelta(hours=PIX_EXPIRACAO_HORAS, days=1))
+
+    duracao = time.perf_counter() - inicio
+    metricas.histograma('reconciliacao_segundos', 'Duração de cada execução da reconciliação').observar(duracao)
+    metricas.contador('reconciliacao_aprovados_total', 'Pagamentos aprovados encontrados').inc(len(aprovados))
+    metricas.contador('reconciliacao_ativados_total', 'Assinaturas ativadas pela reconciliação').inc(ativados)
+    logger.info(
+        "Reconciliação: %s pendentes, %s aprovados, %s ativados, %s expirados em %.2fs",
+        len(ids), len(aprovados), ativados, expirados, duracao
+    )
+
+async def chamar_api_limitada(funcao, **kwargs):
+    # Respeita o limitador e, se o Telegram pedir, espera o RetryAfter e tenta de novo
+    while True:
+        await limitador_remocao.adquirir()
+        try:
+            return await funcao(**kwargs)
+        except RetryAfter as e:
+            espera = segundos_retry_after(e)
+            metricas.contador('remocao_retry_after_total', 'RetryAfter recebidos na remoção de membros').inc()
+            logger.warning("Telegram pediu para aguardar %.0fs na remoção de membros", espera)
+            limitador_remocao.pausar(espera)
+
+async def expulsar_membro(bot, user_id, link_invite):
+    assinatura = await db.get_assinatura(user_id)
+    renovou = assinatura and assinatura.link_invite and assinatura.data_expiracao > datetime.now()
+    if renovou:
+        logger.info("Usuário %s renovou a assinatura, não será removido do grupo", user_id)
+    else:
+        try:
+            # Banir e desbanir remove do grupo sem impedir que volte ao renovar
+            await chamar_api_limitada(bot.ban_chat_member, chat_id=VIP_GROUP_ID, user_id=user_id)
+            await chamar_api_limitada(bot.unban_chat_member, chat_id=VIP_GROUP_ID, user_id=user_id, only_if_banned=True)
+            metricas.contador('remocao_expulsos_total', 'Membros expirados removidos do grupo VIP').inc()
+            logger.info("Usuário %s removido do grupo VIP", user_id)
+        except BadRequest as e:
+            # Administradores e usuários inexistentes não podem ser removidos
+            logger.info("Usuário %s não removido do grupo: %s", user_id, e.message)
+
+    if link_invite and not (renovou and assinatura.link_invite == link_invite):
+        try:
+            await chamar_api_limitada(bot.revoke_chat_invite_link, chat_id=VIP_GROUP_ID, invite_link=link_invite)
+            metricas.contador('remocao_links_revogados_total', 'Links de convite revogados').inc()
+        except BadRequest as e:
+            logger.info("Link de convite de %s não revogado: %s", user_id, e.message)
+
+async def remover_expirados(context: ContextTypes.DEFAULT_TYPE):
+    # Move as assinaturas vencidas para a fila persistente de remoção
+    inicio = time.perf_counter()
+    total = 0
+    async for removidas in db.remover_expiradas(lote=REMOCAO_LOTE):
+        total += len(removidas)
+        for user_id, _ in removidas:
+            logger.info("Assinatura removida para usuário %s", user_id)
+    if total:
+        logger.info("%s assinaturas expiradas removidas em %.2fs", total, time.perf_counter() - inicio)
+
+    # Processa uma fatia da fila por execução; o que sobrar fica para a próxima. A fatia fica
+    # reservada a esta réplica, com folga para as chamadas limitadas a REMOCAO_TAXA por segundo
+    validade = timedelta(seconds=REMOCAO_INTERVALO + 2 * REMOCAO_MAX_POR_EXECUCAO / REMOCAO_TAXA)
+    fila = await db.reservar_fila_remocao(REMOCAO_MAX_POR_EXECUCAO, validade=validade)
+    for user_id, link_invite, tentativas in fila:
+        try:
+            await expulsar_membro(context.bot, user_id, link_invite)
+            await db.concluir_remocao(user_id)
+        except TelegramError as e:
+            if tentativas + 1 >= REMOCAO_MAX_TENTATIVAS:
+                logger.error("Desistindo de remover o usuário %s após %s tentativas: %s", user_id, tentativas + 1, e)
+                await db.concluir_remocao(user_id)
+            else:
+                espera = min(REMOCAO_INTERVALO * 2 ** tentativas, 86400)
+                logger.warning("Erro ao remover o usuário %s, nova tentativa em %ss: %s", user_id, espera, e)
+                await db.adiar_remocao(user_id, datetime.now() + timedelta(seconds=espera))
+    if fila:
+        logger.info("Fila de remoção: %s membros processados", len(fila))
+
+def registrar_handlers(application):
+    application.add_handler(CommandHandler("start", instrumentacao.handler('start', start)))
+    application.add_handler(CommandHandler("status", instrumentacao.handler('status', status)))
+    application.add_handler(CommandHandler("assinar", instrumentacao.handler('assinar', assinar)))
+    application.add_handler(CommandHandler("relatorio", instrumentacao.handler('relatorio', relatorio)))
+    application.add_handler(CallbackQueryHandler(instrumentacao.handler('botao', button_callback)))
+    application.add_handler(MessageHandler(
+        filters.ChatType.PRIVATE & (filters.PHOTO | filters.Document.ALL),
+        instrumentacao.handler('comprovante', comprovante)
+    ))
+
+async def iniciar_pool_pix(application, processos=1):
+    # PIX_POOL_SIZE é o total: no modo webhook cada trabalhador mantém a sua parte
+    tamanho = math.ceil(PIX_POOL_SIZE / processos)
+    if tamanho > 0:
+        pool = PoolPix(
+            pagamentos,
+            tamanho,
+            VALOR_ASSINATURA,
+            DESCRICAO_ASSINATURA,
+            ttl=timedelta(minutes=PIX_POOL_TTL_MINUTOS),
+            expiracao=timedelta(hours=PIX_EXPIRACAO_HORAS)
+        )
+        await pool.iniciar()
+        application.bot_data['pool_pix'] = pool
+
+async def iniciar_receptor_webhook(application):
+    # Webhook do Mercado Pago (opcional): ativa pagamentos sem o usuário clicar em verificar
+    webhook_porta = os.getenv('MERCADO_PAGO_WEBHOOK_PORT')
+    if webhook_porta:
+        segredo = os.getenv('MERCADO_PAGO_WEBHOOK_SECRET')
+        if not segredo:
+            # Sem o segredo qualquer um poderia enviar notificações falsas ao receptor
+            logger.error("MERCADO_PAGO_WEBHOOK_SECRET não definido: webhook do Mercado Pago desativado")
+            return
+        # Importado só aqui: sem o webhook o bot não carrega o aiohttp
+        from webhook import ReceptorWebhook
+        receptor = ReceptorWebhook(
+            verificador,
+            lambda payment_id: ativar_e_notificar(application.bot, payment_id),
+            porta=int(webhook_porta),
+            caminho=os.getenv('MERCADO_PAGO_WEBHOOK_PATH', '/webhook/mercadopago'),
+            segredo=segredo,
+            max_pendentes=int(os.getenv('MERCADO_PAGO_WEBHOOK_MAX_PENDENTES', '1000'))
+        )
+        await receptor.iniciar()
+        application.bot_data['receptor_webhook'] = receptor
+
+async def iniciar_metricas(application, deslocamento=0):
+    # No modo webhook cada trabalhador expõe as suas métricas numa porta seguinte
+    if METRICAS_PORTA:
+        servidor = ServidorMetricas(METRICAS_PORTA + deslocamento)
+        await servidor.iniciar()
+        application.bot_data['servidor_metricas'] = servidor
+
+async def ao_iniciar(application):
+    await iniciar_metricas(application)
+    await iniciar_pool_pix(application)
+    await iniciar_receptor_webhook(application)
+
+async def ao_iniciar_ingresso(application):
+    await iniciar_metricas(application)
+    await iniciar_receptor_webhook(application)
+
+async def ao_finalizar(application):
+    servidor = application.bot_data.get('servidor_metricas')
+    if servidor:
+        await servidor.parar()
+    receptor = application.bot_data.get('receptor_webhook')
+    if receptor:
+        await receptor.parar()
+    pool = application.bot_data.get('pool_pix')
+    if pool:
+        await pool.parar()
+    await fila_envio.parar()
+    await pagamentos.fechar()
+    await db.fechar()
+
+def construir_aplicacao(post_init=None, com_updater=True):
+    if db is None:
+        criar_servicos()
+    # Os updates são processados em paralelo até o limite configurado, mas os de um
+    # mesmo usuário em ordem
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(ProcessadorPorUsuario(MAX_UPDATES_CONCORRENTES, medir_espera=instrumentacao.ativa))
+        .request(RequisicaoContada(connection_pool_size=TELEGRAM_MAX_CONEXOES))
+        .post_shutdown(ao_finalizar)
+    )
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+    if post_init:
+        builder = builder.post_init(post_init)
+    if not com_updater:
+        builder = builder.updater(None)
+    application = builder.build()
+    registrar_handlers(application)
+    return application
+
+def construir_trabalhador(indice, total):
+    # Cada processo tem sua fila de envio, então o limite global é dividido entre eles;
+    # o processo de ingresso também envia (confirmações da reconciliação e remoções)
+    criar_servicos(processos=total + 1)
+
+    async def ao_iniciar_trabalhador(application):
+        await iniciar_metricas(application, deslocamento=indice + 1)
+        await iniciar_pool_pix(application, processos=total)
+
+    return construir_aplicacao(post_init=ao_iniciar_trabalhador, com_updater=False)
+
+def agendar_tarefas(application):
+    job_queue = application.job_queue
+
+    # Agenda a remoção de assinaturas expiradas
+    job_queue.run_repeating(remover_expirados, interval=REMOCAO_INTERVALO, first=60)
+
+    # Agenda a reconciliação dos pagamentos pendentes
+    job_queue.run_repeating(reconciliar_pendentes, interval=RECONCILIACAO_INTERVALO, first=RECONCILIACAO_INTERVALO)
 
 def main():
+    if not BOT_TOKEN or not VIP_GROUP_ID:
+        logger.error('TELEGRAM_BOT_TOKEN ou VIP_GROUP_ID não configurados no .env')
+        exit(1)
     logger.info("Iniciando bot...")
     print("Iniciando bot...")
     print("Variáveis de ambiente carregadas")
@@ -268,28 +791,38 @@ def main():
     print(f"VIP_GROUP_ID: {VIP_GROUP_ID}")
     print(f"MERCADO_PAGO_ACCESS_TOKEN: {os.getenv('MERCADO_PAGO_ACCESS_TOKEN')[:8]}...")
 
-    # Cria o updater
-    updater = Updater(BOT_TOKEN)
+    if TELEGRAM_WEBHOOK_URL:
+        from ingresso import executar_ingresso
 
-    # Adiciona os handlers
-    updater.dispatcher.add_handler(CommandHandler("start", start))
-    updater.dispatcher.add_handler(CommandHandler("status", status))
-    updater.dispatcher.add_handler(CommandHandler("assinar", assinar))
-    updater.dispatcher.add_handler(CallbackQueryHandler(button_callback))
+        # O processo principal recebe os updates e roda as tarefas agendadas;
+        # os trabalhadores processam os updates. Cada um fica com uma parte do limite de envio
+        criar_servicos(processos=INGRESSO_WORKERS + 1)
+        application = construir_aplicacao(post_init=ao_iniciar_ingresso, com_updater=False)
+        agendar_tarefas(application)
+        executar_ingresso(
+            application,
+            construir_trabalhador,
+            workers=INGRESSO_WORKERS,
+            porta=TELEGRAM_WEBHOOK_PORT,
+            caminho=TELEGRAM_WEBHOOK_PATH,
+            url=TELEGRAM_WEBHOOK_URL,
+            segredo=TELEGRAM_WEBHOOK_SECRET
+        )
+        return
 
-    # Agenda a verificação de assinaturas expiradas
-    job_queue = updater.job_queue
-    job_queue.run_daily(remover_expirados, time=datetime.now().time())
+    application = construir_aplicacao(post_init=ao_iniciar)
+    agendar_tarefas(application)
 
     # Inicia o bot
-    updater.start_polling()
-    updater.idle()
+    application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
+    # Configuração de logging: JSON em bot.log, gravado por uma thread a partir de uma fila
+    configurar_logs()
     logger.info("Script principal iniciado.")
     try:
         main()
     except Exception as e:
-        logger.error(f"Erro ao iniciar o bot: {e}", exc_info=True)
+        logger.error("Erro ao iniciar o bot: %s", e, exc_info=True)
     finally:
         logger.info("Script principal finalizado.") 
\ No newline at end of file
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from metricas import registro as metricas
+
+# Marca uma consulta sem resultado (cache negativo)
+AUSENTE = object()
+
+
+class CacheLRU:
+    """Cache LRU limitado com TTL por entrada e TTL próprio para resultados ausentes.
+
+    Não é thread-safe: deve ser usado apenas a partir do event loop.
+    """
+
+    def __init__(self, nome, tamanho=10000, ttl=60.0, ttl_negativo=10.0):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self._dados = OrderedDict()
+        self._geracao = 0
+        self._acertos = metricas.contador(f'{nome}_acertos_total', f'Consultas respondidas pelo cache {nome}')
+        self._faltas = metricas.contador(f'{nome}_faltas_total', f'Consultas que não estavam no cache {nome}')
+        self._remocoes = metricas.contador(f'{nome}_remocoes_total', f'Entradas removidas do cache {nome} por tamanho')
+
+    def __len__(self):
+        return len(self._dados)
+
+    @property
+    def geracao(self):
+        return self._geracao
+
+    def obter(self, chave):
+        """Retorna o valor, AUSENTE (negativo em cache) ou None quando precisa consultar a origem."""
+        if self.tamanho <= 0:
+            return None
+        item = self._dados.get(chave)
+        if item is None:
+            self._faltas.inc()
+            return None
+        valor, expira_em = item
+        if time.monotonic() >= expira_em:
+            del self._dados[chave]
+            self._faltas.inc()
+            return None
+        self._dados.move_to_end(chave)
+        self._acertos.inc()
+        return valor
+
+    def colocar(self, chave, valor, geracao=None, ttl=None):
+        """Guarda o valor (None vira AUSENTE); ignora se houve invalidação desde `geracao`.
+
+        `ttl` substitui o TTL padrão do cache só para esta entrada.
+        """
+        if self.tamanho <= 0 or (geracao is not None and geracao != self._geracao):
+            return
+        if valor is None:
+            valor, ttl = AUSENTE, self.ttl_negativo
+        elif ttl is None:
+            ttl = self.ttl
+        if ttl <= 0:
+            return
+        self._dados[chave] = (valor, time.monotonic() + ttl)
+        self._dados.move_to_end(chave)
+        if len(self._dados) > self.tamanho:
+            self._dados.popitem(last=False)
+            self._remocoes.inc()
+
+    def invalidar(self, chave):
+        self._geracao += 1
+        self._dados.pop(chave, None)
+
+    def limpar(self):
+        self._geracao += 1
+        self._dados.clear()
+
+    def estatisticas(self):
+        acertos, faltas = self._acertos.valor, self._faltas.valor
+        total = acertos + faltas
+        return {
+            'entradas': len(self._dados),
+            'acertos': acertos,
+            'faltas': faltas,
+            'taxa_acerto': acertos / total if total else 0.0,
+        }
+
+
+class VooUnico:
+    """Junta chamadas simultâneas com a mesma chave em uma única execução."""
+
+    def __init__(self, nome):
+        self._em_voo = {}
+        self._coalescidas = metricas.contador(f'{nome}_coalescidas_total', f'Chamadas de {nome} que aproveitaram outra em andamento')
+
+    def __contains__(self, chave):
+        return chave in self._em_voo
+
+    async def executar(self, chave, funcao, *args):
+        tarefa = self._em_voo.get(chave)
+        if tarefa is None:
+            tarefa = self._em_voo[chave] = asyncio.ensure_future(funcao(*args))
+            tarefa.add_done_callback(lambda _: self._em_voo.pop(chave, None))
+        else:
+            self._coalescidas.inc()
+        # shield: quem desiste de esperar não cancela a execução dos demais
+        return await asyncio.shield(tarefa)
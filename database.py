@@ -1,78 +1,186 @@
-import sqlite3
+import os
+import uuid
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from cache import CacheLRU, AUSENTE
+from armazenamento import ArmazenamentoSQLite
 
 logger = logging.getLogger(__name__)
 
+# Máquina de estados dos pagamentos: estado -> estados seguintes permitidos
+TRANSICOES = {
+    'created': ('pending', 'approved', 'expired'),
+    'pending': ('approved', 'expired'),
+    'approved': ('activated',),
+    'activated': (),
+    'expired': (),
+}
+ESTADOS_PENDENTES = ('created', 'pending', 'approved')
+# Cobranças enviadas ao usuário e ainda não pagas
+ESTADOS_NAO_PAGOS = ('created', 'pending')
+# Cobranças pagas, ativadas ou ainda em ativação
+ESTADOS_PAGOS = ('approved', 'activated')
+
+def origens(estado):
+    # Estados a partir dos quais se pode chegar a `estado`
+    return tuple(e for e, seguintes in TRANSICOES.items() if estado in seguintes)
+
+def criar_armazenamento(url=None):
+    # DATABASE_URL: caminho de um arquivo SQLite ou URL postgresql:// para várias réplicas
+    url = url or os.getenv('DATABASE_URL', 'assinaturas.db')
+    if url.startswith(('postgres://', 'postgresql://')):
+        from armazenamento_postgres import ArmazenamentoPostgres
+        return ArmazenamentoPostgres(
+            url,
+            min_conexoes=int(os.getenv('DB_MIN_CONEXOES', '1')),
+            max_conexoes=int(os.getenv('DB_MAX_CONEXOES', '10'))
+        )
+    return ArmazenamentoSQLite(
+        url,
+        leitores=int(os.getenv('DB_LEITORES', '4')),
+        max_lote=int(os.getenv('DB_MAX_LOTE', '256')),
+        synchronous=os.getenv('DB_SYNCHRONOUS', 'FULL')
+    )
+
 class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect('assinaturas.db', check_same_thread=False)
-        self.criar_tabela()
+    def __init__(self, url=None, cache_tamanho=None, cache_ttl=None, cache_ttl_negativo=None):
+        self.armazenamento = criar_armazenamento(url)
+        # Cache das assinaturas por usuário, consultado no event loop antes de ir ao banco
+        self.cache = CacheLRU(
+            'db_cache_assinaturas',
+            tamanho=int(os.getenv('DB_CACHE_TAMANHO', '10000')) if cache_tamanho is None else cache_tamanho,
+            ttl=float(os.getenv('DB_CACHE_TTL', '60')) if cache_ttl is None else cache_ttl,
+            ttl_negativo=float(os.getenv('DB_CACHE_TTL_NEGATIVO', '10')) if cache_ttl_negativo is None else cache_ttl_negativo
+        )
         logger.info("Banco de dados inicializado")
 
-    def criar_tabela(self):
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS assinaturas (
-                    user_id INTEGER PRIMARY KEY,
-                    payment_id TEXT,
-                    data_expiracao TIMESTAMP,
-                    link_invite TEXT
-                )
-            ''')
-            self.conn.commit()
-            logger.info("Tabela de assinaturas criada/verificada")
-        except Exception as e:
-            logger.error(f"Erro ao criar tabela: {str(e)}", exc_info=True)
-            raise
-
-    def salvar_assinatura(self, user_id, payment_id, data_expiracao, link_invite=None):
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO assinaturas (user_id, payment_id, data_expiracao, link_invite)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, payment_id, data_expiracao, link_invite))
-            self.conn.commit()
-            logger.info(f"Assinatura salva para usuário {user_id}")
-        except Exception as e:
-            logger.error(f"Erro ao salvar assinatura: {str(e)}", exc_info=True)
-            raise
-
-    def get_assinatura(self, user_id):
+    async def fechar(self):
+        await self.armazenamento.fechar()
+
+    async def salvar_assinatura(self, user_id, payment_id, data_expiracao, link_invite=None):
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM assinaturas WHERE user_id = ?', (user_id,))
-            result = cursor.fetchone()
-            
-            if result:
-                return {
-                    'user_id': result[0],
-                    'payment_id': result[1],
-                    'data_expiracao': datetime.fromisoformat(result[2]),
-                    'link_invite': result[3]
-                }
-            return None
-        except Exception as e:
-            logger.error(f"Erro ao buscar assinatura: {str(e)}", exc_info=True)
-            raise
-
-    def remover_assinatura(self, user_id):
+            await self.armazenamento.salvar_assinatura(user_id, payment_id, data_expiracao, link_invite)
+        finally:
+            self.cache.invalidar(user_id)
+
+    async def get_assinatura(self, user_id):
+        assinatura = self.cache.obter(user_id)
+        if assinatura is not None:
+            return None if assinatura is AUSENTE else assinatura
+        geracao = self.cache.geracao
+        assinatura = await self.armazenamento.get_assinatura(user_id)
+        self.cache.colocar(user_id, assinatura, geracao)
+        return assinatura
+
+    async def get_assinatura_por_pagamento(self, payment_id):
+        return await self.armazenamento.get_assinatura_por_pagamento(payment_id)
+
+    async def registrar_pagamento(self, payment_id, user_id):
+        """Registra a cobrança enviada ao usuário, no estado 'created'."""
+        await self.armazenamento.registrar_pagamento(str(payment_id), user_id, datetime.now())
+
+    async def get_pagamento(self, payment_id):
+        return await self.armazenamento.get_pagamento(str(payment_id))
+
+    async def atualizar_estado_pagamento(self, payment_id, estado, status=None):
+        """Move o pagamento para `estado` se a transição for permitida; retorna se mudou."""
+        return await self.armazenamento.atualizar_estado_pagamento(
+            str(payment_id), estado, status, origens(estado), datetime.now()
+        )
+
+    async def tem_cobranca_em_aberto(self, user_id):
+        """Se o usuário tem alguma cobrança enviada e ainda não paga."""
+        return await self.armazenamento.tem_pagamento(user_id, ESTADOS_NAO_PAGOS)
+
+    async def get_pagamentos_pendentes(self):
+        return await self.armazenamento.get_pagamentos_pendentes(ESTADOS_PENDENTES)
+
+    async def expirar_pagamentos(self, criados_antes):
+        """Marca como 'expired' as cobranças não pagas criadas antes da data; retorna quantas."""
+        return await self.armazenamento.expirar_pagamentos(origens('expired'), criados_antes, datetime.now())
+
+    async def remover_assinatura(self, user_id):
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('DELETE FROM assinaturas WHERE user_id = ?', (user_id,))
-            self.conn.commit()
-            logger.info(f"Assinatura removida para usuário {user_id}")
-        except Exception as e:
-            logger.error(f"Erro ao remover assinatura: {str(e)}", exc_info=True)
-            raise
-
-    def get_assinaturas_expiradas(self):
+            await self.armazenamento.remover_assinatura(user_id)
+        finally:
+            self.cache.invalidar(user_id)
+
+    async def remover_expiradas(self, agora=None, lote=1000):
+        """Remove as assinaturas vencidas em lotes, cada um em uma transação.
+
+        Gerador assíncrono: entrega a lista de (user_id, link_invite) de cada lote removido,
+        sem carregar todas as vencidas em memória. Na mesma transação os removidos entram
+        na fila_remocao, então uma queda no meio não perde ninguém a remover do grupo.
+        """
+        agora = agora or datetime.now()
+        while True:
+            removidas = await self.armazenamento.remover_expiradas_lote(agora, lote)
+            for user_id, _ in removidas:
+                self.cache.invalidar(user_id)
+            if removidas:
+                yield removidas
+            if len(removidas) < lote:
+                return
+
+    async def reservar_fila_remocao(self, limite, agora=None, validade=timedelta(minutes=10)):
+        """Pega até `limite` entradas da fila de remoção: lista de (user_id, link_invite, tentativas).
+
+        As entradas ficam reservadas por `validade`, então réplicas que removem ao mesmo tempo
+        não repetem o mesmo banimento; se quem reservou cair, elas voltam à fila depois disso.
+        """
+        agora = agora or datetime.now()
+        return await self.armazenamento.reservar_fila_remocao(limite, agora, agora + validade)
+
+    async def concluir_remocao(self, user_id):
+        await self.armazenamento.concluir_remocao(user_id)
+
+    async def adiar_remocao(self, user_id, proxima_tentativa):
+        await self.armazenamento.adiar_remocao(user_id, proxima_tentativa)
+
+    async def reservar_ativacao(self, payment_id, validade=timedelta(minutes=1)):
+        """Reserva o pagamento para ativação; retorna o token da reserva ou None.
+
+        Só pagamentos no estado 'approved' podem ser reservados e só uma reserva vale por
+        vez, entre processos e réplicas. Se quem reservou cair, a reserva vence em `validade`.
+        """
+        token = uuid.uuid4().hex
+        agora = datetime.now()
+        if await self.armazenamento.reservar_ativacao(str(payment_id), token, agora, agora + validade):
+            return token
+        return None
+
+    async def concluir_ativacao(self, token, user_id, payment_id, data_expiracao, link_invite):
+        """Grava a assinatura e marca o pagamento como ativado se a reserva `token` ainda vale.
+
+        Retorna False, sem gravar nada, quando a reserva venceu e outro processo assumiu.
+        """
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT user_id FROM assinaturas WHERE data_expiracao < ?', (datetime.now(),))
-            return [row[0] for row in cursor.fetchall()]
-        except Exception as e:
-            logger.error(f"Erro ao buscar assinaturas expiradas: {str(e)}", exc_info=True)
-            raise 
\ No newline at end of file
+            reservado = await self.armazenamento.concluir_ativacao(
+                token, user_id, str(payment_id), data_expiracao, link_invite, datetime.now()
+            )
+        finally:
+            self.cache.invalidar(user_id)
+        if not reservado:
+            logger.warning("Reserva do pagamento %s venceu antes da ativação terminar", payment_id)
+        return reservado
+
+    async def liberar_ativacao(self, payment_id, token):
+        await self.armazenamento.liberar_ativacao(str(payment_id), token)
+
+    async def exportar_assinaturas(self, lote=1000):
+        """Gerador assíncrono com todas as assinaturas, como registros Assinatura.
+
+        Busca `lote` linhas por vez no banco: a memória usada não cresce com a tabela.
+        """
+        async for registros in self.armazenamento.exportar_assinaturas(lote):
+            for registro in registros:
+                yield registro
+
+    async def resumo_assinaturas(self, dias=7, agora=None):
+        """Retorna (ativas, expirando nos próximos `dias`), contadas no próprio banco."""
+        agora = agora or datetime.now()
+        return await self.armazenamento.resumo_assinaturas(agora, agora + timedelta(days=dias))
+
+    async def pagamentos_por_mes(self):
+        """Lista de (mês 'AAAA-MM', cobranças pagas), pelo mês de criação da cobrança."""
+        return await self.armazenamento.pagamentos_por_mes(ESTADOS_PAGOS)
@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import OrderedDict
+
+from telegram.error import RetryAfter
+from telegram.request import HTTPXRequest
+
+from limitador import TokenBucket, segundos_retry_after
+from metricas import registro as metricas
+
+logger = logging.getLogger(__name__)
+
+# Menor valor sai primeiro
+PRIORIDADE_CONFIRMACAO = 0
+PRIORIDADE_NORMAL = 1
+PRIORIDADE_BAIXA = 2
+
+
+class FilaEnvio:
+    """Fila central de mensagens para o Telegram com prioridade e limites por chat e global.
+
+    Os limites padrão seguem a orientação do Telegram: cerca de 30 mensagens por segundo
+    no total e 1 por segundo por chat, com pequenas rajadas.
+
+    Cada chat tem a sua fila e só a próxima mensagem dele fica na fila principal. Um
+    worker nunca espera pelo limite de um chat: sem token, a mensagem volta para a fila
+    principal quando o chat puder receber de novo, e os workers seguem com os outros chats.
+    """
+
+    def __init__(self, taxa_global=30.0, taxa_chat=1.0, rajada_chat=3, workers=8, max_chats=10000):
+        self.taxa_chat = taxa_chat
+        self.rajada_chat = rajada_chat
+        self.workers = workers
+        self.max_chats = max_chats
+        self.global_ = TokenBucket(taxa_global)
+        self._chats = OrderedDict()
+        # chat_id -> heap com as mensagens seguintes, enquanto o chat tem uma na fila principal
+        self._pendentes = {}
+        self._fila = None
+        self._tarefas = []
+        self._sequencia = itertools.count()
+        self._enviadas = metricas.contador('envio_mensagens_total', 'Mensagens enviadas pela fila')
+        self._espera = metricas.histograma('envio_espera_segundos', 'Tempo entre enfileirar e enviar')
+
+    def _iniciar(self):
+        self._fila = asyncio.PriorityQueue()
+        self._tarefas = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def parar(self):
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
+
+    def _bucket_chat(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.taxa_chat, self.rajada_chat)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def enviar(self, chat_id, funcao, /, *args, prioridade=PRIORIDADE_NORMAL, **kwargs):
+        """Enfileira funcao(*args, **kwargs) e aguarda o resultado da chamada à API."""
+        if not self._tarefas:
+            self._iniciar()
+        futuro = asyncio.get_running_loop().create_future()
+        item = (prioridade, next(self._sequencia), asyncio.get_running_loop().time(), chat_id, funcao, args, kwargs, futuro)
+        pendentes = self._pendentes.get(chat_id)
+        if pendentes is None:
+            self._pendentes[chat_id] = []
+            self._fila.put_nowait(item)
+        else:
+            heapq.heappush(pendentes, item)
+        return await futuro
+
+    def _proximo(self, chat_id):
+        # Passa a próxima mensagem do chat para a fila principal
+        pendentes = self._pendentes.get(chat_id)
+        if pendentes:
+            self._fila.put_nowait(heapq.heappop(pendentes))
+        else:
+            self._pendentes.pop(chat_id, None)
+
+    async def _worker(self):
+        while True:
+            item = await self._fila.get()
+            _, _, enfileirado_em, chat_id, funcao, args, kwargs, futuro = item
+            if futuro.cancelled():
+                self._proximo(chat_id)
+                continue
+            bucket = self._bucket_chat(chat_id)
+            if not bucket.disponivel():
+                asyncio.get_running_loop().call_later(bucket.espera(), self._fila.put_nowait, item)
+                continue
+            try:
+                await self.global_.adquirir()
+                self._espera.observar(asyncio.get_running_loop().time() - enfileirado_em)
+                while True:
+                    try:
+                        resultado = await funcao(*args, **kwargs)
+                        break
+                    except RetryAfter as e:
+                        espera = segundos_retry_after(e)
+                        logger.warning("Telegram pediu para aguardar %.0fs antes de enviar mais mensagens", espera)
+                        self.global_.pausar(espera)
+                        await self.global_.adquirir()
+                self._enviadas.inc()
+                if not futuro.done():
+                    futuro.set_result(resultado)
+            except Exception as e:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            finally:
+                self._proximo(chat_id)
+
+
+class RequisicaoContada(HTTPXRequest):
+    """HTTPXRequest que conta as chamadas à Bot API por método (exceto getUpdates)."""
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        metodo = url.rsplit('/', 1)[-1]
+        if metodo != 'getUpdates':
+            metricas.contador('telegram_chamadas_total', 'Chamadas à Bot API').inc()
+            metricas.contador(f'telegram_chamadas_{metodo}_total', f'Chamadas a {metodo}').inc()
+        return await super().do_request(
+            url, method, request_data, read_timeout, write_timeout, connect_timeout, pool_timeout
+        )
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+from metricas import registro as metricas
+
+logger = logging.getLogger(__name__)
+
+MERCADO_PAGO_API = 'https://api.mercadopago.com'
+
+# Respostas que valem nova tentativa: limite de requisições e falhas do servidor
+STATUS_RETENTAVEIS = {429, 500, 502, 503, 504}
+
+
+class CircuitoAberto(Exception):
+    """O Mercado Pago falhou seguidamente e as chamadas estão suspensas temporariamente."""
+
+
+class Disjuntor:
+    """Circuit breaker: abre após `limite_falhas` falhas seguidas e libera uma chamada de teste após `tempo_reset`."""
+
+    FECHADO, ABERTO, MEIO_ABERTO = 'fechado', 'aberto', 'meio_aberto'
+
+    def __init__(self, limite_falhas=5, tempo_reset=30.0):
+        self.limite_falhas = limite_falhas
+        self.tempo_reset = tempo_reset
+        self.estado = self.FECHADO
+        self.falhas = 0
+        self.aberto_em = 0.0
+
+    def permitir(self):
+        if self.estado == self.FECHADO:
+            return True
+        # Aberto (ou teste anterior sem resposta): após o tempo de reset, deixa passar
+        # uma chamada para verificar se o serviço voltou
+        if time.monotonic() - self.aberto_em < self.tempo_reset:
+            return False
+        self.estado = self.MEIO_ABERTO
+        self.aberto_em = time.monotonic()
+        return True
+
+    def sucesso(self):
+        self.estado = self.FECHADO
+        self.falhas = 0
+
+    def falha(self):
+        self.falhas += 1
+        if self.estado == self.MEIO_ABERTO or self.falhas >= self.limite_falhas:
+            if self.estado != self.ABERTO:
+                logger.warning("Circuito do Mercado Pago aberto após %s falhas", self.falhas)
+            self.estado = self.ABERTO
+            self.aberto_em = time.monotonic()
+
+
+class GatewayMercadoPago:
+    """Cliente HTTP do Mercado Pago com pool de conexões, prazos, novas tentativas e circuit breaker."""
+
+    def __init__(self, access_token, base_url=MERCADO_PAGO_API, max_conexoes=20, timeout=10.0,
+                 prazo=20.0, tentativas=3, backoff_base=0.2, backoff_max=2.0,
+                 limite_falhas=5, tempo_reset=30.0):
+        self.prazo = prazo
+        self.tentativas = tentativas
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.disjuntor = Disjuntor(limite_falhas, tempo_reset)
+        # Conexões keep-alive reaproveitadas entre chamadas; o timeout vale para cada tentativa
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={'Authorization': f'Bearer {access_token}'},
+            limits=httpx.Limits(
+                max_connections=max_conexoes,
+                max_keepalive_connections=max_conexoes,
+                keepalive_expiry=60.0
+            ),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0))
+        )
+
+    async def fechar(self):
+        await self.client.aclose()
+
+    def _espera(self, tentativa):
+        # Backoff exponencial com jitter completo
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** tentativa))
+
+    async def requisitar(self, metodo, caminho, operacao, chave_idempotencia=None, **kwargs):
+        """Executa a chamada respeitando o prazo total; levanta CircuitoAberto ou a última falha.
+
+        POST só é repetido quando há chave de idempotência: o Mercado Pago devolve o mesmo
+        pagamento para a mesma chave, então repetir a criação não gera cobrança duplicada.
+        """
+        if not self.disjuntor.permitir():
+            metricas.contador('mercadopago_circuito_rejeitadas_total', 'Chamadas recusadas com o circuito aberto').inc()
+            raise CircuitoAberto("Mercado Pago temporariamente indisponível")
+
+        headers = kwargs.pop('headers', {})
+        if chave_idempotencia:
+            headers['X-Idempotency-Key'] = chave_idempotencia
+        retentavel = metodo == 'GET' or chave_idempotencia is not None
+        histograma = metricas.histograma(f'mercadopago_{operacao}_segundos', f'Latência de {operacao} no Mercado Pago')
+
+        inicio = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.prazo):
+                tentativa = 0
+                while True:
+                    try:
+                        response = await self.client.request(metodo, caminho, headers=headers, **kwargs)
+                        if response.status_code not in STATUS_RETENTAVEIS:
+                            self.disjuntor.sucesso()
+                            return response
+                        erro = None
+                    except httpx.TransportError as e:
+                        response, erro = None, e
+
+                    tentativa += 1
+                    if not retentavel or tentativa >= self.tentativas:
+                        self.disjuntor.falha()
+                        if erro:
+                            raise erro
+                        return response
+                    metricas.contador('mercadopago_retentativas_total', 'Novas tentativas de chamadas ao Mercado Pago').inc()
+                    motivo = response.status_code if response is not None else type(erro).__name__
+                    logger.warning("%s falhou (%s), tentativa %s de %s", operacao, motivo, tentativa + 1, self.tentativas)
+                    await asyncio.sleep(self._espera(tentativa))
+        except TimeoutError:
+            self.disjuntor.falha()
+            metricas.contador('mercadopago_prazo_esgotado_total', 'Chamadas que estouraram o prazo total').inc()
+            raise
+        finally:
+            histograma.observar(time.perf_counter() - inicio)
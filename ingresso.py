@@ -0,0 +1,184 @@
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+import queue
+import secrets
+import signal
+
+from aiohttp import web
+from telegram import Update
+
+from logs import encaminhar_logs, receber_logs, parar_logs
+from metricas import registro as metricas
+
+logger = logging.getLogger(__name__)
+
+_PARAR = None
+
+
+def user_id_do_update(dados):
+    """Extrai o id do usuário de um update em JSON sem montar o objeto Update."""
+    for valor in dados.values():
+        if isinstance(valor, dict):
+            remetente = valor.get('from') or valor.get('user') or valor.get('chat')
+            if isinstance(remetente, dict) and 'id' in remetente:
+                return remetente['id']
+    return 0
+
+
+def particao(user_id, total):
+    return hash(user_id) % total
+
+
+class IngressoWebhook:
+    """Recebe os updates do Telegram por HTTP e os distribui entre os processos trabalhadores.
+
+    Cada trabalhador tem sua própria fila e o update vai para a fila de índice
+    hash(user_id) % N, então os updates de um mesmo usuário são tratados em ordem pelo
+    mesmo processo. Com a fila cheia a resposta é 503 e o Telegram reenvia depois.
+    Só aceita requisições com o token secreto `segredo` registrado no set_webhook.
+    """
+
+    def __init__(self, filas, porta, caminho, segredo):
+        if not segredo:
+            raise ValueError("O ingresso do webhook exige um token secreto")
+        self.filas = filas
+        self.porta = porta
+        self.caminho = caminho
+        self.segredo = segredo
+        self._runner = None
+        self._recebidos = metricas.contador('ingresso_updates_total', 'Updates recebidos pelo webhook do Telegram')
+        self._rejeitados = metricas.contador('ingresso_rejeitados_total', 'Updates recusados com a fila cheia')
+
+    @property
+    def porta_real(self):
+        return self._runner.addresses[0][1]
+
+    async def iniciar(self):
+        app = web.Application()
+        app.router.add_post(self.caminho, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '0.0.0.0', self.porta).start()
+        logger.info("Ingresso de updates ouvindo na porta %s em %s", self.porta_real, self.caminho)
+
+    async def parar(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, request):
+        if not hmac.compare_digest(
+            request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), self.segredo
+        ):
+            logger.warning("Update do Telegram com token secreto inválido recusado")
+            return web.Response(status=403)
+        corpo = await request.read()
+        try:
+            dados = json.loads(corpo)
+        except ValueError:
+            return web.Response(status=400)
+        try:
+            self.filas[particao(user_id_do_update(dados), len(self.filas))].put_nowait(corpo)
+        except queue.Full:
+            self._rejeitados.inc()
+            return web.Response(status=503)
+        self._recebidos.inc()
+        return web.Response()
+
+
+def _obter_lote(fila, maximo=100):
+    # Bloqueia até o primeiro item e leva junto o que já estiver na fila
+    lote = [fila.get()]
+    while len(lote) < maximo and lote[-1] is not _PARAR:
+        try:
+            lote.append(fila.get_nowait())
+        except queue.Empty:
+            break
+    return lote
+
+
+async def _consumir(construir, indice, total, fila):
+    application = construir(indice, total)
+    loop = asyncio.get_running_loop()
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        logger.info("Trabalhador %s/%s pronto", indice + 1, total)
+        parar = False
+        while not parar:
+            for corpo in await loop.run_in_executor(None, _obter_lote, fila):
+                if corpo is _PARAR:
+                    parar = True
+                    break
+                await application.update_queue.put(Update.de_json(json.loads(corpo), application.bot))
+        await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+def trabalhador(construir, indice, total, fila, fila_logs):
+    # O processo principal coordena o encerramento enviando _PARAR pela fila
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # Um único processo escreve no arquivo de log (e faz a rotação)
+    encaminhar_logs(fila_logs)
+    asyncio.run(_consumir(construir, indice, total, fila))
+
+
+async def _servir(application, filas, porta, caminho, url, segredo):
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sinal, parar.set)
+
+    ingresso = IngressoWebhook(filas, porta, caminho, segredo)
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await ingresso.iniciar()
+        await application.bot.set_webhook(url, secret_token=segredo, allowed_updates=Update.ALL_TYPES)
+        logger.info("Webhook do Telegram registrado em %s com %s trabalhadores", url, len(filas))
+        await parar.wait()
+        await ingresso.parar()
+        await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+def executar_ingresso(application, construir, workers, porta, caminho, url, segredo=None, tamanho_fila=10000):
+    """Sobe o ingresso HTTP e `workers` processos trabalhadores.
+
+    `application` roda no processo principal (tarefas agendadas, webhook do Mercado Pago);
+    `construir(indice, total)` monta a Application de cada trabalhador e precisa ser
+    importável pelo processo filho, que é iniciado com spawn. Sem `segredo`, um token
+    aleatório é gerado e registrado no set_webhook.
+    """
+    if not segredo:
+        # Sem token secreto qualquer um poderia forjar updates na porta pública
+        segredo = secrets.token_urlsafe(32)
+        logger.info("TELEGRAM_WEBHOOK_SECRET não definido: usando um token secreto aleatório")
+    contexto = multiprocessing.get_context('spawn')
+    filas = [contexto.Queue(tamanho_fila) for _ in range(workers)]
+    fila_logs = contexto.Queue()
+    logs = receber_logs(fila_logs)
+    processos = [
+        contexto.Process(target=trabalhador, args=(construir, indice, workers, fila, fila_logs), name=f'trabalhador-{indice}')
+        for indice, fila in enumerate(filas)
+    ]
+    for processo in processos:
+        processo.start()
+    try:
+        asyncio.run(_servir(application, filas, porta, caminho, url, segredo))
+    finally:
+        for fila in filas:
+            fila.put(_PARAR)
+        for processo in processos:
+            processo.join(timeout=30)
+            if processo.is_alive():
+                logger.warning("%s não terminou a tempo, encerrando", processo.name)
+                processo.terminate()
+        parar_logs(logs)
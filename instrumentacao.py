@@ -0,0 +1,132 @@
+import functools
+import inspect
+import logging
+import time
+from contextvars import ContextVar
+
+from metricas import registro as metricas
+
+logger = logging.getLogger(__name__)
+
+# Trilha do update em processamento: lista de (nome, início, duração) ou None
+_trilha = ContextVar('trilha', default=None)
+
+
+def _falhou(resultado):
+    # Pagamentos sinaliza falhas com {'error': ...} em vez de exceções
+    return isinstance(resultado, dict) and 'error' in resultado
+
+
+class Instrumentacao:
+    """Cronômetros e contadores em volta de handlers e de métodos de serviços.
+
+    Desativada, não envolve nada: as funções originais são devolvidas sem custo algum
+    por chamada. Com `rastrear`, cada update gera uma linha de log com o tempo de cada
+    chamada instrumentada feita durante o seu processamento.
+    """
+
+    def __init__(self, ativa=False, rastrear=False):
+        self.ativa = ativa or rastrear
+        self.rastrear = rastrear
+
+    def handler(self, nome, funcao):
+        """Envolve um callback do PTB, registrando handler_{nome}_segundos e _erros_total."""
+        if not self.ativa:
+            return funcao
+        duracao = metricas.histograma(f'handler_{nome}_segundos', f'Duração do handler {nome}')
+        erros = metricas.contador(f'handler_{nome}_erros_total', f'Exceções no handler {nome}')
+        rastrear = self.rastrear
+
+        @functools.wraps(funcao)
+        async def medido(update, context):
+            trilha = [] if rastrear else None
+            token = _trilha.set(trilha) if rastrear else None
+            inicio = time.perf_counter()
+            try:
+                return await funcao(update, context)
+            except Exception:
+                erros.inc()
+                raise
+            finally:
+                total = time.perf_counter() - inicio
+                duracao.observar(total)
+                if rastrear:
+                    _trilha.reset(token)
+                    _registrar_trilha(nome, update, inicio, total, trilha)
+
+        return medido
+
+    def metodo(self, prefixo, nome, funcao):
+        """Envolve uma corrotina, registrando {prefixo}_{nome}_segundos e _erros_total."""
+        if not self.ativa:
+            return funcao
+        duracao = metricas.histograma(f'{prefixo}_{nome}_segundos', f'Duração de {prefixo}.{nome}')
+        erros = metricas.contador(f'{prefixo}_{nome}_erros_total', f'Falhas em {prefixo}.{nome}')
+        rotulo = f'{prefixo}.{nome}'
+
+        @functools.wraps(funcao)
+        async def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                resultado = await funcao(*args, **kwargs)
+            except Exception:
+                erros.inc()
+                raise
+            finally:
+                tempo = time.perf_counter() - inicio
+                duracao.observar(tempo)
+                trilha = _trilha.get()
+                if trilha is not None:
+                    trilha.append((rotulo, inicio, tempo))
+            if _falhou(resultado):
+                erros.inc()
+            return resultado
+
+        return medido
+
+    def objeto(self, prefixo, objeto):
+        """Instrumenta no lugar todos os métodos assíncronos públicos de `objeto`."""
+        if not self.ativa:
+            return objeto
+        for nome, funcao in inspect.getmembers(objeto, inspect.iscoroutinefunction):
+            if not nome.startswith('_'):
+                setattr(objeto, nome, self.metodo(prefixo, nome, funcao))
+        return objeto
+
+
+def _registrar_trilha(nome, update, inicio, total, trilha):
+    trechos = ' '.join(f'{rotulo}=+{(comeco - inicio) * 1000:.1f}/{tempo * 1000:.1f}ms' for rotulo, comeco, tempo in trilha)
+    update_id = getattr(update, 'update_id', None)
+    logger.info("Trilha do update %s (%s): %.1fms %s", update_id, nome, total * 1000, trechos)
+
+
+class ServidorMetricas:
+    """Expõe o registro de métricas em /metrics para o Prometheus."""
+
+    def __init__(self, porta, caminho='/metrics'):
+        self.porta = porta
+        self.caminho = caminho
+        self._runner = None
+
+    async def iniciar(self):
+        # aiohttp só é carregado quando as métricas estão ligadas
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get(self.caminho, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '0.0.0.0', self.porta).start()
+        logger.info("Métricas disponíveis na porta %s%s", self.porta, self.caminho)
+
+    async def parar(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        return web.Response(
+            body=metricas.prometheus().encode(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
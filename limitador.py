@@ -0,0 +1,122 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from metricas import registro as metricas
+
+
+class TokenBucket:
+    """Limitador token bucket para o event loop.
+
+    `taxa` tokens por segundo, acumulando até `capacidade`. `pausar` suspende todas as
+    aquisições, usado quando o Telegram responde com RetryAfter.
+    """
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = taxa
+        self.capacidade = capacidade or max(1.0, taxa)
+        self.tokens = self.capacidade
+        self.atualizado_em = time.monotonic()
+        self.pausado_ate = 0.0
+        self._lock = asyncio.Lock()
+
+    def _repor(self, agora):
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado_em) * self.taxa)
+        self.atualizado_em = agora
+
+    def disponivel(self, quantidade=1):
+        """Consome os tokens se houver sem esperar; retorna False caso contrário."""
+        agora = time.monotonic()
+        if agora < self.pausado_ate:
+            return False
+        self._repor(agora)
+        if self.tokens >= quantidade:
+            self.tokens -= quantidade
+            return True
+        return False
+
+    def espera(self, quantidade=1):
+        """Segundos até haver `quantidade` tokens (0.0 se já há), sem consumir nada."""
+        agora = time.monotonic()
+        if agora < self.pausado_ate:
+            return self.pausado_ate - agora + quantidade / self.taxa
+        self._repor(agora)
+        return max(0.0, (quantidade - self.tokens) / self.taxa)
+
+    async def adquirir(self, quantidade=1):
+        # O lock garante ordem de chegada entre as tarefas que esperam
+        async with self._lock:
+            while True:
+                agora = time.monotonic()
+                if agora < self.pausado_ate:
+                    await asyncio.sleep(self.pausado_ate - agora)
+                    continue
+                self._repor(agora)
+                if self.tokens >= quantidade:
+                    self.tokens -= quantidade
+                    return
+                await asyncio.sleep((quantidade - self.tokens) / self.taxa)
+
+    def pausar(self, segundos):
+        self.pausado_ate = max(self.pausado_ate, time.monotonic() + segundos)
+        self.tokens = 0.0
+
+
+class JanelaDeslizante:
+    """Permite até `limite` eventos por chave a cada `janela` segundos (janela deslizante).
+
+    Cada chave guarda só os instantes dos seus `limite` eventos mais recentes, então a
+    verificação custa O(1). Além de `max_chaves`, as chaves usadas há mais tempo são
+    descartadas. Com `limite` 0 não limita nada. Não é thread-safe: deve ser usado apenas a partir do event loop.
+    """
+
+    def __init__(self, nome, limite, janela, max_chaves=100000):
+        self.limite = limite
+        self.janela = janela
+        self.max_chaves = max_chaves
+        self._chaves = OrderedDict()
+        self._bloqueios = metricas.contador(f'{nome}_bloqueados_total', f'Eventos recusados pelo limite {nome}')
+        self._remocoes = metricas.contador(f'{nome}_remocoes_total', f'Chaves descartadas do limite {nome} por tamanho')
+
+    def espera(self, chave):
+        """Segundos até `chave` poder ter outro evento (0.0 se já pode), sem registrar nada.
+
+        Para quem só registra o evento depois de saber se ele aconteceu (registrar).
+        """
+        if self.limite <= 0:
+            return 0.0
+        instantes = self._chaves.get(chave)
+        if instantes is None or len(instantes) < self.limite:
+            return 0.0
+        espera = instantes[0] + self.janela - time.monotonic()
+        if espera > 0:
+            self._bloqueios.inc()
+            return espera
+        return 0.0
+
+    def registrar(self, chave):
+        """Conta um evento de `chave` na janela."""
+        if self.limite <= 0:
+            return
+        instantes = self._chaves.get(chave)
+        if instantes is None:
+            instantes = self._chaves[chave] = deque(maxlen=self.limite)
+            if len(self._chaves) > self.max_chaves:
+                self._chaves.popitem(last=False)
+                self._remocoes.inc()
+        else:
+            self._chaves.move_to_end(chave)
+        instantes.append(time.monotonic())
+
+    def tentar(self, chave):
+        """Registra o evento e retorna 0.0; no limite, retorna os segundos até liberar."""
+        espera = self.espera(chave)
+        if not espera:
+            self.registrar(chave)
+        return espera
+
+
+def segundos_retry_after(erro):
+    # RetryAfter.retry_after é int no PTB 21 e timedelta nas versões seguintes
+    espera = erro.retry_after
+    return espera.total_seconds() if hasattr(espera, 'total_seconds') else float(espera)
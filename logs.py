@@ -0,0 +1,186 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime
+
+from metricas import registro as metricas
+
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Atributos de todo LogRecord; o que sobrar veio de extra= e vai para o JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listeners = []
+_saidas = []
+
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por linha, com os campos passados em extra= no próprio objeto."""
+
+    def format(self, record):
+        dados = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'modulo': record.name,
+            'mensagem': record.getMessage(),
+            'processo': record.processName,
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                dados[chave] = valor
+        if record.exc_info:
+            dados['excecao'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            dados['excecao'] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Mantém só uma fração dos registros DEBUG/INFO dos módulos configurados.
+
+    `fracoes` mapeia o nome do logger (ou um prefixo, como 'telegram') para a fração
+    mantida. WARNING e acima passam sempre. A amostragem é determinística: com 0.1 passa
+    exatamente um registro a cada dez.
+    """
+
+    def __init__(self, fracoes):
+        super().__init__()
+        self.fracoes = fracoes
+        self._por_logger = {}
+        self._descartados = metricas.contador('logs_amostragem_descartados_total', 'Registros de log descartados pela amostragem')
+
+    def _regra(self, nome):
+        regra = self._por_logger.get(nome)
+        if regra is None:
+            fracao = None
+            partes = nome.split('.')
+            for i in range(len(partes), 0, -1):
+                fracao = self.fracoes.get('.'.join(partes[:i]))
+                if fracao is not None:
+                    break
+            regra = self._por_logger[nome] = (fracao, itertools.count())
+        return regra
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        fracao, contador = self._regra(record.name)
+        if fracao is None:
+            return True
+        n = next(contador)
+        if int((n + 1) * fracao) != int(n * fracao):
+            return True
+        self._descartados.inc()
+        return False
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """QueueHandler que nunca bloqueia: com a fila cheia o registro é descartado e contado.
+
+    Com `local=True` (fila do próprio processo) o registro vai para a fila sem ser
+    formatado: a mensagem, o traceback e o JSON são montados na thread do listener.
+    """
+
+    def __init__(self, fila, local=False):
+        super().__init__(fila)
+        self.local = local
+        self._perdidos = metricas.contador('logs_fila_cheia_total', 'Registros de log descartados com a fila cheia')
+
+    def prepare(self, record):
+        if self.local:
+            return record
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._perdidos.inc()
+
+
+def _fracoes(texto):
+    # "telegram=0.01,envio=0.1" -> {'telegram': 0.01, 'envio': 0.1}
+    fracoes = {}
+    for item in filter(None, (parte.strip() for parte in texto.split(','))):
+        nome, _, fracao = item.partition('=')
+        fracoes[nome.strip()] = float(fracao)
+    return fracoes
+
+
+def _saida(arquivo, formato, max_bytes, backups, rotacao):
+    if rotacao:
+        saida = logging.handlers.TimedRotatingFileHandler(arquivo, when=rotacao, backupCount=backups, encoding='utf-8')
+    else:
+        saida = logging.handlers.RotatingFileHandler(arquivo, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    saida.setFormatter(FormatadorJSON() if formato == 'json' else logging.Formatter(FORMATO_TEXTO))
+    return saida
+
+
+def _instalar(handler, amostragem):
+    raiz = logging.getLogger()
+    for antigo in list(raiz.handlers):
+        raiz.removeHandler(antigo)
+        antigo.close()
+    if amostragem:
+        handler.addFilter(FiltroAmostragem(amostragem))
+    raiz.addHandler(handler)
+
+
+def configurar_logs():
+    """Envia os logs do processo para uma fila; uma thread grava no arquivo com rotação.
+
+    Quem loga só coloca o registro na fila. Configuração pelo ambiente:
+    LOG_ARQUIVO, LOG_NIVEL, LOG_FORMATO (json ou texto), LOG_MAX_BYTES, LOG_BACKUPS,
+    LOG_ROTACAO (when do TimedRotatingFileHandler, ex.: midnight; vazio roda por tamanho),
+    LOG_FILA e LOG_AMOSTRAGEM (ex.: telegram=0.01,envio=0.1).
+    """
+    _saidas[:] = [_saida(
+        os.getenv('LOG_ARQUIVO', 'bot.log'),
+        os.getenv('LOG_FORMATO', 'json'),
+        int(os.getenv('LOG_MAX_BYTES', str(50 * 1024 * 1024))),
+        int(os.getenv('LOG_BACKUPS', '5')),
+        os.getenv('LOG_ROTACAO')
+    )]
+    fila = queue.Queue(int(os.getenv('LOG_FILA', '10000')))
+    _instalar(HandlerFila(fila, local=True), _fracoes(os.getenv('LOG_AMOSTRAGEM', '')))
+    logging.getLogger().setLevel(os.getenv('LOG_NIVEL', 'INFO').upper())
+    receber_logs(fila)
+
+
+class _Reemissor(logging.Handler):
+    # Sem configurar_logs: os registros recebidos seguem a configuração de logging do processo
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+def receber_logs(fila):
+    """Grava no arquivo de log os registros que chegarem em `fila`, inclusive de outros processos."""
+    listener = logging.handlers.QueueListener(fila, *(_saidas or [_Reemissor()]), respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return listener
+
+
+def encaminhar_logs(fila):
+    """Em um processo filho: passa a enviar os logs para a `fila` do processo principal."""
+    parar_logs()
+    for saida in _saidas:
+        saida.close()
+    _saidas.clear()
+    _instalar(HandlerFila(fila), _fracoes(os.getenv('LOG_AMOSTRAGEM', '')))
+    # Processos iniciados com spawn começam no nível padrão (WARNING) e perderiam os INFO
+    logging.getLogger().setLevel(os.getenv('LOG_NIVEL', 'INFO').upper())
+
+
+def parar_logs(listener=None):
+    # Esvazia as filas antes de sair; sem isso os últimos registros se perdem
+    for atual in [listener] if listener else list(_listeners):
+        _listeners.remove(atual)
+        atual.stop()
+
+
+atexit.register(parar_logs)
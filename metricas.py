@@ -0,0 +1,137 @@
+import bisect
+import threading
+
+# Limites padrão (em segundos) dos histogramas de latência
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nome, descricao=''):
+        self.nome = nome
+        self.descricao = descricao
+        self.valor = 0
+        self._lock = threading.Lock()
+
+    def inc(self, quantidade=1):
+        with self._lock:
+            self.valor += quantidade
+
+    def amostras(self):
+        yield self.nome, self.valor
+
+    def resumo(self):
+        return self.valor
+
+
+class Gauge:
+    tipo = 'gauge'
+
+    def __init__(self, nome, descricao=''):
+        self.nome = nome
+        self.descricao = descricao
+        self.valor = 0
+
+    def set(self, valor):
+        self.valor = valor
+
+    def amostras(self):
+        yield self.nome, self.valor
+
+    def resumo(self):
+        return self.valor
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, nome, descricao='', buckets=BUCKETS_LATENCIA):
+        self.nome = nome
+        self.descricao = descricao
+        self.buckets = tuple(buckets)
+        self.contagens = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.soma = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            self.contagens[indice] += 1
+            self.total += 1
+            self.soma += valor
+
+    def percentil(self, p):
+        # Aproximação pelo limite superior do bucket que contém o percentil
+        with self._lock:
+            if not self.total:
+                return 0.0
+            alvo = p / 100 * self.total
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float('inf'),), self.contagens):
+                acumulado += contagem
+                if acumulado >= alvo:
+                    return limite
+        return float('inf')
+
+    def amostras(self):
+        with self._lock:
+            contagens, total, soma = list(self.contagens), self.total, self.soma
+        acumulado = 0
+        for limite, contagem in zip(self.buckets, contagens):
+            acumulado += contagem
+            yield f'{self.nome}_bucket{{le="{limite:g}"}}', acumulado
+        yield f'{self.nome}_bucket{{le="+Inf"}}', total
+        yield f'{self.nome}_sum', soma
+        yield f'{self.nome}_count', total
+
+    def resumo(self):
+        return {
+            'total': self.total,
+            'media': self.soma / self.total if self.total else 0.0,
+            'p50': self.percentil(50),
+            'p99': self.percentil(99),
+        }
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _obter(self, classe, nome, *args, **kwargs):
+        with self._lock:
+            if nome not in self._metricas:
+                self._metricas[nome] = classe(nome, *args, **kwargs)
+            return self._metricas[nome]
+
+    def contador(self, nome, descricao=''):
+        return self._obter(Contador, nome, descricao)
+
+    def gauge(self, nome, descricao=''):
+        return self._obter(Gauge, nome, descricao)
+
+    def histograma(self, nome, descricao='', buckets=BUCKETS_LATENCIA):
+        return self._obter(Histograma, nome, descricao, buckets)
+
+    def resumo(self):
+        with self._lock:
+            metricas = list(self._metricas.values())
+        return {m.nome: m.resumo() for m in metricas}
+
+    def prometheus(self):
+        """Todas as métricas no formato de texto do Prometheus."""
+        with self._lock:
+            metricas = sorted(self._metricas.values(), key=lambda m: m.nome)
+        linhas = []
+        for m in metricas:
+            if m.descricao:
+                descricao = m.descricao.replace('\\', '\\\\').replace('\n', '\\n')
+                linhas.append(f'# HELP {m.nome} {descricao}')
+            linhas.append(f'# TYPE {m.nome} {m.tipo}')
+            linhas.extend(f'{nome} {valor}' for nome, valor in m.amostras())
+        return '\n'.join(linhas) + '\n'
+
+
+registro = Registro()
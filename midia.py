@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+
+from metricas import registro as metricas
+
+logger = logging.getLogger(__name__)
+
+# Assinaturas no início do arquivo, agrupadas pelo primeiro byte: um único acesso ao
+# dicionário escolhe as poucas candidatas, em vez de testar todos os formatos em sequência
+ASSINATURAS = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'RIFF', 'webp'),
+    (b'BM', 'bmp'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+    (b'%PDF-', 'pdf'),
+)
+_POR_PRIMEIRO_BYTE = {}
+for _assinatura, _tipo in ASSINATURAS:
+    _POR_PRIMEIRO_BYTE.setdefault(_assinatura[0], []).append((_assinatura, _tipo))
+
+# Contêineres ISO (HEIC do iPhone, AVIF, MP4): "ftyp" no byte 4 e a marca logo depois
+MARCAS_FTYP = {
+    b'heic': 'heic', b'heix': 'heic', b'mif1': 'heic', b'msf1': 'heic',
+    b'avif': 'avif',
+    b'isom': 'mp4', b'iso2': 'mp4', b'mp41': 'mp4', b'mp42': 'mp4', b'avc1': 'mp4',
+}
+
+# Comprovantes de pagamento: capturas de tela, fotos e PDFs dos bancos
+TIPOS_COMPROVANTE = frozenset({'jpeg', 'png', 'webp', 'heic', 'pdf'})
+
+
+def identificar(dados):
+    """Tipo do arquivo pelos primeiros bytes de `dados` (bytes, bytearray ou memoryview), ou None.
+
+    Copia só os 16 bytes do cabeçalho, nunca o buffer inteiro.
+    """
+    cabecalho = bytes(dados[:16])
+    if len(cabecalho) < 4:
+        return None
+    for assinatura, tipo in _POR_PRIMEIRO_BYTE.get(cabecalho[0], ()):
+        if cabecalho.startswith(assinatura):
+            if tipo == 'webp' and cabecalho[8:12] != b'WEBP':
+                return None
+            return tipo
+    if cabecalho[4:8] == b'ftyp':
+        return MARCAS_FTYP.get(cabecalho[8:12])
+    return None
+
+
+class RecepcaoMidia:
+    """Baixa e valida as mídias enviadas ao bot, inteiramente em memória.
+
+    No máximo `downloads` arquivos são baixados ao mesmo tempo e nenhum passa de
+    `tamanho_maximo` bytes, o que limita a memória dos downloads em andamento.
+    O tamanho informado pelo Telegram é conferido antes de baixar e o tipo pelos bytes
+    recebidos, não pelo nome ou mime_type declarados.
+    """
+
+    def __init__(self, tamanho_maximo=10 * 1024 * 1024, downloads=4):
+        self.tamanho_maximo = tamanho_maximo
+        self._semaforo = asyncio.Semaphore(downloads)
+        self._aceitas = metricas.contador('midia_aceitas_total', 'Mídias recebidas e validadas')
+        self._recusadas = metricas.contador('midia_recusadas_total', 'Mídias recusadas por tamanho ou tipo')
+        self._bytes = metricas.contador('midia_bytes_total', 'Bytes de mídia baixados')
+        self._download = metricas.histograma('midia_download_segundos', 'Duração de cada download de mídia')
+
+    def _recusar(self, motivo, *args):
+        self._recusadas.inc()
+        logger.info(motivo, *args)
+        return {'error': motivo % args}
+
+    async def receber(self, bot, file_id, tamanho=None, tipos=TIPOS_COMPROVANTE):
+        """Baixa o arquivo e retorna {'tipo', 'dados', 'tamanho'} ou {'error': motivo}."""
+        if tamanho is not None and tamanho > self.tamanho_maximo:
+            return self._recusar("Arquivo %s com %s bytes acima do limite", file_id, tamanho)
+        async with self._semaforo:
+            arquivo = await bot.get_file(file_id)
+            if arquivo.file_size is not None and arquivo.file_size > self.tamanho_maximo:
+                return self._recusar("Arquivo %s com %s bytes acima do limite", file_id, arquivo.file_size)
+            inicio = time.perf_counter()
+            dados = await arquivo.download_as_bytearray()
+            self._download.observar(time.perf_counter() - inicio)
+        self._bytes.inc(len(dados))
+        if len(dados) > self.tamanho_maximo:
+            return self._recusar("Arquivo %s com %s bytes acima do limite", file_id, len(dados))
+        tipo = identificar(dados)
+        if tipo not in tipos:
+            return self._recusar("Arquivo %s de tipo não aceito: %s", file_id, tipo)
+        self._aceitas.inc()
+        return {'tipo': tipo, 'dados': memoryview(dados), 'tamanho': len(dados)}
@@ -0,0 +1,110 @@
+"""Notificador local que imita o Mercado Pago para testar o webhook sem internet.
+
+Exemplos:
+    python notificador_local.py --offline --pagamentos 2000 --repeticoes 3
+    python notificador_local.py --url http://localhost:8080/webhook/mercadopago --pagamentos 50
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import time
+import uuid
+
+import httpx
+
+from webhook import ReceptorWebhook
+
+
+class PagamentosFalsos:
+    """Substitui Pagamentos: todo pagamento consultado está aprovado após um atraso fixo."""
+
+    def __init__(self, atraso=0.0):
+        self.atraso = atraso
+        self.consultas = 0
+
+    async def verificar_pagamento(self, payment_id):
+        self.consultas += 1
+        await asyncio.sleep(self.atraso)
+        return {'status': 'approved', 'amount': 10.0, 'currency': 'BRL'}
+
+    def invalidar_status(self, payment_id):
+        pass
+
+
+def assinar(segredo, payment_id, request_id):
+    ts = str(int(time.time() * 1000))
+    manifesto = f"id:{str(payment_id).lower()};request-id:{request_id};ts:{ts};"
+    v1 = hmac.new(segredo.encode(), manifesto.encode(), hashlib.sha256).hexdigest()
+    return f"ts={ts},v1={v1}"
+
+
+async def notificar(client, url, payment_id, segredo=None):
+    corpo = {
+        'action': 'payment.updated',
+        'type': 'payment',
+        'data': {'id': str(payment_id)},
+    }
+    request_id = str(uuid.uuid4())
+    headers = {'x-request-id': request_id}
+    if segredo:
+        headers['x-signature'] = assinar(segredo, payment_id, request_id)
+    resposta = await client.post(url, json=corpo, headers=headers)
+    return resposta.status_code
+
+
+async def executar(args):
+    receptor = None
+    ativados = []
+
+    async def ao_aprovar(payment_id):
+        ativados.append(payment_id)
+
+    if args.offline:
+        pagamentos = PagamentosFalsos(args.atraso)
+        receptor = ReceptorWebhook(pagamentos, ao_aprovar, porta=0, segredo=args.segredo)
+        await receptor.iniciar()
+        url = f"http://127.0.0.1:{receptor.porta_real}{receptor.caminho}"
+    else:
+        url = args.url
+
+    ids = [1000000 + i for i in range(args.pagamentos)] * args.repeticoes
+    semaforo = asyncio.Semaphore(args.concorrencia)
+    limites = httpx.Limits(max_connections=args.concorrencia)
+
+    async with httpx.AsyncClient(limits=limites, timeout=10) as client:
+        async def enviar(payment_id):
+            async with semaforo:
+                return await notificar(client, url, payment_id, args.segredo)
+
+        inicio = time.perf_counter()
+        codigos = await asyncio.gather(*(enviar(pid) for pid in ids))
+        duracao = time.perf_counter() - inicio
+
+    print(f"Notificações enviadas: {len(ids)} em {duracao:.2f}s ({len(ids) / duracao:.0f}/s)")
+    print(f"Respostas HTTP: { {c: codigos.count(c) for c in set(codigos)} }")
+
+    if receptor:
+        await receptor.parar()
+        print(f"Duplicadas descartadas: {receptor.duplicadas}")
+        print(f"Consultas ao Mercado Pago: {pagamentos.consultas}")
+        print(f"Assinaturas ativadas: {len(ativados)} (únicas: {len(set(ativados))})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='URL do webhook do bot')
+    parser.add_argument('--offline', action='store_true', help='sobe um receptor local com pagamentos falsos')
+    parser.add_argument('--pagamentos', type=int, default=1000, help='quantidade de pagamentos distintos')
+    parser.add_argument('--repeticoes', type=int, default=2, help='notificações por pagamento (o Mercado Pago reenvia)')
+    parser.add_argument('--concorrencia', type=int, default=16)
+    parser.add_argument('--atraso', type=float, default=0.05, help='latência simulada da API no modo offline (s)')
+    parser.add_argument('--segredo', help='segredo de assinatura (MERCADO_PAGO_WEBHOOK_SECRET)')
+    args = parser.parse_args()
+    if not args.offline and not args.url:
+        parser.error('informe --url ou --offline')
+    asyncio.run(executar(args))
+
+
+if __name__ == '__main__':
+    main()
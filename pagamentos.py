@@ -1,23 +1,46 @@
 import os
+import uuid
 import logging
-import mercadopago
-from dotenv import load_dotenv
+from gateway import GatewayMercadoPago, CircuitoAberto, MERCADO_PAGO_API
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Status que o Mercado Pago não muda mais
+STATUS_FINAIS = {'approved', 'rejected', 'cancelled', 'refunded', 'charged_back'}
+
 class Pagamentos:
-    def __init__(self):
+    def __init__(self, gateway=None):
         self.access_token = os.getenv('MERCADO_PAGO_ACCESS_TOKEN')
         if not self.access_token:
             logger.error("MERCADO_PAGO_ACCESS_TOKEN não encontrado nas variáveis de ambiente")
             raise ValueError("MERCADO_PAGO_ACCESS_TOKEN não configurado")
-        self.sdk = mercadopago.SDK(self.access_token)
+        self.gateway = gateway or GatewayMercadoPago(
+            self.access_token,
+            base_url=os.getenv('MERCADO_PAGO_BASE_URL', MERCADO_PAGO_API),
+            max_conexoes=int(os.getenv('MERCADO_PAGO_MAX_CONEXOES', '20')),
+            timeout=float(os.getenv('MERCADO_PAGO_TIMEOUT', '10')),
+            prazo=float(os.getenv('MERCADO_PAGO_PRAZO', '20')),
+            tentativas=int(os.getenv('MERCADO_PAGO_TENTATIVAS', '3')),
+            limite_falhas=int(os.getenv('MERCADO_PAGO_DISJUNTOR_FALHAS', '5')),
+            tempo_reset=float(os.getenv('MERCADO_PAGO_DISJUNTOR_RESET', '30'))
+        )
+        # URL pública do webhook (ex.: https://exemplo.com/webhook/mercadopago)
+        self.notification_url = os.getenv('MERCADO_PAGO_NOTIFICATION_URL')
         logger.info("Cliente Mercado Pago inicializado")
 
-    def criar_pagamento_pix(self, valor, descricao):
+    async def fechar(self):
+        await self.gateway.fechar()
+
+    @staticmethod
+    def _mensagem_erro(response):
+        try:
+            return response.json().get('message', 'Erro desconhecido')
+        except ValueError:
+            return 'Erro desconhecido'
+
+    async def criar_pagamento_pix(self, valor, descricao, expiracao=None):
         try:
-            logger.info(f"Criando pagamento PIX: valor={valor}, descrição={descricao}")
+            logger.info("Criando pagamento PIX: valor=%s, descrição=%s", valor, descricao)
             payment_data = {
                 "transaction_amount": float(valor),
                 "description": descricao,
@@ -28,55 +51,138 @@ class Pagamentos:
                     "last_name": "VIP"
                 }
             }
-            
-            logger.debug(f"Dados do pagamento: {payment_data}")
-            payment_response = self.sdk.payment().create(payment_data)
-            logger.debug(f"Resposta completa do Mercado Pago: {payment_response}")
-            
-            if payment_response["status"] != 201:
-                error_msg = f"Erro ao criar pagamento: {payment_response.get('response', {}).get('message', 'Erro desconhecido')}"
+            if self.notification_url:
+                payment_data["notification_url"] = self.notification_url
+            if expiracao:
+                payment_data["date_of_expiration"] = expiracao.astimezone().isoformat(timespec='milliseconds')
+
+            logger.debug("Dados do pagamento: %s", payment_data)
+            # A mesma chave é reenviada nas novas tentativas para não duplicar a cobrança
+            response = await self.gateway.requisitar(
+                'POST', '/v1/payments', 'criar_pagamento',
+                chave_idempotencia=str(uuid.uuid4()), json=payment_data
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Resposta completa do Mercado Pago: %s", response.text)
+
+            if response.status_code != 201:
+                error_msg = f"Erro ao criar pagamento: {self._mensagem_erro(response)}"
                 logger.error(error_msg)
                 return {'error': error_msg}
-                
-            payment = payment_response["response"]
+
+            payment = response.json()
             transaction_data = payment.get("point_of_interaction", {}).get("transaction_data", {})
             qr_code = transaction_data.get("qr_code")
-            
+
             if not qr_code:
                 error_msg = "Código PIX não encontrado na resposta do Mercado Pago"
-                logger.error(f"{error_msg}. Resposta: {payment}")
+                logger.error("%s. Resposta: %s", error_msg, payment)
                 return {'error': error_msg}
-                
-            logger.info(f"Pagamento PIX criado com sucesso: ID={payment['id']}")
+
+            logger.info("Pagamento PIX criado com sucesso: ID=%s", payment['id'])
             return {
                 'pix_code': qr_code,
                 'id': payment["id"],
                 'status': payment["status"]
             }
-            
+
+        except CircuitoAberto as e:
+            logger.warning("Pagamento PIX não criado: %s", e)
+            return {'error': str(e)}
         except Exception as e:
             error_msg = f"Erro ao processar pagamento PIX: {str(e)}"
             logger.error(error_msg, exc_info=True)
             return {'error': error_msg}
 
-    def verificar_pagamento(self, payment_id):
+    async def verificar_pagamento(self, payment_id):
+        """Consulta o status do pagamento no Mercado Pago, sem cache.
+
+        O bot consulta pelo VerificadorPagamentos, que guarda o status e junta as
+        consultas simultâneas ao mesmo pagamento.
+        """
         try:
-            logger.info(f"Verificando pagamento {payment_id}")
-            payment_response = self.sdk.payment().get(payment_id)
-            logger.debug(f"Resposta da verificação: {payment_response}")
-            
-            if payment_response["status"] != 200:
-                error_msg = f"Erro ao verificar pagamento: {payment_response.get('response', {}).get('message', 'Erro desconhecido')}"
+            logger.info("Verificando pagamento %s", payment_id)
+            response = await self.gateway.requisitar('GET', f'/v1/payments/{payment_id}', 'verificar_pagamento')
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Resposta da verificação: %s", response.text)
+
+            if response.status_code != 200:
+                error_msg = f"Erro ao verificar pagamento: {self._mensagem_erro(response)}"
                 logger.error(error_msg)
                 return {'error': error_msg}
-                
-            payment = payment_response["response"]
+
+            payment = response.json()
             return {
                 'status': payment["status"],
                 'amount': payment["transaction_amount"],
                 'currency': payment["currency_id"]
             }
+        except CircuitoAberto as e:
+            logger.warning("Pagamento %s não verificado: %s", payment_id, e)
+            return {'error': str(e)}
         except Exception as e:
             error_msg = f"Erro ao verificar pagamento: {str(e)}"
             logger.error(error_msg, exc_info=True)
-            return {'error': error_msg} 
\ No newline at end of file
+            return {'error': error_msg}
+
+    async def cancelar_pagamento(self, payment_id):
+        try:
+            logger.info("Cancelando pagamento %s", payment_id)
+            response = await self.gateway.requisitar(
+                'PUT', f'/v1/payments/{payment_id}', 'cancelar_pagamento',
+                chave_idempotencia=f'cancelar-{payment_id}', json={"status": "cancelled"}
+            )
+            if response.status_code != 200:
+                error_msg = f"Erro ao cancelar pagamento: {self._mensagem_erro(response)}"
+                logger.error(error_msg)
+                return {'error': error_msg}
+            return {'status': response.json()["status"]}
+        except CircuitoAberto as e:
+            logger.warning("Pagamento %s não cancelado: %s", payment_id, e)
+            return {'error': str(e)}
+        except Exception as e:
+            error_msg = f"Erro ao cancelar pagamento: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            return {'error': error_msg}
+
+    async def buscar_pagamentos_aprovados(self, desde, limite=100):
+        """Retorna os IDs (str) dos pagamentos aprovados criados a partir de `desde`.
+
+        Uma chamada de busca por página substitui uma chamada de verificação por pagamento.
+        """
+        try:
+            aprovados = set()
+            offset = 0
+            paginas = 0
+            while True:
+                filtros = {
+                    "status": "approved",
+                    "sort": "date_created",
+                    "criteria": "desc",
+                    "range": "date_created",
+                    "begin_date": desde.astimezone().isoformat(timespec='milliseconds'),
+                    "end_date": "NOW",
+                    "limit": limite,
+                    "offset": offset
+                }
+                response = await self.gateway.requisitar('GET', '/v1/payments/search', 'buscar_pagamentos', params=filtros)
+                paginas += 1
+                if response.status_code != 200:
+                    error_msg = f"Erro ao buscar pagamentos: {self._mensagem_erro(response)}"
+                    logger.error(error_msg)
+                    return {'error': error_msg}
+
+                resposta = response.json()
+                resultados = resposta.get("results", [])
+                aprovados.update(str(payment["id"]) for payment in resultados)
+                offset += len(resultados)
+                if not resultados or offset >= resposta.get("paging", {}).get("total", 0):
+                    break
+            return {'aprovados': aprovados, 'paginas': paginas}
+        except CircuitoAberto as e:
+            logger.warning("Busca de pagamentos não realizada: %s", e)
+            return {'error': str(e)}
+        except Exception as e:
+            error_msg = f"Erro ao buscar pagamentos: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            return {'error': error_msg}
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from metricas import registro as metricas
+
+logger = logging.getLogger(__name__)
+
+
+class PoolPix:
+    """Mantém cobranças PIX pré-criadas para entregar no /assinar sem esperar o Mercado Pago.
+
+    As cobranças têm o mesmo valor, descrição e pagador, então são intercambiáveis até
+    serem entregues. Cada uma é criada com validade `expiracao` no Mercado Pago e retirada
+    do pool após `ttl`, para que o usuário sempre receba um código com folga para pagar.
+    """
+
+    def __init__(self, pagamentos, tamanho, valor, descricao, ttl=timedelta(hours=1),
+                 expiracao=timedelta(hours=24), intervalo=30.0, concorrencia=4):
+        self.pagamentos = pagamentos
+        self.tamanho = tamanho
+        self.valor = valor
+        self.descricao = descricao
+        self.ttl = ttl.total_seconds()
+        self.expiracao = expiracao
+        self.intervalo = min(intervalo, self.ttl / 4)
+        self.concorrencia = concorrencia
+        self._fila = deque()
+        self._repor = asyncio.Event()
+        self._tarefa = None
+        self._cancelamentos = set()
+        self._acertos = metricas.contador('pix_pool_acertos_total', 'Cobranças entregues a partir do pool')
+        self._faltas = metricas.contador('pix_pool_faltas_total', 'Pedidos com o pool vazio')
+        self._descartes = metricas.contador('pix_pool_descartados_total', 'Cobranças vencidas retiradas do pool')
+        self._disponiveis = metricas.gauge('pix_pool_disponiveis', 'Cobranças prontas no pool')
+        self._reposicao = metricas.histograma('pix_pool_reposicao_segundos', 'Tempo de criação de cada cobrança do pool')
+
+    def __len__(self):
+        return len(self._fila)
+
+    async def iniciar(self):
+        self._tarefa = asyncio.create_task(self._loop())
+        logger.info("Pool de PIX iniciado com tamanho %s", self.tamanho)
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+        # Cancela as cobranças que não foram entregues para não ficarem abertas no Mercado Pago
+        restantes = [pagamento for _, pagamento in self._fila]
+        self._fila.clear()
+        await asyncio.gather(*(self.pagamentos.cancelar_pagamento(p['id']) for p in restantes))
+        logger.info("Pool de PIX finalizado, %s cobranças canceladas", len(restantes))
+
+    def obter(self):
+        """Entrega uma cobrança pronta em O(1) ou None se o pool estiver vazio."""
+        agora = time.monotonic()
+        while self._fila:
+            criado_em, pagamento = self._fila.popleft()
+            if agora - criado_em < self.ttl:
+                self._acertos.inc()
+                self._disponiveis.set(len(self._fila))
+                self._repor.set()
+                return pagamento
+            # Vencida: cancela em segundo plano e tenta a próxima
+            self._descartes.inc()
+            tarefa = asyncio.create_task(self.pagamentos.cancelar_pagamento(pagamento['id']))
+            self._cancelamentos.add(tarefa)
+            tarefa.add_done_callback(self._cancelamentos.discard)
+        self._faltas.inc()
+        self._disponiveis.set(0)
+        self._repor.set()
+        return None
+
+    def _descartar_vencidas(self):
+        # As mais antigas ficam no início da fila
+        agora = time.monotonic()
+        vencidas = []
+        while self._fila and agora - self._fila[0][0] >= self.ttl:
+            vencidas.append(self._fila.popleft()[1])
+        self._descartes.inc(len(vencidas))
+        return vencidas
+
+    async def _criar(self, semaforo):
+        async with semaforo:
+            inicio = time.perf_counter()
+            pagamento = await self.pagamentos.criar_pagamento_pix(
+                self.valor, self.descricao, expiracao=datetime.now() + self.expiracao
+            )
+            self._reposicao.observar(time.perf_counter() - inicio)
+            if 'error' not in pagamento:
+                self._fila.append((time.monotonic(), pagamento))
+            return pagamento
+
+    async def _loop(self):
+        semaforo = asyncio.Semaphore(self.concorrencia)
+        while True:
+            # Limpa antes de repor para não perder pedidos feitos durante a reposição
+            self._repor.clear()
+            try:
+                vencidas = self._descartar_vencidas()
+                if vencidas:
+                    await asyncio.gather(*(self.pagamentos.cancelar_pagamento(p['id']) for p in vencidas))
+
+                faltando = self.tamanho - len(self._fila)
+                if faltando > 0:
+                    resultados = await asyncio.gather(*(self._criar(semaforo) for _ in range(faltando)))
+                    erros = sum(1 for r in resultados if 'error' in r)
+                    if erros:
+                        logger.warning("Pool de PIX: %s de %s cobranças não foram criadas", erros, faltando)
+                self._disponiveis.set(len(self._fila))
+            except Exception as e:
+                logger.error("Erro ao repor o pool de PIX: %s", e, exc_info=True)
+
+            # Acorda quando uma cobrança é entregue ou periodicamente para descartar as vencidas
+            try:
+                await asyncio.wait_for(self._repor.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from metricas import registro as metricas
+
+
+class ProcessadorPorUsuario(BaseUpdateProcessor):
+    """Processa updates em paralelo, mas os de um mesmo usuário um de cada vez e na ordem de chegada.
+
+    O update espera a vez do usuário antes de ocupar uma das `max_concurrent_updates`
+    vagas, então os updates enfileirados de um usuário não tiram vagas dos outros.
+    """
+
+    def __init__(self, max_concurrent_updates, medir_espera=False):
+        super().__init__(max_concurrent_updates)
+        # user_id -> [lock, updates aguardando ou em andamento]
+        self._usuarios = {}
+        self._vagas = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._espera = metricas.histograma(
+            'updates_espera_segundos', 'Tempo de um update na fila até o handler começar'
+        ) if medir_espera else None
+
+    async def process_update(self, update, coroutine):
+        # Substitui o da BaseUpdateProcessor, que ocupa a vaga antes da vez do usuário.
+        # Conta a espera pelo limite de concorrência e pelos updates anteriores do usuário
+        if self._espera is not None:
+            coroutine = self._medir_espera(time.perf_counter(), coroutine)
+        usuario = update.effective_user if isinstance(update, Update) else None
+        if usuario is None:
+            async with self._vagas:
+                await self.do_process_update(update, coroutine)
+            return
+        entrada = self._usuarios.get(usuario.id)
+        if entrada is None:
+            entrada = self._usuarios[usuario.id] = [asyncio.Lock(), 0]
+        entrada[1] += 1
+        try:
+            async with entrada[0], self._vagas:
+                await self.do_process_update(update, coroutine)
+        finally:
+            entrada[1] -= 1
+            if not entrada[1]:
+                del self._usuarios[usuario.id]
+
+    async def _medir_espera(self, inicio, coroutine):
+        self._espera.observar(time.perf_counter() - inicio)
+        await coroutine
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
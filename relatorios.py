@@ -0,0 +1,91 @@
+"""Relatório e exportação das assinaturas para administradores.
+
+O relatório (assinaturas ativas, expirando nos próximos dias e receita por mês) sai de
+contagens feitas no próprio banco; a exportação percorre a tabela em lotes e grava uma
+linha por assinatura. Nenhum dos dois carrega a tabela inteira em memória.
+
+Exemplos:
+    python relatorios.py
+    python relatorios.py --exportar assinaturas.csv
+    python relatorios.py --exportar assinaturas.jsonl --formato jsonl
+"""
+import argparse
+import asyncio
+import csv
+import json
+
+from armazenamento import Assinatura
+
+FORMATOS = ('csv', 'jsonl')
+
+
+async def exportar(db, arquivo, formato='csv', lote=1000):
+    """Grava as assinaturas em `arquivo` (aberto em modo texto); retorna quantas foram gravadas."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+    total = 0
+    escritor = csv.writer(arquivo) if formato == 'csv' else None
+    if escritor:
+        escritor.writerow(Assinatura._fields)
+    async for registro in db.exportar_assinaturas(lote):
+        if escritor:
+            escritor.writerow(registro)
+        else:
+            arquivo.write(json.dumps(registro._asdict(), ensure_ascii=False, default=str) + '\n')
+        total += 1
+    return total
+
+
+async def gerar_relatorio(db, valor_assinatura, dias=7, agora=None):
+    # O valor de cada cobrança não é gravado: a receita é estimada pelo preço atual
+    ativas, expirando = await db.resumo_assinaturas(dias, agora)
+    meses = [(mes, quantidade, quantidade * valor_assinatura) for mes, quantidade in await db.pagamentos_por_mes()]
+    return {'ativas': ativas, 'expirando': expirando, 'dias': dias, 'meses': meses}
+
+
+def formatar_relatorio(relatorio):
+    linhas = [
+        f"👥 Assinaturas ativas: {relatorio['ativas']}",
+        f"⏳ Expirando nos próximos {relatorio['dias']} dias: {relatorio['expirando']}",
+        "",
+        "💰 Receita por mês:",
+    ]
+    linhas.extend(
+        f"{mes}: R$ {receita:.2f} ({quantidade} pagamentos)" for mes, quantidade, receita in relatorio['meses']
+    )
+    if not relatorio['meses']:
+        linhas.append("Nenhum pagamento registrado.")
+    return '\n'.join(linhas)
+
+
+async def executar(args):
+    from database import Database
+
+    db = Database(args.banco)
+    try:
+        if args.exportar:
+            with open(args.exportar, 'w', newline='', encoding='utf-8') as arquivo:
+                total = await exportar(db, arquivo, args.formato)
+            print(f"{total} assinaturas exportadas para {args.exportar}")
+        else:
+            print(formatar_relatorio(await gerar_relatorio(db, args.valor, args.dias)))
+    finally:
+        await db.fechar()
+
+
+def main():
+    # O bot.py carrega o .env e define o preço da assinatura
+    from bot import VALOR_ASSINATURA
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--banco', help='DATABASE_URL (padrão: a do .env)')
+    parser.add_argument('--exportar', metavar='ARQUIVO', help='exporta todas as assinaturas em vez do relatório')
+    parser.add_argument('--formato', choices=FORMATOS, default='csv')
+    parser.add_argument('--dias', type=int, default=7, help='janela de "expirando" do relatório')
+    parser.add_argument('--valor', type=float, default=VALOR_ASSINATURA, help='preço usado na receita estimada')
+    args = parser.parse_args()
+    asyncio.run(executar(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def banco_url(request, tmp_path):
+    """URL do banco de cada teste: um SQLite novo e, com DATABASE_URL postgresql://, o PostgreSQL.
+
+    No PostgreSQL as tabelas são compartilhadas; os testes usam ids aleatórios e só olham
+    para as próprias linhas.
+    """
+    if request.param == 'sqlite':
+        return str(tmp_path / 'assinaturas.db')
+    url = os.getenv('DATABASE_URL', '')
+    if not url.startswith(('postgres://', 'postgresql://')):
+        pytest.skip('DATABASE_URL não aponta para um PostgreSQL')
+    pytest.importorskip('asyncpg')
+    return url
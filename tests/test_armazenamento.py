@@ -0,0 +1,180 @@
+"""Reserva de ativação, máquina de estados dos pagamentos e fila de remoção, nos dois backends.
+
+    python -m pytest tests
+    DATABASE_URL=postgresql://postgres@localhost/postgres python -m pytest tests
+"""
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from database import Database
+
+
+def executar(banco_url, cenario):
+    async def principal():
+        db = Database(banco_url, cache_tamanho=0)
+        try:
+            await cenario(db)
+        finally:
+            await db.fechar()
+    asyncio.run(principal())
+
+
+def novo_usuario():
+    return random.randrange(10 ** 12)
+
+
+async def pagamento_aprovado(db, user_id):
+    payment_id = uuid.uuid4().hex
+    await db.registrar_pagamento(payment_id, user_id)
+    assert await db.atualizar_estado_pagamento(payment_id, 'pending', 'pending')
+    assert await db.atualizar_estado_pagamento(payment_id, 'approved', 'approved')
+    return payment_id
+
+
+def test_reserva_exclusiva_e_conclusao(banco_url):
+    async def cenario(db):
+        user_id = novo_usuario()
+        payment_id = await pagamento_aprovado(db, user_id)
+
+        token = await db.reservar_ativacao(payment_id)
+        assert token
+        # Reserva em vigor: ninguém mais ativa o mesmo pagamento
+        assert await db.reservar_ativacao(payment_id) is None
+
+        expiracao = datetime(2100, 1, 1)
+        await db.concluir_ativacao(token, user_id, payment_id, expiracao, 'https://t.me/+link')
+        assert (await db.get_pagamento(payment_id))['estado'] == 'activated'
+        assinatura = await db.get_assinatura(user_id)
+        assert (assinatura.payment_id, assinatura.data_expiracao, assinatura.link_invite) == \
+            (payment_id, expiracao, 'https://t.me/+link')
+        # Pagamento ativado não é reservado de novo
+        assert await db.reservar_ativacao(payment_id) is None
+    executar(banco_url, cenario)
+
+
+def test_liberar_permite_nova_reserva(banco_url):
+    async def cenario(db):
+        payment_id = await pagamento_aprovado(db, novo_usuario())
+        token = await db.reservar_ativacao(payment_id)
+        await db.liberar_ativacao(payment_id, 'outro-token')
+        assert await db.reservar_ativacao(payment_id) is None
+        await db.liberar_ativacao(payment_id, token)
+        assert await db.reservar_ativacao(payment_id)
+        assert (await db.get_pagamento(payment_id))['estado'] == 'approved'
+    executar(banco_url, cenario)
+
+
+def test_reserva_vencida(banco_url):
+    async def cenario(db):
+        user_id = novo_usuario()
+        payment_id = await pagamento_aprovado(db, user_id)
+        # Quem reservou caiu: a reserva vence e outro processo assume
+        antigo = await db.reservar_ativacao(payment_id, validade=timedelta(seconds=-1))
+        novo = await db.reservar_ativacao(payment_id)
+        assert antigo and novo and novo != antigo
+        # A conclusão com o token vencido não muda o pagamento nem grava a assinatura
+        assert not await db.concluir_ativacao(antigo, user_id, payment_id, datetime(2100, 1, 1), 'https://t.me/+antigo')
+        assert (await db.get_pagamento(payment_id))['estado'] == 'approved'
+        assert await db.get_assinatura(user_id) is None
+        assert await db.concluir_ativacao(novo, user_id, payment_id, datetime(2100, 1, 1), 'https://t.me/+novo')
+        assert (await db.get_pagamento(payment_id))['estado'] == 'activated'
+        # O processo antigo terminando depois não sobrescreve o link enviado
+        assert not await db.concluir_ativacao(antigo, user_id, payment_id, datetime(2100, 2, 1), 'https://t.me/+antigo')
+        assert (await db.get_assinatura(user_id)).link_invite == 'https://t.me/+novo'
+    executar(banco_url, cenario)
+
+
+def test_reserva_exige_pagamento_aprovado(banco_url):
+    async def cenario(db):
+        payment_id = uuid.uuid4().hex
+        await db.registrar_pagamento(payment_id, novo_usuario())
+        assert await db.reservar_ativacao(payment_id) is None
+        assert await db.reservar_ativacao(uuid.uuid4().hex) is None
+    executar(banco_url, cenario)
+
+
+def test_cobranca_em_aberto(banco_url):
+    async def cenario(db):
+        user_id = novo_usuario()
+        assert not await db.tem_cobranca_em_aberto(user_id)
+        payment_id = uuid.uuid4().hex
+        await db.registrar_pagamento(payment_id, user_id)
+        assert await db.tem_cobranca_em_aberto(user_id)
+        assert await db.atualizar_estado_pagamento(payment_id, 'pending', 'pending')
+        assert await db.tem_cobranca_em_aberto(user_id)
+        # Paga ou expirada não está mais em aberto
+        assert await db.atualizar_estado_pagamento(payment_id, 'approved', 'approved')
+        assert not await db.tem_cobranca_em_aberto(user_id)
+        expirada = uuid.uuid4().hex
+        await db.registrar_pagamento(expirada, user_id)
+        assert await db.atualizar_estado_pagamento(expirada, 'expired')
+        assert not await db.tem_cobranca_em_aberto(user_id)
+    executar(banco_url, cenario)
+
+
+def test_transicoes_recusadas(banco_url):
+    async def cenario(db):
+        user_id = novo_usuario()
+        payment_id = await pagamento_aprovado(db, user_id)
+        # approved só segue para activated
+        assert not await db.atualizar_estado_pagamento(payment_id, 'pending', 'pending')
+        assert not await db.atualizar_estado_pagamento(payment_id, 'expired')
+        token = await db.reservar_ativacao(payment_id)
+        await db.concluir_ativacao(token, user_id, payment_id, datetime(2100, 1, 1), 'https://t.me/+link')
+        # activated é final
+        for estado in ('created', 'pending', 'approved', 'expired'):
+            assert not await db.atualizar_estado_pagamento(payment_id, estado, 'pending')
+        pagamento = await db.get_pagamento(payment_id)
+        assert (pagamento['estado'], pagamento['status']) == ('activated', 'approved')
+
+        expirado = uuid.uuid4().hex
+        await db.registrar_pagamento(expirado, user_id)
+        assert await db.atualizar_estado_pagamento(expirado, 'expired')
+        assert not await db.atualizar_estado_pagamento(expirado, 'approved', 'approved')
+        assert (await db.get_pagamento(expirado))['estado'] == 'expired'
+    executar(banco_url, cenario)
+
+
+def test_remover_expiradas_move_para_fila(banco_url):
+    async def cenario(db):
+        agora = datetime(2000, 1, 2)
+        vencidos = [novo_usuario() for _ in range(5)]
+        vigente = novo_usuario()
+        for i, user_id in enumerate(vencidos):
+            await db.salvar_assinatura(user_id, uuid.uuid4().hex, agora - timedelta(hours=i + 1), f'https://t.me/+{user_id}')
+        await db.salvar_assinatura(vigente, uuid.uuid4().hex, datetime(2100, 1, 1), 'https://t.me/+vigente')
+
+        removidas = []
+        async for lote in db.remover_expiradas(agora=agora, lote=2):
+            assert len(lote) <= 2
+            removidas.extend(lote)
+        meus = {user_id: link for user_id, link in removidas if user_id in vencidos or user_id == vigente}
+        assert meus == {user_id: f'https://t.me/+{user_id}' for user_id in vencidos}
+        for user_id in vencidos:
+            assert await db.get_assinatura(user_id) is None
+        assert await db.get_assinatura(vigente) is not None
+
+        fila = {linha[0]: tuple(linha[1:]) for linha in await db.reservar_fila_remocao(10000, agora)}
+        for user_id in vencidos:
+            assert fila[user_id] == (f'https://t.me/+{user_id}', 0)
+        assert vigente not in fila
+        # Entradas reservadas não vão para outra réplica até a reserva vencer
+        outra = {linha[0] for linha in await db.reservar_fila_remocao(10000, agora)}
+        assert outra.isdisjoint(vencidos)
+        depois = agora + timedelta(minutes=11)
+        assert set(vencidos) <= {linha[0] for linha in await db.reservar_fila_remocao(10000, depois)}
+
+        # Falha ao remover do grupo: a tentativa é adiada e some da fila até lá
+        await db.adiar_remocao(vencidos[0], agora + timedelta(days=1))
+        pendentes = {linha[0] for linha in await db.reservar_fila_remocao(10000, agora + timedelta(minutes=30))}
+        assert vencidos[0] not in pendentes and set(vencidos[1:]) <= pendentes
+        fila = {linha[0]: tuple(linha[1:]) for linha in await db.reservar_fila_remocao(10000, agora + timedelta(days=2))}
+        assert fila[vencidos[0]] == (f'https://t.me/+{vencidos[0]}', 1)
+        for user_id in vencidos:
+            await db.concluir_remocao(user_id)
+        pendentes = {linha[0] for linha in await db.reservar_fila_remocao(10000, agora + timedelta(days=3))}
+        assert pendentes.isdisjoint(vencidos)
+        await db.remover_assinatura(vigente)
+    executar(banco_url, cenario)
@@ -0,0 +1,75 @@
+import logging
+
+from cache import CacheLRU, VooUnico
+from metricas import registro as metricas
+
+logger = logging.getLogger(__name__)
+
+# Status do Mercado Pago -> estado do pagamento
+ESTADO_POR_STATUS = {
+    'approved': 'approved',
+    'pending': 'pending',
+    'in_process': 'pending',
+    'authorized': 'pending',
+    'rejected': 'expired',
+    'cancelled': 'expired',
+    'refunded': 'expired',
+    'charged_back': 'expired',
+}
+# Estados a partir dos quais o Mercado Pago não precisa mais ser consultado
+ESTADOS_FINAIS = {'approved', 'activated', 'expired'}
+
+
+class VerificadorPagamentos:
+    """Consulta o status dos pagamentos e mantém a máquina de estados no banco.
+
+    É a única camada de cache do status: consultas simultâneas ao mesmo pagamento viram
+    uma única ida ao banco e ao Mercado Pago, o status pendente fica `ttl_pendente`
+    segundos em memória e o de um pagamento em estado final (aprovado, ativado ou
+    expirado) não vence, nem é consultado de novo no Mercado Pago: vem do cache ou do
+    banco. Tem a mesma interface de Pagamentos.verificar_pagamento.
+    """
+
+    def __init__(self, pagamentos, db, tamanho_cache=10000, ttl_pendente=5.0):
+        self.pagamentos = pagamentos
+        self.db = db
+        self._voo = VooUnico('pagamentos_status')
+        self._status = CacheLRU('pagamentos_status', tamanho=tamanho_cache, ttl=ttl_pendente)
+        self._consultas = metricas.contador('verificacao_consultas_total', 'Status consultados no Mercado Pago')
+        self._economizadas = metricas.contador(
+            'pagamentos_status_economizadas_total', 'Consultas de status respondidas sem chamar o Mercado Pago'
+        )
+
+    async def verificar_pagamento(self, payment_id):
+        payment_id = str(payment_id)
+        status = self._status.obter(payment_id)
+        if status is not None:
+            self._economizadas.inc()
+            return dict(status)
+        if payment_id in self._voo:
+            self._economizadas.inc()
+        return dict(await self._voo.executar(payment_id, self._verificar, payment_id))
+
+    def invalidar_status(self, payment_id):
+        # Chamado quando o Mercado Pago avisa que o status mudou; os finais continuam no banco
+        self._status.invalidar(str(payment_id))
+
+    async def _verificar(self, payment_id):
+        pagamento = await self.db.get_pagamento(payment_id)
+        if pagamento and pagamento['estado'] in ESTADOS_FINAIS:
+            status = {'status': pagamento['status'] or ('expired' if pagamento['estado'] == 'expired' else 'approved')}
+            self._status.colocar(payment_id, status, ttl=float('inf'))
+            self._economizadas.inc()
+            return status
+
+        self._consultas.inc()
+        status = await self.pagamentos.verificar_pagamento(payment_id)
+        if 'error' in status:
+            # Erros não entram no cache: a próxima consulta tenta de novo
+            return status
+        estado = ESTADO_POR_STATUS.get(status['status'])
+        if pagamento and estado and estado != pagamento['estado']:
+            await self.db.atualizar_estado_pagamento(payment_id, estado, status['status'])
+            logger.info("Pagamento %s: %s -> %s", payment_id, pagamento['estado'], estado)
+        self._status.colocar(payment_id, status, ttl=float('inf') if estado in ESTADOS_FINAIS else None)
+        return status
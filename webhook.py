@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+from collections import OrderedDict
+
+from aiohttp import web
+
+# Notificações de pagamentos em status final são ignoradas
+from pagamentos import STATUS_FINAIS
+
+logger = logging.getLogger(__name__)
+
+
+class Lotado(Exception):
+    """Notificações pendentes demais; a notificação deve ser recusada para ser reenviada depois."""
+
+
+class ReceptorWebhook:
+    """Recebe notificações de pagamento do Mercado Pago e ativa as assinaturas aprovadas."""
+
+    def __init__(self, pagamentos, ao_aprovar, porta=8080, caminho='/webhook/mercadopago',
+                 segredo=None, max_concorrencia=4, max_vistos=10000, max_pendentes=1000):
+        self.pagamentos = pagamentos
+        self.ao_aprovar = ao_aprovar
+        self.porta = porta
+        self.caminho = caminho
+        self.segredo = segredo
+        self.max_vistos = max_vistos
+        self.max_pendentes = max_pendentes
+        self._em_andamento = set()
+        self._finalizados = OrderedDict()
+        self._semaforo = asyncio.Semaphore(max_concorrencia)
+        self._tarefas = set()
+        self._runner = None
+        self.recebidas = 0
+        self.duplicadas = 0
+        self.recusadas = 0
+        self.processadas = 0
+
+    @property
+    def porta_real(self):
+        return self._runner.addresses[0][1] if self._runner else None
+
+    def criar_app(self):
+        app = web.Application()
+        app.router.add_post(self.caminho, self._handle)
+        return app
+
+    async def iniciar(self):
+        self._runner = web.AppRunner(self.criar_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '0.0.0.0', self.porta).start()
+        logger.info("Webhook do Mercado Pago ouvindo na porta %s%s", self.porta_real, self.caminho)
+
+    async def parar(self):
+        if self._runner:
+            await self._runner.cleanup()
+        if self._tarefas:
+            await asyncio.gather(*self._tarefas, return_exceptions=True)
+        logger.info("Webhook do Mercado Pago finalizado")
+
+    def receber(self, payment_id):
+        """Agenda o processamento de uma notificação; retorna False se ela for duplicada.
+
+        Com max_pendentes pagamentos em andamento levanta Lotado: o Mercado Pago reenvia
+        as notificações não confirmadas, então é seguro recusar em vez de acumular tarefas.
+        """
+        payment_id = str(payment_id)
+        self.recebidas += 1
+        if payment_id in self._em_andamento or payment_id in self._finalizados:
+            self.duplicadas += 1
+            return False
+        if len(self._em_andamento) >= self.max_pendentes:
+            self.recusadas += 1
+            raise Lotado(payment_id)
+        self._em_andamento.add(payment_id)
+        tarefa = asyncio.create_task(self._processar(payment_id))
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+        return True
+
+    async def _processar(self, payment_id):
+        status = None
+        try:
+            async with self._semaforo:
+                # A notificação indica mudança: o status em cache pode estar velho
+                self.pagamentos.invalidar_status(payment_id)
+                resultado = await self.pagamentos.verificar_pagamento(payment_id)
+                if 'error' in resultado:
+                    logger.error("Erro ao verificar pagamento %s notificado: %s", payment_id, resultado['error'])
+                    return
+                status = resultado['status']
+                logger.info("Notificação do pagamento %s: status=%s", payment_id, status)
+                if status == 'approved':
+                    await self.ao_aprovar(payment_id)
+        except Exception as e:
+            # Em caso de falha o pagamento não é marcado como finalizado e a próxima notificação tenta de novo
+            logger.error("Erro ao processar notificação do pagamento %s: %s", payment_id, e, exc_info=True)
+            status = None
+        finally:
+            self._em_andamento.discard(payment_id)
+            self.processadas += 1
+            if status in STATUS_FINAIS:
+                self._finalizados[payment_id] = status
+                if len(self._finalizados) > self.max_vistos:
+                    self._finalizados.popitem(last=False)
+
+    def assinatura_valida(self, payment_id, x_signature, x_request_id):
+        # https://www.mercadopago.com.br/developers/pt/docs/your-integrations/notifications/webhooks
+        if not self.segredo:
+            return True
+        if not x_signature:
+            return False
+        partes = dict(p.strip().split('=', 1) for p in x_signature.split(',') if '=' in p)
+        ts, v1 = partes.get('ts'), partes.get('v1')
+        if not ts or not v1:
+            return False
+        manifesto = f"id:{str(payment_id).lower()};"
+        if x_request_id:
+            manifesto += f"request-id:{x_request_id};"
+        manifesto += f"ts:{ts};"
+        esperado = hmac.new(self.segredo.encode(), manifesto.encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(esperado, v1)
+
+    async def _handle(self, request):
+        try:
+            corpo = await request.json() if request.can_read_body else {}
+        except ValueError:
+            return web.Response(status=400)
+
+        parametros = request.query
+        tipo = corpo.get('type') or parametros.get('type') or parametros.get('topic')
+        payment_id = (corpo.get('data') or {}).get('id') or parametros.get('data.id') or parametros.get('id')
+        if tipo != 'payment' or not payment_id:
+            # Outros tópicos (merchant_order etc.) são apenas confirmados
+            return web.Response(status=200)
+
+        if not self.assinatura_valida(payment_id, request.headers.get('x-signature'), request.headers.get('x-request-id')):
+            logger.warning("Notificação com assinatura inválida para o pagamento %s", payment_id)
+            return web.Response(status=401)
+
+        # Responde imediatamente; a verificação no Mercado Pago acontece em segundo plano
+        try:
+            self.receber(payment_id)
+        except Lotado:
+            logger.warning("Notificação do pagamento %s recusada: %s pagamentos pendentes", payment_id, self.max_pendentes)
+            return web.Response(status=503)
+        return web.Response(status=200)